@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+流式写入 .apkg 卡组包
+每完成一张卡片就把它的音频写入压缩包、把笔记写入 SQLite 集合，不在内存中保留全部笔记与媒体清单；
+音频写入后可以立即删除临时文件，5 万张卡片的卡组内存与临时磁盘占用也保持平稳。
+生成的文件格式与 genanki.Package.write_to_file 相同。
+"""
+
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+
+class StreamingPackageWriter:
+    """
+    流式 .apkg 写入器 (单线程使用)
+
+    用法:
+        writer = StreamingPackageWriter(path, model, deck_id, deck_name)
+        writer.add_note(note, [音频路径, ...])
+        writer.close()    # 写入集合与媒体清单；出错时调用 writer.abort() 删除未完成的文件
+    """
+
+    def __init__(self, path, model, deck_id, deck_name, delete_media=False, commit_every=500, timestamp=None):
+        """
+        Args:
+            path: 输出的 .apkg 路径 (写入过程中即为未完成的文件，建议使用临时文件名，完成后再替换)
+            model: genanki.Model
+            deck_id: 卡组 ID
+            deck_name: 卡组名称
+            delete_media: 音频写入压缩包后是否删除原文件
+            commit_every: 每写入多少条笔记提交一次 SQLite 事务
+            timestamp: 笔记与卡片的时间戳 (秒)，默认为当前时间
+        """
+        import genanki
+        from genanki.apkg_col import APKG_COL
+        from genanki.apkg_schema import APKG_SCHEMA
+
+        self.path = path
+        self.deck_id = deck_id
+        self.delete_media = delete_media
+        self.commit_every = max(1, int(commit_every))
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._id_gen = itertools.count(int(self.timestamp * 1000))
+
+        # 媒体清单: 压缩包内编号 -> 文件名 (同名文件只写入一次)
+        self.media = {}
+        self._media_names = set()
+        self.note_count = 0
+
+        # 集合先写入输出目录下的临时数据库，关闭时再放入压缩包
+        fd, self._db_path = tempfile.mkstemp(suffix='.anki2', dir=os.path.dirname(os.path.abspath(path)))
+        os.close(fd)
+        self._conn = sqlite3.connect(self._db_path)
+        self._cursor = self._conn.cursor()
+        self._cursor.executescript(APKG_SCHEMA)
+        self._cursor.executescript(APKG_COL)
+
+        # 写入卡组与模板定义 (空卡组，笔记随后逐条写入)
+        deck = genanki.Deck(deck_id, deck_name)
+        deck.add_model(model)
+        deck.write_to_db(self._cursor, self.timestamp, self._id_gen)
+        self._conn.commit()
+
+        self._zip = zipfile.ZipFile(path, 'w')
+
+    def has_media(self, filename):
+        """
+        压缩包中是否已有该文件名的音频
+        """
+        return os.path.basename(filename) in self._media_names
+
+    def add_media(self, path):
+        """
+        把一个音频文件写入压缩包 (同名文件只写入一次)，delete_media 时随后删除原文件
+
+        Returns:
+            bool: 压缩包中是否有该文件 (本次写入或之前已写入)
+        """
+        name = os.path.basename(path)
+        if name not in self._media_names:
+            if not os.path.exists(path):
+                return False
+            with open(path, 'rb') as src:
+                self.add_media_from(name, src)
+        if self.delete_media and os.path.exists(path):
+            os.remove(path)
+        return True
+
+    def add_media_from(self, name, src):
+        """
+        从文件对象写入一个音频 (例如合并分片时直接从另一个压缩包读取)，同名文件只写入一次
+        """
+        if name in self._media_names:
+            return
+        member = str(len(self.media))
+        with self._zip.open(member, 'w') as dst:
+            shutil.copyfileobj(src, dst)
+        self.media[member] = name
+        self._media_names.add(name)
+
+    def add_note(self, note, media_paths=(), index=None):
+        """
+        写入一条笔记及其音频
+
+        Args:
+            note: genanki.Note
+            media_paths: 笔记引用的音频文件路径
+            index: 输入序号 (与 bundle.CardBundleWriter 接口一致，这里按写入顺序排列，不使用)
+        """
+        for path in media_paths:
+            if path:
+                self.add_media(path)
+        note.write_to_db(self._cursor, self.timestamp, self.deck_id, self._id_gen)
+        self.note_count += 1
+        if self.note_count % self.commit_every == 0:
+            self._conn.commit()
+
+    def close(self):
+        """
+        写入集合与媒体清单，完成卡组包
+        """
+        self._conn.commit()
+        self._conn.close()
+        try:
+            self._zip.write(self._db_path, 'collection.anki2')
+            self._zip.writestr('media', json.dumps(self.media))
+            self._zip.close()
+        finally:
+            os.remove(self._db_path)
+
+    def abort(self):
+        """
+        放弃写入，删除未完成的卡组包与临时数据库
+        """
+        self._conn.close()
+        self._zip.close()
+        for path in (self._db_path, self.path):
+            if os.path.exists(path):
+                os.remove(path)
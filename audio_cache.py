@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+TTS 音频的持久化缓存 (按内容寻址)
+以 (voice_name, rate, SSML 文本) 的哈希为键保存合成好的音频，
+文本、声音和语速都不变时直接复用，不再调用 Azure。
+缓存目录独立于临时媒体目录，清理临时文件时不会被删除。
+媒体文件名同样带上这个哈希 (media_filename)，内容相同的音频在不同卡片、不同运行之间共用同一个文件，
+内容不同 (例如同一单词的不同语境) 的音频则不会互相覆盖。
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+
+# 媒体文件名中保留的哈希长度 (十六进制字符)
+MEDIA_DIGEST_CHARS = 16
+
+
+def media_filename(stem, key, ext):
+    """
+    按内容寻址的媒体文件名：可读的前缀 + 内容哈希 + 扩展名，例如 tear_slow_3f2a9c0d41b7e655.mp3
+
+    Args:
+        stem: 可读的前缀 (单词与片段后缀)
+        key: AudioCache.make_key 生成的内容哈希
+        ext: 文件扩展名 (含 ".")
+    """
+    return f"{stem}_{key[:MEDIA_DIGEST_CHARS]}{ext}"
+
+
+class AudioCache:
+    """
+    按内容寻址的音频缓存，超出容量时按最近使用时间淘汰，可在多线程间共享。
+    """
+
+    def __init__(self, path=".cache/audio", max_bytes=2 * 1024 ** 3):
+        """
+        Args:
+            path: 缓存目录
+            max_bytes: 缓存总大小上限 (字节)，超出后淘汰最久未使用的文件
+        """
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._stores = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def make_key(voice_name, rate, ssml_text, *extra):
+        """
+        生成缓存键：声音 + 语速 + SSML 文本 (以及输出格式等附加参数) 的 SHA-256
+        """
+        raw = "\x1f".join([voice_name, str(rate), ssml_text, *map(str, extra)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key, ext):
+        # 两级目录，避免单个目录下文件过多
+        return os.path.join(self.path, key[:2], key + ext)
+
+    def fetch(self, key, dest_path):
+        """
+        命中缓存时把音频复制到 dest_path
+
+        Returns:
+            bool: 是否命中
+        """
+        entry = self._entry_path(key, os.path.splitext(dest_path)[1])
+        # 先复制到临时文件再原子替换，其他卡片共用同一个媒体文件时不会读到半个文件
+        tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(entry, tmp_path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        os.replace(tmp_path, dest_path)
+
+        # 更新访问时间，供 LRU 淘汰使用
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key, src_path):
+        """
+        把合成好的音频文件存入缓存 (复制，不影响原文件)
+        """
+        entry = self._entry_path(key, os.path.splitext(src_path)[1])
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        tmp_path = f"{entry}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, entry)
+
+        with self._lock:
+            self._stores += 1
+            check = self._stores % 200 == 0
+        if check:
+            self.gc()
+
+    def gc(self, max_bytes=None):
+        """
+        清理缓存：删除残留的临时文件，并按最近使用时间淘汰，直到总大小不超过上限
+
+        Args:
+            max_bytes: 本次清理使用的大小上限，默认使用初始化时的上限
+
+        Returns:
+            dict: 删除的文件数、释放的字节数、剩余文件数与大小
+        """
+        limit = self.max_bytes if max_bytes is None else int(max_bytes)
+        entries = []
+        removed = 0
+        freed = 0
+        now = time.time()
+
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                file_path = os.path.join(root, name)
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                # 超过 1 小时仍未完成的临时文件视为残留
+                if name.endswith(".tmp"):
+                    if now - st.st_mtime > 3600:
+                        removed, freed = self._remove(file_path, st.st_size, removed, freed)
+                    continue
+                entries.append((st.st_mtime, st.st_size, file_path))
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        kept = len(entries)
+        for _, size, file_path in entries:
+            if total <= limit:
+                break
+            removed, freed = self._remove(file_path, size, removed, freed)
+            total -= size
+            kept -= 1
+
+        return {"removed": removed, "freed_bytes": freed, "files": kept, "bytes": total}
+
+    @staticmethod
+    def _remove(file_path, size, removed, freed):
+        try:
+            os.remove(file_path)
+            return removed + 1, freed + size
+        except OSError:
+            return removed, freed
+
+    def stats(self):
+        """
+        Returns:
+            dict: 命中次数与未命中次数
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
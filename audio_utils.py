@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+音频处理辅助函数 (纯 Python，不依赖 Azure SDK)
+- PCM 与 WAV 之间的转换
+- 按书签偏移量切分 PCM 音频
+- 生成指定时长的静音 MP3 / Ogg Opus / WebM Opus (本地模拟合成器使用)
+"""
+
+import struct
+
+# Azure 事件中的音频偏移量单位：100 纳秒 (tick)
+TICKS_PER_SECOND = 10_000_000
+
+
+def pcm_to_wav_bytes(pcm: bytes, sample_rate=24000, channels=1, sample_width=2) -> bytes:
+    """
+    给原始 PCM 数据加上 RIFF/WAV 文件头
+
+    Args:
+        pcm: 原始 PCM 数据 (小端有符号整数)
+        sample_rate: 采样率
+        channels: 声道数
+        sample_width: 每个采样的字节数
+
+    Returns:
+        bytes: 完整的 WAV 文件内容
+    """
+    byte_rate = sample_rate * channels * sample_width
+    block_align = channels * sample_width
+    header = b"RIFF" + struct.pack("<I", 36 + len(pcm)) + b"WAVE"
+    header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate,
+                                    block_align, sample_width * 8)
+    header += b"data" + struct.pack("<I", len(pcm))
+    return header + pcm
+
+
+def wav_bytes_to_pcm(data: bytes):
+    """
+    解析 WAV 文件内容，返回 PCM 数据与采样率
+
+    Returns:
+        tuple: (pcm_bytes, sample_rate)
+    """
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("不是有效的 WAV 数据")
+
+    pos = 12
+    sample_rate = None
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        chunk_size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        body = data[pos + 8:pos + 8 + chunk_size]
+        if chunk_id == b"fmt ":
+            sample_rate = struct.unpack("<I", body[4:8])[0]
+        elif chunk_id == b"data":
+            return body, sample_rate
+        pos += 8 + chunk_size + (chunk_size & 1)
+    raise ValueError("WAV 数据中缺少 data 块")
+
+
+def split_pcm_by_offsets(pcm: bytes, offsets, sample_rate=24000, sample_width=2):
+    """
+    按书签偏移量 (tick) 把一段 PCM 音频切分为多段
+
+    Args:
+        pcm: 原始 PCM 数据
+        offsets: 各段起点的偏移量列表 (tick，递增)，最后一段延续到音频结尾
+        sample_rate: 采样率
+        sample_width: 每个采样的字节数
+
+    Returns:
+        list: 与 offsets 一一对应的 PCM 片段
+    """
+    def to_byte(ticks):
+        sample = int(ticks * sample_rate // TICKS_PER_SECOND)
+        return min(len(pcm), sample * sample_width)
+
+    bounds = [to_byte(t) for t in offsets] + [len(pcm)]
+    return [pcm[bounds[i]:bounds[i + 1]] for i in range(len(offsets))]
+
+
+# MPEG 音频帧参数 (Layer III，单声道)：采样率 -> (版本位, 采样率索引, 每帧采样数, 比特率表)
+_MP3_MPEG1_BITRATES = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_MP3_MPEG2_BITRATES = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_MP3_SAMPLE_RATES = {
+    44100: (0b11, 0, 1152, _MP3_MPEG1_BITRATES),
+    48000: (0b11, 1, 1152, _MP3_MPEG1_BITRATES),
+    32000: (0b11, 2, 1152, _MP3_MPEG1_BITRATES),
+    22050: (0b10, 0, 576, _MP3_MPEG2_BITRATES),
+    24000: (0b10, 1, 576, _MP3_MPEG2_BITRATES),
+    16000: (0b10, 2, 576, _MP3_MPEG2_BITRATES),
+}
+
+
+def silent_mp3_bytes(seconds: float, sample_rate=24000, bitrate_kbps=48) -> bytes:
+    """
+    生成指定时长的静音 MP3 (CBR)：每帧只有帧头，边信息与主数据全为 0，解码结果为静音，
+    文件大小与同码率的真实语音相同，可用于估算卡组体积。
+
+    Args:
+        seconds: 时长 (秒)
+        sample_rate: 采样率 (16000 / 22050 / 24000 / 32000 / 44100 / 48000)
+        bitrate_kbps: 比特率 (kbps)，必须是对应 MPEG 版本支持的值
+
+    Returns:
+        bytes: MP3 数据
+    """
+    version, rate_index, samples_per_frame, bitrates = _MP3_SAMPLE_RATES[sample_rate]
+    bitrate_index = bitrates.index(bitrate_kbps)
+    header = bytes([
+        0xFF,
+        0xE0 | (version << 3) | (0b01 << 1) | 1,   # Layer III，无 CRC
+        (bitrate_index << 4) | (rate_index << 2),  # 无填充位
+        0xC0,                                      # 单声道
+    ])
+    frame_size = (samples_per_frame // 8) * bitrate_kbps * 1000 // sample_rate
+    frame = header + bytes(frame_size - len(header))
+    frames = max(1, int(seconds * sample_rate / samples_per_frame + 0.5))
+    return frame * frames
+
+
+# Opus 静音帧：CELT 全频带 20 毫秒单声道帧，只设置了静音标志 (解码结果为静音)
+_OPUS_SILENT_FRAME = b"\xff\xfe"
+_OPUS_FRAME_SAMPLES = 960    # 20 毫秒 (Opus 的时间戳固定按 48kHz 计)
+_OPUS_PRE_SKIP = 312         # 解码器起始时丢弃的采样数 (与 libopus 编码器一致)
+
+
+def _opus_head(sample_rate):
+    # 版本 1，单声道，pre-skip，原始采样率，输出增益 0，声道映射族 0
+    return b"OpusHead" + struct.pack("<BBHIhB", 1, 1, _OPUS_PRE_SKIP, sample_rate, 0, 0)
+
+
+def _silent_opus_packet(size):
+    """
+    生成 size 字节的静音 Opus 包：不足 size 的部分用 code 3 包的填充补齐，体积与同码率的 CBR 编码相同
+    """
+    if size <= 5:
+        return b"\xf8" + _OPUS_SILENT_FRAME
+    # 填充长度的编码本身也占字节：每个 255 表示 254 字节填充并继续，最后一个字节 (0~254) 结束
+    padding = size - 5
+    while True:
+        lengths = bytes([255] * (padding // 254) + [padding % 254])
+        if 2 + len(lengths) + len(_OPUS_SILENT_FRAME) + padding <= size:
+            break
+        padding -= 1
+    # TOC: 配置 31 (CELT 全频带 20 毫秒)，单声道，code 3；帧数字节: CBR，带填充，1 帧
+    return b"\xfb\x41" + lengths + _OPUS_SILENT_FRAME + bytes(padding)
+
+
+def _silent_opus_packets(seconds, bitrate_kbps):
+    frames = max(1, int(seconds * 50 + 0.5))
+    return [_silent_opus_packet(bitrate_kbps * 1000 // 8 // 50)] * frames
+
+
+def _ogg_crc_table():
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1) & 0xFFFFFFFF
+        table.append(crc)
+    return table
+
+
+_OGG_CRC_TABLE = _ogg_crc_table()
+
+
+def _ogg_page(packets, granule, serial, sequence, flags=0):
+    # 一个 Ogg 页：页头 + 分段表 + 数据，CRC 计算时校验和字段置 0
+    lacing = b"".join(bytes([255] * (len(p) // 255) + [len(p) % 255]) for p in packets)
+    page = bytearray(b"OggS" + struct.pack("<BBqIII", 0, flags, granule, serial, sequence, 0)
+                     + bytes([len(lacing)]) + lacing + b"".join(packets))
+    crc = 0
+    for byte in page:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC_TABLE[(crc >> 24) ^ byte]
+    page[22:26] = struct.pack("<I", crc)
+    return bytes(page)
+
+
+def silent_ogg_opus_bytes(seconds: float, sample_rate=24000, bitrate_kbps=24) -> bytes:
+    """
+    生成指定时长的静音 Ogg Opus 文件 (RFC 7845)，可以正常解码播放，体积与同码率的 CBR 编码相同
+
+    Args:
+        seconds: 时长 (秒)
+        sample_rate: 写入 OpusHead 的原始采样率 (只作为元数据)
+        bitrate_kbps: 比特率 (kbps)
+
+    Returns:
+        bytes: Ogg Opus 数据
+    """
+    serial = 0x4F505553
+    tags = b"OpusTags" + struct.pack("<I", 4) + b"fake" + struct.pack("<I", 0)
+    pages = [_ogg_page([_opus_head(sample_rate)], 0, serial, 0, flags=0x02),
+             _ogg_page([tags], 0, serial, 1)]
+    packets = _silent_opus_packets(seconds, bitrate_kbps)
+    # 每页最多 50 个包 (1 秒)，granule position 为截至本页末尾的 48kHz 采样数
+    for start in range(0, len(packets), 50):
+        chunk = packets[start:start + 50]
+        last = start + 50 >= len(packets)
+        granule = (start + len(chunk)) * _OPUS_FRAME_SAMPLES
+        pages.append(_ogg_page(chunk, granule, serial, len(pages), flags=0x04 if last else 0))
+    return b"".join(pages)
+
+
+def _ebml(element_id: bytes, payload: bytes) -> bytes:
+    # EBML 元素：ID + 8 字节长度 + 内容
+    return element_id + b"\x01" + len(payload).to_bytes(7, "big") + payload
+
+
+def _ebml_uint(element_id: bytes, value: int) -> bytes:
+    return _ebml(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def silent_webm_opus_bytes(seconds: float, sample_rate=24000, bitrate_kbps=24) -> bytes:
+    """
+    生成指定时长的静音 WebM (Matroska) Opus 文件，可以正常解码播放，体积与同码率的 CBR 编码相同
+
+    Args:
+        seconds: 时长 (秒)
+        sample_rate: 写入 OpusHead 的原始采样率 (只作为元数据)
+        bitrate_kbps: 比特率 (kbps)
+
+    Returns:
+        bytes: WebM 数据
+    """
+    packets = _silent_opus_packets(seconds, bitrate_kbps)
+    header = _ebml(b"\x1a\x45\xdf\xa3", b"".join([
+        _ebml_uint(b"\x42\x86", 1),            # EBMLVersion
+        _ebml_uint(b"\x42\xf7", 1),            # EBMLReadVersion
+        _ebml_uint(b"\x42\xf2", 4),            # EBMLMaxIDLength
+        _ebml_uint(b"\x42\xf3", 8),            # EBMLMaxSizeLength
+        _ebml(b"\x42\x82", b"webm"),           # DocType
+        _ebml_uint(b"\x42\x87", 4),            # DocTypeVersion
+        _ebml_uint(b"\x42\x85", 2),            # DocTypeReadVersion
+    ]))
+    info = _ebml(b"\x15\x49\xa9\x66", b"".join([
+        _ebml_uint(b"\x2a\xd7\xb1", 1_000_000),                 # TimecodeScale: 1 毫秒
+        _ebml(b"\x4d\x80", b"fake"),                             # MuxingApp
+        _ebml(b"\x57\x41", b"fake"),                             # WritingApp
+        _ebml(b"\x44\x89", struct.pack(">d", len(packets) * 20.0)),  # Duration (毫秒)
+    ]))
+    tracks = _ebml(b"\x16\x54\xae\x6b", _ebml(b"\xae", b"".join([
+        _ebml_uint(b"\xd7", 1),                                   # TrackNumber
+        _ebml_uint(b"\x73\xc5", 1),                               # TrackUID
+        _ebml_uint(b"\x83", 2),                                   # TrackType: 音频
+        _ebml(b"\x86", b"A_OPUS"),                                # CodecID
+        _ebml(b"\x63\xa2", _opus_head(sample_rate)),              # CodecPrivate
+        _ebml_uint(b"\x56\xaa", _OPUS_PRE_SKIP * 1_000_000_000 // 48000),  # CodecDelay (纳秒)
+        _ebml_uint(b"\x56\xbb", 80_000_000),                      # SeekPreRoll (纳秒)
+        _ebml(b"\xe1", _ebml(b"\xb5", struct.pack(">d", 48000.0)) + _ebml_uint(b"\x9f", 1)),
+    ])))
+    # 每个 Cluster 最多 20 秒 (SimpleBlock 的相对时间戳是 16 位有符号整数)
+    clusters = []
+    for start in range(0, len(packets), 1000):
+        blocks = [_ebml_uint(b"\xe7", start * 20)]              # Cluster Timecode (毫秒)
+        for i, packet in enumerate(packets[start:start + 1000]):
+            # 轨道号 1 + 相对时间戳 + 关键帧标志
+            blocks.append(_ebml(b"\xa3", b"\x81" + struct.pack(">hB", i * 20, 0x80) + packet))
+        clusters.append(_ebml(b"\x1f\x43\xb6\x75", b"".join(blocks)))
+    return header + _ebml(b"\x18\x53\x80\x67", info + tracks + b"".join(clusters))
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Azure TTS 合成器池 (依赖 Azure Speech SDK)
+按 (订阅密钥, 区域, 声音) 复用 SpeechSynthesizer 并保持长连接，音频结果保存在内存中，由调用方自行写入文件；
+多个片段可以同时发起请求。
+
+Azure SDK 体积较大 (原生库)，本模块只在第一次真正需要合成时由 tts.get_synthesizer_pool 导入。
+"""
+
+import threading
+
+import azure.cognitiveservices.speech as speechsdk
+
+from tts import SynthesisResult
+
+
+# 可以重试的 Azure 错误类型
+_RETRYABLE_ERROR_CODES = (
+    speechsdk.CancellationErrorCode.TooManyRequests,
+    speechsdk.CancellationErrorCode.ConnectionFailure,
+    speechsdk.CancellationErrorCode.ServiceTimeout,
+    speechsdk.CancellationErrorCode.ServiceUnavailable,
+    speechsdk.CancellationErrorCode.ServiceError,
+)
+
+
+def _from_azure_result(result):
+    # 把 Azure SDK 的结果转换为 SynthesisResult
+    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+        return SynthesisResult(audio_data=result.audio_data)
+    details = result.cancellation_details
+    error = f"{details.reason}"
+    if details.reason != speechsdk.CancellationReason.Error:
+        return SynthesisResult(error=error)
+    error += f": {details.error_details}"
+    code = details.error_code
+    return SynthesisResult(
+        error=error,
+        retryable=code in _RETRYABLE_ERROR_CODES,
+        rate_limited=code == speechsdk.CancellationErrorCode.TooManyRequests,
+    )
+
+
+class PooledSynthesizer:
+    """
+    池中的单个合成器：音频输出到内存 (audio_config=None)，并预先建立连接
+    """
+
+    def __init__(self, speech_config):
+        self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        # 书签事件 (名称, 音频偏移量 tick)，每次请求前清空
+        self.bookmarks = []
+        self.synthesizer.bookmark_reached.connect(
+            lambda evt: self.bookmarks.append((evt.text, evt.audio_offset)))
+        # 预先建立并保持连接，后续请求复用同一条连接，省去每次握手
+        self.connection = speechsdk.Connection.from_speech_synthesizer(self.synthesizer)
+        self.connection.open(True)
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class SynthesizerPool:
+    """
+    合成器池：空闲合成器不足时直接新建，不会阻塞等待，因此不会出现多个线程互相等待的情况；
+    归还时最多保留 max_idle 个空闲合成器供后续单词复用。
+    """
+
+    def __init__(self, speech_key, region, voice_name, max_idle=16, output_format=None):
+        """
+        Args:
+            speech_key: Azure 语音服务订阅密钥
+            region: Azure 服务区域
+            voice_name: 声音名称，例如 en-GB-SoniaNeural
+            max_idle: 最多保留的空闲合成器数量
+            output_format: SpeechSynthesisOutputFormat 枚举名称，例如 "Raw24Khz16BitMonoPcm"，
+                           为 None 时使用 SDK 默认格式
+        """
+        self.voice_name = voice_name
+        self.max_idle = int(max_idle)
+        self.output_format = output_format
+        self.speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=region)
+        self.speech_config.speech_synthesis_voice_name = voice_name
+        if output_format:
+            self.speech_config.set_speech_synthesis_output_format(
+                getattr(speechsdk.SpeechSynthesisOutputFormat, output_format))
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> PooledSynthesizer:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return PooledSynthesizer(self.speech_config)
+
+    def release(self, item: PooledSynthesizer, healthy=True):
+        with self._lock:
+            if healthy and len(self._idle) < self.max_idle:
+                self._idle.append(item)
+                return
+        item.close()
+
+    def speak_many(self, ssml_list):
+        """
+        同时发起多个 SSML 合成请求，全部完成后按顺序返回结果
+
+        Args:
+            ssml_list: SSML 文本列表
+
+        Returns:
+            list: 与 ssml_list 一一对应的 SynthesisResult
+        """
+        in_flight = []
+        healthy = {}
+        try:
+            # 每个片段使用独立的合成器，请求同时在途
+            for ssml_text in ssml_list:
+                item = self.acquire()
+                in_flight.append((item, item.synthesizer.speak_ssml_async(ssml_text)))
+
+            results = []
+            for item, future in in_flight:
+                result = future.get()
+                # 被取消的请求可能意味着连接已断开，对应合成器不再放回池中
+                healthy[id(item)] = result.reason != speechsdk.ResultReason.Canceled
+                results.append(_from_azure_result(result))
+            return results
+        finally:
+            for item, _ in in_flight:
+                self.release(item, healthy.get(id(item), False))
+
+    def speak_with_bookmarks(self, ssml_text):
+        """
+        合成一段带 <bookmark> 标记的 SSML，同时返回各书签的音频偏移量
+
+        Returns:
+            tuple: (SynthesisResult, [(书签名称, 偏移量 tick), ...])
+        """
+        item = self.acquire()
+        healthy = False
+        try:
+            item.bookmarks = []
+            result = item.synthesizer.speak_ssml_async(ssml_text).get()
+            healthy = result.reason != speechsdk.ResultReason.Canceled
+            return _from_azure_result(result), list(item.bookmarks)
+        finally:
+            self.release(item, healthy)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for item in idle:
+            item.close()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+多单词批量请求的辅助工具
+- BatchSizer: 根据模型上下文窗口与实际输出长度自适应调整每批单词数
+- salvage_json_objects: 从被截断的 JSON 数组中尽量恢复完整的对象
+"""
+
+import json
+import threading
+
+# 粗略估算：英文约 4 个字符 / token，中文与 IPA 符号更"贵"，取保守值
+CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数 (无需加载分词器)
+    """
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+class BatchSizer:
+    """
+    自适应批大小：
+    - 上限由上下文窗口、最大输出 token 数和每个单词的平均输出长度共同决定
+    - 批量结果被截断或解析失败时减半，连续成功时逐步增大
+    """
+
+    def __init__(self, max_batch_size=20, context_window=65536, max_output_tokens=8192,
+                 prompt_tokens=1000, tokens_per_entry=250):
+        """
+        Args:
+            max_batch_size: 配置的最大批大小
+            context_window: 模型上下文窗口 (token)
+            max_output_tokens: 模型单次最大输出 (token)
+            prompt_tokens: system prompt 的 token 数
+            tokens_per_entry: 每个单词输出 token 数的初始估计值
+        """
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.context_window = int(context_window)
+        self.max_output_tokens = int(max_output_tokens)
+        self.prompt_tokens = int(prompt_tokens)
+        self.tokens_per_entry = float(tokens_per_entry)
+        self._ceiling = self.max_batch_size
+        self._lock = threading.Lock()
+
+    def _capacity(self):
+        # 每个单词的输入约 20 token，输出按平均值估计，并预留 20% 余量
+        per_entry = self.tokens_per_entry * 1.2
+        by_output = self.max_output_tokens / per_entry
+        by_context = (self.context_window - self.prompt_tokens) / (per_entry + 20)
+        return max(1, int(min(by_output, by_context)))
+
+    def size(self) -> int:
+        """
+        Returns:
+            int: 当前建议的批大小
+        """
+        with self._lock:
+            return max(1, min(self._ceiling, self.max_batch_size, self._capacity()))
+
+    def record_success(self, entries: int, output_text: str):
+        """
+        记录一次成功的批量请求，用实际输出长度修正每个单词的 token 估计
+        """
+        if entries <= 0:
+            return
+        with self._lock:
+            observed = estimate_tokens(output_text) / entries
+            # 指数滑动平均，避免单批异常值造成大幅波动
+            self.tokens_per_entry = 0.7 * self.tokens_per_entry + 0.3 * observed
+            self._ceiling = min(self.max_batch_size, self._ceiling + 1)
+
+    def record_failure(self, attempted: int):
+        """
+        记录一次被截断或解析失败的批量请求，批大小减半
+        """
+        with self._lock:
+            self._ceiling = max(1, min(self._ceiling, attempted) // 2)
+
+
+def salvage_json_objects(text: str, array_key: str):
+    """
+    从 JSON 文本中提取 array_key 对应数组里的对象。
+    即使输出在中途被截断，也会返回截断位置之前所有完整的对象。
+
+    Args:
+        text: 模型输出的 JSON 文本
+        array_key: 数组字段名，例如 "cards"
+
+    Returns:
+        list: 成功解析的对象列表
+    """
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict) and isinstance(data.get(array_key), list):
+            return [x for x in data[array_key] if isinstance(x, dict)]
+        if isinstance(data, list):
+            return [x for x in data if isinstance(x, dict)]
+    except ValueError:
+        pass
+
+    # 完整解析失败：定位数组起点，逐个对象增量解析
+    key_pos = text.find(f'"{array_key}"')
+    start = text.find('[', key_pos if key_pos >= 0 else 0)
+    if start < 0:
+        return []
+
+    decoder = json.JSONDecoder()
+    objects = []
+    pos = start + 1
+    while True:
+        while pos < len(text) and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(text) or text[pos] != '{':
+            break
+        try:
+            obj, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            break
+        if isinstance(obj, dict):
+            objects.append(obj)
+    return objects
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频格式基准
+用本地模拟后端 (不需要 API Key) 按不同音频格式各生成一次卡组，
+比较卡组包体积、媒体文件总大小与 genanki 打包耗时。
+模拟合成器输出的静音 MP3 / Opus / WAV 与真实语音的码率相同，体积可以直接参考。
+
+用法:
+    python benchmarks/bench_audio_formats.py
+    python benchmarks/bench_audio_formats.py --words 200 --formats wav-16k mp3-24k-48kbps --json formats.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_backends import StubLLMServer  # noqa: E402
+from generate import create_anki_package  # noqa: E402
+from metrics import get_metrics  # noqa: E402
+
+# wav-16k 即 Azure SDK 的默认输出格式 (改动之前写入 .mp3 文件的内容)
+DEFAULT_FORMATS = ["wav-16k", "mp3-24k-48kbps", "mp3-16k-32kbps", "mp3-24k-96kbps", "opus-24k-24kbps-webm"]
+
+SAMPLE_WORDS = ["apple", "tear (crying)", "give up", "bank", "serendipity", "look forward to",
+                "content (happy)", "kangaroo", "a piece of cake", "present (gift)"]
+
+
+def build_once(audio_format, words, base_url, work_dir):
+    """
+    Returns:
+        dict: 本次生成的体积与耗时
+    """
+    package = os.path.join(work_dir, f"{audio_format}.apkg")
+    media_dir = os.path.join(work_dir, f"media_{audio_format}")
+    api_config = {"base_url": base_url, "api_key": "stub", "model_name": "stub", "structured_output": True}
+    azure_config = {"backend": "fake", "speech_key": "fake", "region": "local", "voice_name": "en-GB-SoniaNeural",
+                    "audio_format": audio_format, "fake_latency_ms": 1, "fake_jitter_ms": 0}
+
+    get_metrics().reset()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_anki_package(words, package_name=package, media_output_dir=media_dir,
+                            api_config=api_config, azure_config=azure_config, speed_config=None,
+                            deck_name="bench", concurrency_config={"llm_workers": 8, "tts_workers": 8})
+    total = time.perf_counter() - started
+
+    snapshot = get_metrics().snapshot()
+    media_bytes = sum(os.path.getsize(os.path.join(media_dir, name)) for name in os.listdir(media_dir))
+    return {
+        "format": audio_format,
+        "package_bytes": os.path.getsize(package),
+        "media_bytes": media_bytes,
+        "package_write_seconds": snapshot["histograms"]["package_write_seconds"]["sum"],
+        "total_seconds": round(total, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音频格式基准 (卡组体积与打包耗时)")
+    parser.add_argument("--words", type=int, default=100, help="生成的单词数量")
+    parser.add_argument("--formats", nargs="+", default=DEFAULT_FORMATS, help="参与比较的音频格式")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    words = [f"{SAMPLE_WORDS[i % len(SAMPLE_WORDS)]} {i}" for i in range(args.words)]
+    stub = StubLLMServer(latency_ms=1, jitter_ms=0)
+    base_url = stub.start()
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for audio_format in args.formats:
+                results.append(build_once(audio_format, words, base_url, work_dir))
+    finally:
+        stub.stop()
+
+    baseline = results[0]
+    print(f"{'格式':<24}{'卡组包':>12}{'媒体文件':>12}{'相对体积':>10}{'打包耗时':>10}")
+    for r in results:
+        ratio = r["package_bytes"] / baseline["package_bytes"]
+        print(f"{r['format']:<24}{r['package_bytes'] / 1024 / 1024:>10.2f}MB{r['media_bytes'] / 1024 / 1024:>10.2f}MB"
+              f"{ratio:>10.1%}{r['package_write_seconds']:>9.3f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"words": args.words, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端制卡流水线基准
+用本地模拟后端 (延迟可配置，不需要 API Key) 分别生成 100 / 1,000 / 10,000 个单词的卡组，
+测量每秒单词数、峰值内存 (RSS) 与各阶段耗时：prompt 处理 (缓存查询、请求构造与响应解析)、
+LLM 请求、SSML 构造、TTS 请求、音频写盘与卡组包写入。
+每个规模在独立的子进程中运行，峰值内存互不影响。结果可写入 JSON，
+用 --compare 与之前版本的结果比较，本地阶段或吞吐量退化超过阈值时以非零状态退出，可用于 CI。
+
+用法:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 100 1000 --json pipeline.json
+    python benchmarks/bench_pipeline.py --json new.json --compare pipeline.json --tolerance 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLE_WORDS = ["apple", "tear (crying)", "give up", "bank", "serendipity", "look forward to",
+                "content (happy)", "kangaroo", "a piece of cake", "present (gift)"]
+
+# 阶段名称 -> 指标快照中的直方图名称 (同名不同标签的直方图求和)
+STAGES = {
+    "prompt": ["prompt_seconds"],
+    "llm_request": ["llm_request_seconds"],
+    "ssml_build": ["ssml_build_seconds"],
+    "tts_request": ["tts_call_seconds"],
+    "media_io": ["disk_write_seconds"],
+    "package_write": ["package_write_seconds"],
+}
+
+# 只在本地执行的阶段：耗时不取决于模拟延迟，用于回归比较
+LOCAL_STAGES = ("prompt", "ssml_build", "media_io", "package_write")
+
+
+def peak_rss_mb():
+    """
+    当前进程的峰值常驻内存 (MB)，不支持的平台返回 None
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def stage_summary(histograms, names, words):
+    """
+    合并同一阶段的直方图 (不同标签)，返回总耗时、每个单词的平均耗时与调用次数
+    """
+    total = 0.0
+    count = 0
+    p90 = None
+    for series, summary in histograms.items():
+        if series.split("{")[0] in names and summary["count"]:
+            total += summary["sum"]
+            count += summary["count"]
+            p90 = max(p90 or 0, summary["p90"] or 0)
+    return {"seconds": round(total, 4), "ms_per_word": round(total * 1000 / words, 4) if words else None,
+            "calls": count, "p90_ms": round(p90 * 1000, 3) if p90 is not None else None}
+
+
+def run_one(args):
+    """
+    在当前进程中生成一个卡组并返回测量结果 (由父进程以子进程方式调用)
+    """
+    from fake_backends import StubLLMServer
+    from generate import create_anki_package
+    from metrics import get_metrics
+
+    words = [f"{SAMPLE_WORDS[i % len(SAMPLE_WORDS)]} {i}" for i in range(args.run_one)]
+    stub = StubLLMServer(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms)
+    base_url = stub.start()
+    api_config = {"base_url": base_url, "api_key": "stub", "model_name": "stub", "structured_output": True}
+    azure_config = {"backend": "fake", "speech_key": "fake", "region": "local", "voice_name": "en-GB-SoniaNeural",
+                    "audio_format": args.audio_format, "fake_latency_ms": args.tts_latency_ms,
+                    "fake_jitter_ms": args.tts_jitter_ms}
+    concurrency = {"llm_workers": args.llm_workers, "tts_workers": args.tts_workers, "queue_size": 64}
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            package = os.path.join(work_dir, "bench.apkg")
+            get_metrics().reset()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                create_anki_package(words, package_name=package, media_output_dir=os.path.join(work_dir, "media"),
+                                    api_config=api_config, azure_config=azure_config, speed_config=None,
+                                    deck_name="bench", concurrency_config=concurrency, delete_media=True)
+            total = time.perf_counter() - started
+            package_bytes = os.path.getsize(package)
+    finally:
+        stub.stop()
+
+    snapshot = get_metrics().snapshot()
+    histograms = snapshot["histograms"]
+    return {
+        "words": args.run_one,
+        "total_seconds": round(total, 3),
+        "words_per_second": round(args.run_one / total, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "package_bytes": package_bytes,
+        "stages": {stage: stage_summary(histograms, names, args.run_one) for stage, names in STAGES.items()},
+        "errors": {k: v for k, v in snapshot["counters"].items() if k.startswith(("llm_errors", "tts_errors"))},
+    }
+
+
+def run_size(size, args):
+    """
+    在子进程中运行一个规模，返回其测量结果
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--run-one", str(size),
+               "--llm-latency-ms", str(args.llm_latency_ms), "--llm-jitter-ms", str(args.llm_jitter_ms),
+               "--tts-latency-ms", str(args.tts_latency_ms), "--tts-jitter-ms", str(args.tts_jitter_ms),
+               "--llm-workers", str(args.llm_workers), "--tts-workers", str(args.tts_workers),
+               "--audio-format", args.audio_format]
+    out = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{size} 个单词的基准运行失败:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance, min_delta_ms=1.0):
+    """
+    与之前的结果比较：吞吐量下降、峰值内存或本地阶段的每词耗时上升超过 tolerance 记为退化
+    (本地阶段每词耗时的绝对变化小于 min_delta_ms 时视为噪声，不计入)
+
+    Returns:
+        list: 退化项的说明
+    """
+    regressions = []
+    if baseline.get("settings") != results["settings"]:
+        print("⚠️ 基准设置 (模拟延迟、并发数或音频格式) 与对比结果不同，比较结果仅供参考")
+    old_runs = {run["words"]: run for run in baseline.get("runs", [])}
+    for run in results["runs"]:
+        old = old_runs.get(run["words"])
+        if old is None:
+            continue
+        checks = [("words_per_second", old["words_per_second"], run["words_per_second"], True, 0),
+                  ("peak_rss_mb", old.get("peak_rss_mb"), run.get("peak_rss_mb"), False, 0)]
+        checks += [(f"{stage}.ms_per_word", old["stages"][stage]["ms_per_word"],
+                    run["stages"][stage]["ms_per_word"], False, min_delta_ms)
+                   for stage in LOCAL_STAGES if stage in old.get("stages", {})]
+        for name, before, after, higher_is_better, min_delta in checks:
+            if not before or after is None or abs(after - before) < min_delta:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{run['words']} 词 {name}: {before} -> {after} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端制卡流水线基准")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000], help="卡组规模 (单词数)")
+    parser.add_argument("--llm-latency-ms", type=float, default=20, help="模拟 LLM 的平均延迟 (毫秒)")
+    parser.add_argument("--llm-jitter-ms", type=float, default=5, help="模拟 LLM 的延迟抖动 (毫秒)")
+    parser.add_argument("--tts-latency-ms", type=float, default=20, help="模拟 TTS 的平均延迟 (毫秒)")
+    parser.add_argument("--tts-jitter-ms", type=float, default=5, help="模拟 TTS 的延迟抖动 (毫秒)")
+    parser.add_argument("--llm-workers", type=int, default=16, help="LLM 并发线程数")
+    parser.add_argument("--tts-workers", type=int, default=16, help="TTS 并发线程数")
+    parser.add_argument("--audio-format", default="mp3-24k-48kbps", help="音频格式 (见 tts.AUDIO_FORMATS)")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件")
+    parser.add_argument("--compare", default=None, help="与之前写入的 JSON 结果比较")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="判定为退化的相对变化阈值")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="本地阶段每词耗时变化小于该值时视为噪声")
+    parser.add_argument("--run-one", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one is not None:
+        print(json.dumps(run_one(args), ensure_ascii=False))
+        return
+
+    settings = {key: getattr(args, key) for key in ("llm_latency_ms", "llm_jitter_ms", "tts_latency_ms",
+                                                     "tts_jitter_ms", "llm_workers", "tts_workers", "audio_format")}
+    results = {"python": sys.version.split()[0], "settings": settings, "runs": []}
+
+    header = "".join(f"{stage:>14}" for stage in STAGES)
+    print(f"{'单词数':>8}{'词/秒':>10}{'峰值内存':>10}{header}   (各阶段为每个单词的平均耗时，毫秒)")
+    for size in args.sizes:
+        run = run_size(size, args)
+        results["runs"].append(run)
+        stages = "".join(f"{run['stages'][stage]['ms_per_word']:>14.3f}" for stage in STAGES)
+        rss = f"{run['peak_rss_mb']:.0f}MB" if run["peak_rss_mb"] is not None else "-"
+        print(f"{size:>8}{run['words_per_second']:>10.1f}{rss:>10}{stages}")
+        if run["errors"]:
+            print(f"⚠️ {size} 个单词的运行中出现错误: {run['errors']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"❌ 退化: {line}")
+        print("🎉 没有超过阈值的退化" if not regressions else f"❌ {len(regressions)} 项超过 {args.tolerance:.0%} 的退化阈值")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
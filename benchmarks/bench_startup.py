@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准
+测量 `import main` 与 `python main.py check` 的耗时 (扣除空解释器启动时间)，
+并确认这些路径没有加载 openai / Azure SDK / genanki 等重量级模块。
+超出启动预算或加载了重量级模块时以非零状态退出，可用于 CI。
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --budget-ms 150 --json startup.json
+"""
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动路径上不应出现的重量级模块
+HEAVY_MODULES = ("openai", "httpx", "genanki", "azure.cognitiveservices.speech")
+
+
+def time_command(args, runs):
+    """
+    Returns:
+        float: 多次运行耗时的中位数 (毫秒)
+    """
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(args, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def loaded_heavy_modules(code):
+    """
+    在子进程中执行 code，返回执行后已加载的重量级模块
+    """
+    probe = code + "\nimport sys\nprint(repr(sorted(m for m in %r if m in sys.modules)))" % (HEAVY_MODULES,)
+    out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True).stdout
+    return ast.literal_eval(out.strip().splitlines()[-1]) if out.strip() else None
+
+
+def make_offline_config(tmp_dir):
+    # 基于仓库的 config.yaml，换成本地模拟后端，check 不会因为未填写的密钥报错
+    with open(os.path.join(ROOT, "config.yaml"), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config.setdefault("backends", {}).update(llm="stub", tts="fake")
+    words = os.path.join(tmp_dir, "words.txt")
+    with open(words, "w", encoding="utf-8") as f:
+        f.write("apple\ntear (crying)\n")
+    config["paths"]["input_txt"] = words
+    config["paths"]["output_package"] = os.path.join(tmp_dir, "out.apkg")
+    path = os.path.join(tmp_dir, "config.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--runs", type=int, default=10, help="每项测量的运行次数 (取中位数)")
+    parser.add_argument("--budget-ms", type=float, default=150, help="import main 的启动预算 (毫秒，已扣除解释器启动)")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = make_offline_config(tmp_dir)
+
+        baseline = time_command([sys.executable, "-c", "pass"], args.runs)
+        import_main = time_command([sys.executable, "-c", "import main"], args.runs)
+        check = time_command([sys.executable, "main.py", "--config", config_path, "check"], args.runs)
+        dry_run = time_command([sys.executable, "main.py", "--config", config_path, "--dry-run"], args.runs)
+
+        heavy_import = loaded_heavy_modules("import main")
+        heavy_check = loaded_heavy_modules(
+            "import main\ntry:\n    main.main(['--config', %r, '--dry-run'])\nexcept SystemExit:\n    pass" % config_path)
+
+    results = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "interpreter_ms": round(baseline, 1),
+        "import_main_ms": round(import_main - baseline, 1),
+        "check_ms": round(check - baseline, 1),
+        "dry_run_ms": round(dry_run - baseline, 1),
+        "budget_ms": args.budget_ms,
+        "heavy_modules_after_import": heavy_import,
+        "heavy_modules_after_dry_run": heavy_check,
+    }
+
+    print(f"🐍 解释器启动: {results['interpreter_ms']} ms")
+    print(f"📦 import main: {results['import_main_ms']} ms (预算 {args.budget_ms:.0f} ms)")
+    print(f"✅ main.py check: {results['check_ms']} ms")
+    print(f"🧪 main.py --dry-run: {results['dry_run_ms']} ms")
+    print(f"🔍 import main 后已加载的重量级模块: {heavy_import or '无'}")
+    print(f"🔍 --dry-run 后已加载的重量级模块: {heavy_check or '无'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    ok = results["import_main_ms"] <= args.budget_ms and not heavy_import and not heavy_check
+    print("🎉 启动预算达标" if ok else "❌ 超出启动预算或加载了重量级模块")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
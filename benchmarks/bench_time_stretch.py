@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地慢读拉伸基准与试听样本
+测量 time_stretch_pcm 每个单词片段的 CPU 耗时 (与一次 TTS 网络往返比较)，
+并检查拉伸后的时长比例与基频是否保持不变。
+默认使用合成的类语音信号 (带音节包络的谐波)，也可以用 --input 指定真实的 TTS 录音 (16 位单声道 WAV)。
+加 --listen 时把原始音频与各语速的拉伸结果写成 WAV，用于人工试听。
+P90 耗时超出预算或时长/音高偏差过大时以非零状态退出，可用于 CI。
+
+用法:
+    python benchmarks/bench_time_stretch.py
+    python benchmarks/bench_time_stretch.py --input word.wav --rates=-20%,-30%,-50% --listen listen/
+    python benchmarks/bench_time_stretch.py --runs 50 --round-trip-ms 200 --json stretch.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from audio_utils import pcm_to_wav_bytes, wav_bytes_to_pcm  # noqa: E402
+from time_stretch import rate_to_speed, time_stretch_pcm  # noqa: E402
+
+
+def synthetic_word(seconds=0.8, sample_rate=24000, f0=150.0):
+    """
+    生成类似单词朗读的测试信号：基频 f0 的谐波 (高次谐波逐渐衰减)，两个音节的包络
+
+    Returns:
+        bytes: 16 位单声道 PCM
+    """
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voice = sum(np.sin(2 * np.pi * f0 * h * t) / h for h in range(1, 9))
+    envelope = np.sin(np.pi * np.clip(t / seconds * 2 % 1, 0, 1)) ** 2
+    signal = voice * envelope
+    signal = signal / np.max(np.abs(signal)) * 12000
+    return signal.astype('<i2').tobytes()
+
+
+def estimate_f0(pcm, sample_rate, lo=60, hi=400):
+    """
+    用自相关估计基频 (取能量最高的 100 毫秒)
+
+    Returns:
+        float: 基频 (Hz)
+    """
+    x = np.frombuffer(pcm, dtype='<i2').astype(np.float64)
+    size = int(sample_rate * 0.1)
+    if len(x) > size:
+        energy = np.convolve(x ** 2, np.ones(size), mode='valid')
+        start = int(np.argmax(energy))
+        x = x[start:start + size]
+    x = x - x.mean()
+    corr = np.correlate(x, x, mode='full')[len(x) - 1:]
+    min_lag, max_lag = int(sample_rate / hi), int(sample_rate / lo)
+    lag = min_lag + int(np.argmax(corr[min_lag:max_lag]))
+    return sample_rate / lag
+
+
+def measure(pcm, sample_rate, speed, runs):
+    """
+    Returns:
+        tuple: (拉伸结果, 每次耗时列表 (毫秒))
+    """
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = time_stretch_pcm(pcm, speed, sample_rate=sample_rate)
+        samples.append((time.perf_counter() - started) * 1000)
+    return out, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地慢读拉伸基准")
+    parser.add_argument("--input", default=None, help="16 位单声道 WAV 录音 (默认使用合成信号)")
+    parser.add_argument("--rates", default="-30%",
+                        help="要测试的慢读语速，逗号分隔 (Azure prosody rate 格式，例如 --rates=-20%%,-30%%)")
+    parser.add_argument("--runs", type=int, default=20, help="每个语速的重复次数")
+    parser.add_argument("--round-trip-ms", type=float, default=200, help="用于比较的一次 TTS 网络往返耗时 (毫秒)")
+    parser.add_argument("--budget-ms", type=float, default=50, help="每个片段拉伸耗时 (P90) 的预算 (毫秒)")
+    parser.add_argument("--listen", default=None, help="把原始与拉伸后的音频写入该目录，用于试听")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, "rb") as f:
+            pcm, sample_rate = wav_bytes_to_pcm(f.read())
+    else:
+        sample_rate = 24000
+        pcm = synthetic_word(sample_rate=sample_rate)
+    source_seconds = len(pcm) / 2 / sample_rate
+    source_f0 = estimate_f0(pcm, sample_rate)
+
+    if args.listen:
+        os.makedirs(args.listen, exist_ok=True)
+        with open(os.path.join(args.listen, "original.wav"), "wb") as f:
+            f.write(pcm_to_wav_bytes(pcm, sample_rate))
+
+    print(f"🎙️ 输入: {args.input or '合成信号'}，{source_seconds:.2f} 秒，基频 {source_f0:.1f} Hz")
+    results = {"input": args.input, "sample_rate": sample_rate, "source_seconds": round(source_seconds, 3),
+               "source_f0_hz": round(source_f0, 1), "round_trip_ms": args.round_trip_ms,
+               "budget_ms": args.budget_ms, "rates": []}
+    ok = True
+    for rate in args.rates.split(","):
+        speed = rate_to_speed(rate)
+        out, samples = measure(pcm, sample_rate, speed, args.runs)
+        ratio = len(out) / len(pcm)
+        f0 = estimate_f0(out, sample_rate)
+        p90 = sorted(samples)[max(0, int(len(samples) * 0.9) - 1)]
+        row = {"rate": rate, "speed": speed, "p50_ms": round(statistics.median(samples), 2),
+               "p90_ms": round(p90, 2), "duration_ratio": round(ratio, 3),
+               "expected_ratio": round(1 / speed, 3), "f0_hz": round(f0, 1)}
+        results["rates"].append(row)
+
+        ratio_ok = abs(ratio * speed - 1) < 0.02
+        pitch_ok = abs(f0 / source_f0 - 1) < 0.03
+        ok = ok and ratio_ok and pitch_ok and p90 <= args.budget_ms
+        print(f"⏱️ {rate}: P50 {row['p50_ms']} ms / P90 {row['p90_ms']} ms "
+              f"(约为一次网络往返的 {p90 / args.round_trip_ms:.0%})，"
+              f"时长 ×{row['duration_ratio']} (期望 ×{row['expected_ratio']})，基频 {row['f0_hz']} Hz"
+              f"{'' if ratio_ok and pitch_ok else ' ❌'}")
+
+        if args.listen:
+            name = f"stretched_{rate.replace('%', 'pct')}.wav"
+            with open(os.path.join(args.listen, name), "wb") as f:
+                f.write(pcm_to_wav_bytes(out, sample_rate))
+
+    if args.listen:
+        print(f"🎧 试听样本已写入: {args.listen}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print("🎉 拉伸耗时与音质检查通过" if ok else "❌ 超出耗时预算或时长/音高偏差过大")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
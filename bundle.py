@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+分片构建的中间卡片包 (.bundle) 与合并
+大单词列表按输入序号轮流分成 N 个分片，每个分片在独立的进程或机器上生成一个中间卡片包：
+笔记字段、GUID、全局输入序号与音频文件 (zip)。merge_bundles 按输入顺序把所有分片合并为一个 .apkg，
+沿用固定的 Model ID 与 Deck ID，多个分片中相同的音频 (内容哈希文件名相同) 只写入一次。
+"""
+
+import heapq
+import json
+import os
+import tempfile
+import zipfile
+
+BUNDLE_FORMAT = 1
+
+
+def parse_shard(text):
+    """
+    解析分片参数，例如 "0/4" -> (0, 4)
+
+    Raises:
+        ValueError: 格式不正确或序号超出范围
+    """
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"分片参数格式应为 序号/总数 (例如 0/4): {text}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片序号应在 0 到 {count - 1} 之间: {text}")
+    return index, count
+
+
+def shard_path(path, shard, ext=None):
+    """
+    为分片生成独立的文件或目录路径，例如 ("build_journal.jsonl", (0, 4)) -> build_journal.shard-0-of-4.jsonl
+
+    Args:
+        path: 原路径
+        shard: (分片序号, 分片总数)
+        ext: 替换扩展名 (含 ".")，默认保留原扩展名
+    """
+    root, old_ext = os.path.splitext(path)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{old_ext if ext is None else ext}"
+
+
+def select_shard(words, shard):
+    """
+    按输入序号轮流分配：第 k 个单词属于分片 k % N。
+    分片内第 j 个单词的全局序号为 j * N + 分片序号，合并时据此恢复输入顺序。
+    """
+    index, count = shard
+    for position, word in enumerate(words):
+        if position % count == index:
+            yield word
+
+
+class CardBundleWriter:
+    """
+    流式写入中间卡片包 (接口与 apkg_writer.StreamingPackageWriter 相同，单线程使用)
+    """
+
+    def __init__(self, path, shard, deck_name, model_id, deck_id, delete_media=False):
+        """
+        Args:
+            path: 输出的 .bundle 路径
+            shard: (分片序号, 分片总数)
+            deck_name: 卡组名称
+            model_id: 卡片模板 ID
+            deck_id: 卡组 ID
+            delete_media: 音频写入卡片包后是否删除原文件
+        """
+        self.path = path
+        self.shard = shard
+        self.manifest = {"format": BUNDLE_FORMAT, "shard": shard[0], "shards": shard[1],
+                         "deck_name": deck_name, "model_id": model_id, "deck_id": deck_id}
+        self.delete_media = delete_media
+        self.media = {}
+        self.note_count = 0
+
+        # 卡片记录先写入临时文件 (按输入顺序追加)，关闭时再放入压缩包
+        fd, self._cards_path = tempfile.mkstemp(suffix='.jsonl', dir=os.path.dirname(os.path.abspath(path)))
+        self._cards = os.fdopen(fd, 'w', encoding='utf-8')
+        self._zip = zipfile.ZipFile(path, 'w')
+
+    def has_media(self, filename):
+        """
+        卡片包中是否已有该文件名的音频
+        """
+        return os.path.basename(filename) in self.media
+
+    def add_media(self, path):
+        """
+        把一个音频文件写入卡片包 (同名文件只写入一次)
+
+        Returns:
+            bool: 卡片包中是否有该文件
+        """
+        name = os.path.basename(path)
+        if name not in self.media:
+            if not os.path.exists(path):
+                return False
+            self._zip.write(path, f"media/{name}")
+            self.media[name] = name
+        if self.delete_media and os.path.exists(path):
+            os.remove(path)
+        return True
+
+    def add_note(self, note, media_paths=(), index=None):
+        """
+        写入一条笔记及其音频
+
+        Args:
+            note: genanki.Note
+            media_paths: 笔记引用的音频文件路径
+            index: 分片内的输入序号 (合并时换算为全局序号)
+        """
+        names = [os.path.basename(path) for path in media_paths if path and self.add_media(path)]
+        record = {"index": index * self.shard[1] + self.shard[0], "guid": note.guid,
+                  "fields": note.fields, "tags": note.tags, "media": names}
+        self._cards.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.note_count += 1
+
+    def close(self):
+        """
+        写入卡片记录与清单，完成卡片包
+        """
+        self._cards.close()
+        try:
+            self._zip.write(self._cards_path, 'cards.jsonl')
+            self._zip.writestr('manifest.json', json.dumps(dict(self.manifest, cards=self.note_count),
+                                                          ensure_ascii=False))
+            self._zip.close()
+        finally:
+            os.remove(self._cards_path)
+
+    def abort(self):
+        """
+        放弃写入，删除未完成的卡片包与临时文件
+        """
+        self._cards.close()
+        self._zip.close()
+        for path in (self._cards_path, self.path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _iter_cards(bundle_zip, position):
+    # 产出 (全局序号, 分片位置, 卡片记录)，用于多路归并
+    with bundle_zip.open('cards.jsonl') as f:
+        for line in f:
+            card = json.loads(line)
+            yield card["index"], position, card
+
+
+def merge_bundles(bundle_paths, package_name, deck_name=None):
+    """
+    按输入顺序把多个分片的卡片包合并为一个 .apkg
+
+    Args:
+        bundle_paths: .bundle 路径列表 (顺序任意)
+        package_name: 输出的 .apkg 路径
+        deck_name: 卡组名称，默认使用分片中记录的名称
+
+    Returns:
+        dict: 合并的卡片数、媒体文件数与缺失的分片序号
+
+    Raises:
+        ValueError: 分片来自不同的构建 (分片总数或模板不一致) 或分片重复
+    """
+    import genanki
+    from apkg_writer import StreamingPackageWriter
+    from generate import build_anki_model, MODEL_ID, DECK_ID
+
+    zips = [zipfile.ZipFile(path) for path in bundle_paths]
+    try:
+        manifests = [json.loads(z.read('manifest.json')) for z in zips]
+        counts = {m["shards"] for m in manifests}
+        if len(counts) != 1:
+            raise ValueError(f"分片总数不一致: {sorted(counts)}")
+        if any(m["model_id"] != MODEL_ID or m["deck_id"] != DECK_ID for m in manifests):
+            raise ValueError("分片使用的卡片模板或卡组 ID 与当前版本不一致")
+        shards = [m["shard"] for m in manifests]
+        if len(set(shards)) != len(shards):
+            raise ValueError(f"存在重复的分片: {sorted(shards)}")
+        missing = sorted(set(range(counts.pop())) - set(shards))
+
+        model = build_anki_model()
+        tmp_package = package_name + ".tmp"
+        writer = StreamingPackageWriter(tmp_package, model, DECK_ID, deck_name or manifests[0]["deck_name"])
+        try:
+            # 每个分片内部已按全局序号排列，多路归并即可恢复输入顺序
+            streams = [_iter_cards(z, i) for i, z in enumerate(zips)]
+            for _, i, card in heapq.merge(*streams, key=lambda item: item[:2]):
+                for name in card["media"]:
+                    if not writer.has_media(name):
+                        with zips[i].open(f"media/{name}") as src:
+                            writer.add_media_from(name, src)
+                writer.add_note(genanki.Note(model=model, fields=card["fields"], guid=card["guid"],
+                                             tags=card["tags"]))
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+        os.replace(tmp_package, package_name)
+        return {"cards": writer.note_count, "media": len(writer.media), "missing_shards": missing}
+    finally:
+        for z in zips:
+            z.close()
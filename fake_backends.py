@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟后端 (不需要网络，也不消耗额度)
+- StubLLMServer: OpenAI 兼容的 HTTP 模拟服务，返回固定格式的音标、释义和例句
+- FakeSynthesizer: 模拟 TTS 合成器，返回静音音频 (WAV / PCM / MP3 / Ogg Opus / WebM Opus 均为可播放的有效音频；支持书签偏移量)
+两者都支持可配置的延迟、抖动和错误率，用于离线跑通完整流程、测量与调优吞吐量。
+
+也可以单独启动模拟 LLM 服务:
+    python fake_backends.py --port 8765 --latency-ms 800 --jitter-ms 300
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from audio_utils import (TICKS_PER_SECOND, pcm_to_wav_bytes, silent_mp3_bytes, silent_ogg_opus_bytes,
+                         silent_webm_opus_bytes)
+
+
+def _sample_latency(latency_ms, jitter_ms):
+    # 基础延迟 ± 抖动 (均匀分布)，单位秒
+    return max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000.0
+
+
+def _sense_count(word):
+    # 每个单词固定 1~3 个义项 (同一单词每次结果相同)
+    return 1 + zlib.crc32(word.encode("utf-8")) % 3
+
+
+def _strip_input(text):
+    return text.replace("Input:", "", 1).strip()
+
+
+def _strip_context(text):
+    return re.sub(r'[\(（].*?[\)）]', '', text).strip()
+
+
+def _canned_card(input_text):
+    word = _strip_context(input_text)
+    count = _sense_count(word)
+    return {
+        "ipa": f"/{word.lower()}/",
+        "definitions": [f"Sample meaning {i} of the word \"{word}\" used for offline testing."
+                        for i in range(1, count + 1)],
+        "examples": [f"This is example sentence {i} showing how to use \"{word}\" naturally."
+                     for i in range(1, count + 1)],
+    }
+
+
+def canned_completion(system_prompt, user_content, json_mode=False):
+    """
+    根据 system prompt 的类型返回固定格式的模拟输出
+
+    Returns:
+        str: 模拟的模型输出
+    """
+    if "JSON array of inputs" in system_prompt:
+        inputs = json.loads(user_content.replace("Inputs:", "", 1).strip())
+        cards = [{"input": x, **_canned_card(x)} for x in inputs]
+        return json.dumps({"cards": cards}, ensure_ascii=False)
+
+    if json_mode:
+        return json.dumps(_canned_card(_strip_input(user_content)), ensure_ascii=False)
+
+    if "International Phonetic Alphabet" in system_prompt:
+        return f"Output: {_canned_card(_strip_input(user_content))['ipa']}"
+
+    if "numbered English definitions" in system_prompt:
+        card = _canned_card(_strip_input(user_content))
+        return "Output:\n" + "\n".join(f"{i}. {d}" for i, d in enumerate(card["definitions"], 1))
+
+    if "example sentences" in system_prompt:
+        # 例句数量与输入的释义数量一致
+        parts = user_content.split("**Current Input Definitions:**")
+        word = parts[0].replace("**Current Input Word:**", "").strip()
+        count = len(re.findall(r'^\s*\d+\.', parts[1], re.M)) if len(parts) > 1 else 1
+        return "Output:\n" + "\n".join(
+            f"{i}. This is example sentence {i} showing how to use \"{word}\" naturally."
+            for i in range(1, max(1, count) + 1))
+
+    return "Output: " + user_content[:100]
+
+
+class StubLLMServer:
+    """
+    OpenAI 兼容的模拟服务，实现 POST /chat/completions (以及 /v1/chat/completions)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=800, jitter_ms=300,
+                 error_rate=0.0, rate_limit_rate=0.0):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示自动分配
+            latency_ms: 平均响应延迟 (毫秒)
+            jitter_ms: 延迟抖动范围 (毫秒)
+            error_rate: 返回 500 错误的概率
+            rate_limit_rate: 返回 429 限流 (带 Retry-After) 的概率
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+
+                time.sleep(_sample_latency(stub.latency_ms, stub.jitter_ms))
+
+                roll = random.random()
+                if roll < stub.rate_limit_rate:
+                    self._send_json(429, {"error": {"message": "Rate limit exceeded (stub)", "type": "rate_limit_error"}},
+                                    headers={"Retry-After": "1"})
+                    return
+                if roll < stub.rate_limit_rate + stub.error_rate:
+                    self._send_json(500, {"error": {"message": "Internal error (stub)", "type": "server_error"}})
+                    return
+
+                messages = request.get("messages", [])
+                system_prompt = messages[0]["content"] if messages else ""
+                user_content = messages[-1]["content"] if messages else ""
+                json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+                content = canned_completion(system_prompt, user_content, json_mode=json_mode)
+
+                prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4 + 1
+                completion_tokens = len(content) // 4 + 1
+                self._send_json(200, {
+                    "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                })
+
+        return Handler
+
+    def start(self):
+        """
+        在后台线程中启动服务
+
+        Returns:
+            str: 可直接作为 base_url 使用的地址
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ==========================================
+# 模拟 TTS
+# ==========================================
+_BOOKMARK_RE = re.compile(r"<bookmark\s+mark=['\"]([^'\"]+)['\"]\s*/>")
+_BREAK_RE = re.compile(r"<break\s+time=['\"](\d+)ms['\"]\s*/>")
+
+
+def _estimate_seconds(ssml_fragment):
+    # 粗略估计朗读时长：每个单词 0.3 秒，加上 <break> 的停顿
+    pauses = sum(int(ms) for ms in _BREAK_RE.findall(ssml_fragment)) / 1000.0
+    text = re.sub(r'<[^>]+>', ' ', ssml_fragment)
+    return len(text.split()) * 0.3 + pauses
+
+
+def _format_sample_rate(output_format):
+    # 从格式名称中解析采样率，例如 Raw24Khz16BitMonoPcm -> 24000；默认与 SDK 一致 (16kHz)
+    match = re.search(r'(\d+)Khz', output_format or "")
+    if match:
+        return int(match.group(1)) * 1000
+    match = re.search(r'(\d+)Hz', output_format or "")
+    return int(match.group(1)) if match else 16000
+
+
+def _format_bitrate_kbps(output_format, default=32):
+    # 从格式名称中解析比特率，例如 Audio24Khz48KBitRateMonoMp3 -> 48, Webm24Khz16Bit24KbpsMonoOpus -> 24
+    match = re.search(r'(\d+)(?:KBitRate|Kbps)', output_format or "")
+    return int(match.group(1)) if match else default
+
+
+class FakeSynthesizer:
+    """
+    模拟合成器：接口与 azure_tts.SynthesizerPool 相同，返回与朗读时长相符的静音音频
+    """
+
+    def __init__(self, voice_name="en-GB-SoniaNeural", output_format=None,
+                 latency_ms=400, jitter_ms=150, error_rate=0.0, rate_limit_rate=0.0):
+        """
+        Args:
+            voice_name: 声音名称 (仅用于缓存键)
+            output_format: 输出格式名称；Raw 返回原始 PCM，MP3 / Ogg / Webm 返回对应容器的静音音频
+                           (体积与同码率的真实语音相同)，其余返回 WAV
+            latency_ms: 平均合成延迟 (毫秒)
+            jitter_ms: 延迟抖动范围 (毫秒)
+            error_rate: 合成失败的概率
+            rate_limit_rate: 被限流 (相当于 Azure TooManyRequests) 的概率
+        """
+        self.voice_name = voice_name
+        self.output_format = output_format
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.sample_rate = _format_sample_rate(output_format)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _silence(self, seconds):
+        output_format = self.output_format or ""
+        if output_format.endswith("Mp3"):
+            return silent_mp3_bytes(seconds, self.sample_rate, _format_bitrate_kbps(output_format))
+        if output_format.startswith("Ogg"):
+            return silent_ogg_opus_bytes(seconds, self.sample_rate, _format_bitrate_kbps(output_format))
+        if output_format.startswith("Webm"):
+            return silent_webm_opus_bytes(seconds, self.sample_rate, _format_bitrate_kbps(output_format))
+        pcm = b"\x00\x00" * int(seconds * self.sample_rate)
+        if output_format.startswith("Raw"):
+            return pcm
+        return pcm_to_wav_bytes(pcm, sample_rate=self.sample_rate)
+
+    def _synthesize(self, ssml_text):
+        from tts import SynthesisResult
+        with self._lock:
+            self.requests += 1
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return SynthesisResult(error="Error: Too many requests (fake)", retryable=True, rate_limited=True)
+        if roll < self.rate_limit_rate + self.error_rate:
+            return SynthesisResult(error="Error: simulated synthesis failure (fake)", retryable=True)
+        return SynthesisResult(audio_data=self._silence(_estimate_seconds(ssml_text)))
+
+    def speak_many(self, ssml_list):
+        # 多个请求同时在途：总耗时取各请求延迟的最大值
+        time.sleep(max((_sample_latency(self.latency_ms, self.jitter_ms) for _ in ssml_list), default=0))
+        return [self._synthesize(ssml_text) for ssml_text in ssml_list]
+
+    def speak_with_bookmarks(self, ssml_text):
+        time.sleep(_sample_latency(self.latency_ms, self.jitter_ms))
+        result = self._synthesize(ssml_text)
+        if not result.ok:
+            return result, []
+
+        # 按书签之前的文本长度计算各书签的音频偏移量
+        bookmarks = []
+        elapsed = 0.0
+        pos = 0
+        for match in _BOOKMARK_RE.finditer(ssml_text):
+            elapsed += _estimate_seconds(ssml_text[pos:match.start()])
+            bookmarks.append((match.group(1), int(elapsed * TICKS_PER_SECOND)))
+            pos = match.end()
+        return result, bookmarks
+
+
+_fake_lock = threading.Lock()
+_fakes = {}
+
+
+def get_fake_synthesizer(azure_config: dict, output_format=None) -> FakeSynthesizer:
+    """
+    获取与配置对应的共享模拟合成器
+
+    Args:
+        azure_config (dict): TTS 配置，可选 fake_latency_ms, fake_jitter_ms, fake_error_rate, fake_rate_limit_rate
+        output_format: 输出格式名称
+    """
+    key = (
+        azure_config.get("voice_name", "en-GB-SoniaNeural"),
+        output_format,
+        azure_config.get("fake_latency_ms", 400),
+        azure_config.get("fake_jitter_ms", 150),
+        azure_config.get("fake_error_rate", 0.0),
+        azure_config.get("fake_rate_limit_rate", 0.0),
+    )
+    with _fake_lock:
+        fake = _fakes.get(key)
+        if fake is None:
+            fake = FakeSynthesizer(*key)
+            _fakes[key] = fake
+        return fake
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地模拟 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--jitter-ms", type=float, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    cli_args = parser.parse_args()
+
+    server = StubLLMServer(cli_args.host, cli_args.port, cli_args.latency_ms, cli_args.jitter_ms,
+                           cli_args.error_rate, cli_args.rate_limit_rate)
+    print(f"🧪 模拟 LLM 服务已启动: {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,16 +1,517 @@
 import os
 import re
-from openai import OpenAI
-import azure.cognitiveservices.speech as speechsdk
-import genanki
+import json
+import sqlite3
+import threading
+import time
+import functools
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from batching import BatchSizer, estimate_tokens, salvage_json_objects
+from pipeline import run_pipeline, SingleFlight
+from retry_queue import RetryQueue
+from tts import get_tts_backend, resolve_audio_format, speak_many_limited, speak_with_bookmarks_limited
+from incremental import ExistingPackage, note_guid, AUDIO_KEYS
+from apkg_writer import StreamingPackageWriter
+from audio_cache import AudioCache, media_filename
+from word_list import DedupedWords
+from bundle import CardBundleWriter, select_shard
+from audio_utils import pcm_to_wav_bytes, split_pcm_by_offsets, wav_bytes_to_pcm
+from ratelimit import get_rate_limiter, parse_retry_after, RetryableError, limiter_summaries
+from metrics import get_metrics, ProgressMeter
+from time_stretch import rate_to_speed, time_stretch_pcm
+
+# openai / httpx / genanki 导入较慢，只在第一次真正需要时加载 (缓存命中、配置检查时不加载)
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+# API 调用失败时写入字段的占位内容
+ERROR_PLACEHOLDER = "Error generating content"
+
+# 卡片的文本字段，以及依赖它的字段 (例句根据释义生成，释义失败时例句也要重做)
+TEXT_FIELDS = ("ipa", "definitions", "examples")
+FIELD_DEPENDENTS = {"ipa": (), "definitions": ("examples",), "examples": ()}
+
+# 每段音频朗读的文本字段 (单词音频只依赖单词本身)
+CLIP_SOURCES = {"word_slow": None, "word_fast": None, "definitions": "definitions", "examples": "examples"}
+
+# 卡片模板的固定 Model ID (增量更新时按它识别本工具生成的笔记)
+MODEL_ID = 1683920450
+
+# 卡组的固定 Deck ID
+DECK_ID = 2059400110
+
+# 共享的 OpenAI 客户端 (按 api_config 复用，线程安全)
+_client_lock = threading.Lock()
+_clients = {}
+
+
+def get_openai_client(api_config: dict = None) -> "OpenAI":
+    """
+    获取与 api_config 对应的长期复用 OpenAI 客户端。
+    同一配置只创建一次客户端与 HTTP 连接池，多个线程共享同一个客户端，避免每个单词重复握手。
+    
+    Args:
+        api_config (dict, optional): API 配置字典，除 base_url, api_key 外还支持以下连接池参数：
+            {
+                "max_connections": 32,            # 连接池最大连接数
+                "max_keepalive_connections": 16,  # 保持长连接的最大数量
+                "keepalive_expiry": 60,           # 空闲长连接的保留时间 (秒)
+                "timeout": 60,                    # 单次请求超时 (秒)
+                "connect_timeout": 10,            # 建立连接超时 (秒)
+                "max_retries": 2                  # SDK 内置重试次数 (配置了 rate_limit 时由限流器负责重试，SDK 不再重试)
+            }
+        
+    Returns:
+        OpenAI: 共享的客户端实例
+    """
+    api_config = api_config or {}
+    settings = {
+        "base_url": api_config.get("base_url", "https://ark.cn-beijing.volces.com/api/v3"),
+        "api_key": api_config.get("api_key", ""),
+        "max_connections": api_config.get("max_connections", 32),
+        "max_keepalive_connections": api_config.get("max_keepalive_connections", 16),
+        "keepalive_expiry": api_config.get("keepalive_expiry", 60),
+        "timeout": api_config.get("timeout", 60),
+        "connect_timeout": api_config.get("connect_timeout", 10),
+        "max_retries": 0 if get_rate_limiter("llm", api_config.get("rate_limit")) else api_config.get("max_retries", 2),
+    }
+    key = tuple(sorted(settings.items()))
+
+    with _client_lock:
+        client = _clients.get(key)
+        if client is None:
+            import httpx
+            from openai import OpenAI, DefaultHttpxClient
+
+            http_client = DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings["max_connections"],
+                    max_keepalive_connections=settings["max_keepalive_connections"],
+                    keepalive_expiry=settings["keepalive_expiry"],
+                ),
+                timeout=httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+            )
+            client = OpenAI(
+                base_url=settings["base_url"],
+                api_key=settings["api_key"],
+                max_retries=settings["max_retries"],
+                http_client=http_client,
+            )
+            _clients[key] = client
+        return client
+
+
+# 单词内部并行请求使用的共享线程池 (IPA 与释义并行)
+_prompt_executor = None
+
+
+def _get_prompt_executor() -> ThreadPoolExecutor:
+    global _prompt_executor
+    with _client_lock:
+        if _prompt_executor is None:
+            _prompt_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="prompt")
+        return _prompt_executor
+
+
+def _classify_openai_error(error):
+    """
+    判断 OpenAI SDK 抛出的错误能否重试
+
+    Returns:
+        tuple: (是否可重试, 是否为限流, Retry-After 秒数或 None)
+    """
+    import openai
+
+    retry_after = None
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = parse_retry_after(response.headers.get("retry-after"))
+        retry_after_ms = parse_retry_after(response.headers.get("retry-after-ms"))
+        if retry_after_ms is not None:
+            retry_after = retry_after_ms / 1000
+
+    if isinstance(error, openai.RateLimitError):
+        # 额度用尽同样返回 429，但重试没有意义
+        if getattr(error, "code", None) == "insufficient_quota":
+            return False, False, None
+        return True, True, retry_after
+    if isinstance(error, openai.APIConnectionError):
+        return True, False, None
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code in (408, 409), False, retry_after
+    return False, False, None
+
+
+def cache_get(cache, key):
+    """
+    读取 LLM 缓存；SQLite 出错 (例如数据库被其它进程锁住) 时按未命中处理
+    """
+    try:
+        return cache.get(key)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ 读取 LLM 缓存失败，按未命中处理: {e}")
+        return None
+
+
+def cache_set(cache, key, model_name, content):
+    """
+    写入 LLM 缓存；SQLite 出错时只打印警告，不影响本次结果
+    """
+    try:
+        cache.set(key, model_name, content)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ 写入 LLM 缓存失败，跳过缓存: {e}")
+
+
+def request_completion(client, model_name, system_prompt, user_content, cache=None,
+                       json_mode=False, validate=None, limiter=None):
+    """
+    通用 API 调用：先查缓存，未命中再请求模型。
+    
+    Args:
+        client: OpenAI 客户端，或返回客户端的无参函数 (第一次真正请求时才调用，缓存命中时不加载 openai)
+        model_name: 模型名称
+        system_prompt: system prompt
+        user_content: 用户输入
+        cache (CompletionCache, optional): LLM 补全缓存
+        json_mode (bool): 是否要求模型以 JSON 对象格式输出
+        validate (callable, optional): 校验函数，只有校验通过的结果才写入缓存
+        limiter (AdaptiveLimiter, optional): 共享限流器，负责 RPM / TPM 限流、429 退避与重试
+        
+    Returns:
+        str: 模型输出内容，出错时返回 "Error generating content"
+    """
+    metrics = get_metrics()
+
+    # 本地的 prompt 处理 (缓存查询与请求构造) 单独计时，与网络请求耗时区分开
+    with metrics.timer("prompt_seconds", step="prepare"):
+        # 先查缓存：相同模型 + 相同 prompt + 相同输入直接复用上次结果
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(model_name, system_prompt, user_content, *(["json"] if json_mode else []))
+            cached = cache_get(cache, cache_key)
+            if cached is not None:
+                metrics.incr("llm_cache_hits")
+                return cached
+            metrics.incr("llm_cache_misses")
+
+        request = {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            "temperature": 0.1, # 降低随机性，保证输出格式稳定
+        }
+        if json_mode:
+            request["response_format"] = {"type": "json_object"}
+
+    if callable(client):
+        client = client()
+
+    def send():
+        # 每次实际请求 (含重试) 单独计时
+        with metrics.timer("llm_request_seconds", mode="json" if json_mode else "text"):
+            return client.chat.completions.create(**request)
+
+    try:
+        if limiter is None:
+            response = send()
+        else:
+            # 预估 token 用量 (输入 + 输出的粗略估计)，拿到响应后按实际用量修正
+            estimated = estimate_tokens(system_prompt + user_content) + 300
+            response = limiter.call(send, _classify_openai_error, tokens=estimated)
+            usage = getattr(response, "usage", None)
+            limiter.reconcile_tokens(estimated, getattr(usage, "total_tokens", None))
+        content = response.choices[0].message.content.strip()
+    except RetryableError as e:
+        metrics.incr("llm_errors")
+        print(f"API调用出错 (共尝试 {limiter.max_attempts} 次): {e.last_error}")
+        return ERROR_PLACEHOLDER
+    except Exception as e:
+        metrics.incr("llm_errors")
+        print(f"API调用出错: {e}")
+        return ERROR_PLACEHOLDER
+
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.incr("llm_prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+        metrics.incr("llm_completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+    # 只缓存成功 (且通过校验) 的结果，出错的占位内容不写入缓存
+    with metrics.timer("prompt_seconds", step="response"):
+        if cache is not None and (validate is None or validate(content)):
+            cache_set(cache, cache_key, model_name, content)
+    return content
+
+
+# ==========================================
+# 结构化 JSON 模式：一次请求同时生成音标、释义和例句
+# ==========================================
+CARD_JSON_PROMPT = """
+You are an expert English lexicographer and phonetician specializing in British English.
+For the input word or phrase, return ONE JSON object with exactly these keys:
+
+* "ipa": the British English IPA transcription between slashes. For phrases, transcribe each word separated by spaces.
+* "definitions": an array of clear English definitions (without numbering).
+* "examples": an array of example sentences (without numbering), one per definition, in the same order.
+
+**Rules:**
+1.  **Phrases / Idioms:** Define the idiomatic meaning of the whole phrase, NOT the individual words. Example sentences must include the phrase naturally.
+2.  **Frequency:** If the input has only one common meaning, give exactly one definition. If it has multiple common meanings, give 2-3 definitions.
+3.  **Context (Parentheses):** If parentheses are present, use them to choose the pronunciation, and make the first definition the meaning described in the parentheses. Still list other high-frequency meanings afterwards, even if they are pronounced differently. Never transcribe or define the content inside the parentheses itself.
+4.  **Counts:** "examples" MUST have exactly the same number of items as "definitions".
+5.  Output ONLY the JSON object. No markdown, no explanations.
+
+**Examples:**
+
+Input: kangaroo
+Output: {"ipa": "/ˌkæŋɡəˈruː/", "definitions": ["A large Australian animal with a strong tail and back legs, which moves by jumping."], "examples": ["We saw a kangaroo jumping across the field during our trip to Australia."]}
+
+Input: give up
+Output: {"ipa": "/ɡɪv ʌp/", "definitions": ["To stop doing or having something (often a habit).", "To stop trying to guess or solve something."], "examples": ["I decided to give up smoking last year for my health.", "I give up; tell me the answer to the riddle."]}
+
+Input: tear (crying)
+Output: {"ipa": "/tɪə/", "definitions": ["A drop of clear salty liquid secreted by glands in your eyes.", "To pull or rip something apart or to pieces with force."], "examples": ["A single tear rolled down her cheek.", "Be careful not to tear the paper."]}
+"""
+
+
+def _strip_numbering(line: str) -> str:
+    # 去除模型有时自带的 "1." / "1)" 编号
+    return re.sub(r'^\s*\d+[\.\)]\s*', '', line).strip()
+
+
+def parse_card_json(content: str):
+    """
+    解析并校验结构化 JSON 输出。
+    
+    Args:
+        content (str): 模型输出
+        
+    Returns:
+        dict: 校验通过时返回 {"ipa", "definitions", "examples"} (释义与例句已格式化为编号列表)，
+              校验失败返回 None
+    """
+    # 兼容模型偶尔包裹的 ```json 代码块
+    text = re.sub(r'^```(?:json)?\s*|\s*```$', '', content.strip())
+    try:
+        data = json.loads(text)
+    except (ValueError, TypeError):
+        return None
+    return validate_card_data(data)
+
+
+def validate_card_data(data):
+    """
+    校验单张卡片的结构化数据：音标非空，释义非空，且例句数量与释义数量一致。
+    
+    Returns:
+        dict: 校验通过时返回格式化后的 {"ipa", "definitions", "examples"}，否则返回 None
+    """
+    if not isinstance(data, dict):
+        return None
+
+    ipa = data.get("ipa")
+    definitions = data.get("definitions")
+    examples = data.get("examples")
+
+    if not isinstance(ipa, str) or not ipa.strip():
+        return None
+    if not isinstance(definitions, list) or not isinstance(examples, list):
+        return None
+    if not definitions or len(definitions) != len(examples):
+        return None
+    if not all(isinstance(x, str) and x.strip() for x in definitions + examples):
+        return None
+
+    definitions = [_strip_numbering(x) for x in definitions]
+    examples = [_strip_numbering(x) for x in examples]
+    return {
+        "ipa": ipa.strip(),
+        "definitions": "\n".join(f"{i}. {line}" for i, line in enumerate(definitions, 1)),
+        "examples": "\n".join(f"{i}. {line}" for i, line in enumerate(examples, 1)),
+    }
+
+
+# ==========================================
+# 批量模式：一次请求生成多个单词的卡片
+# ==========================================
+CARD_BATCH_PROMPT = """
+You are an expert English lexicographer and phonetician specializing in British English.
+You will receive a JSON array of inputs. For EACH input, produce one card object with exactly these keys:
+
+* "input": the input string copied EXACTLY as given, including any parentheses (e.g. "tear (crying)").
+* "ipa": the British English IPA transcription between slashes. For phrases, transcribe each word separated by spaces.
+* "definitions": an array of clear English definitions (without numbering).
+* "examples": an array of example sentences (without numbering), one per definition, in the same order.
+
+Return ONE JSON object of the form {"cards": [ ...one card object per input, in the same order as the inputs... ]}
+
+**Rules:**
+1.  **Phrases / Idioms:** Define the idiomatic meaning of the whole phrase, NOT the individual words. Example sentences must include the phrase naturally.
+2.  **Frequency:** If the input has only one common meaning, give exactly one definition. If it has multiple common meanings, give 2-3 definitions.
+3.  **Context (Parentheses):** If parentheses are present, use them to choose the pronunciation, and make the first definition the meaning described in the parentheses. Still list other high-frequency meanings afterwards, even if they are pronounced differently. Never transcribe or define the content inside the parentheses itself.
+4.  **Counts:** "examples" MUST have exactly the same number of items as "definitions".
+5.  Output ONLY the JSON object. No markdown, no explanations.
+
+**Example:**
+
+Inputs: ["kangaroo", "tear (crying)"]
+Output: {"cards": [{"input": "kangaroo", "ipa": "/ˌkæŋɡəˈruː/", "definitions": ["A large Australian animal with a strong tail and back legs, which moves by jumping."], "examples": ["We saw a kangaroo jumping across the field during our trip to Australia."]}, {"input": "tear (crying)", "ipa": "/tɪə/", "definitions": ["A drop of clear salty liquid secreted by glands in your eyes.", "To pull or rip something apart or to pieces with force."], "examples": ["A single tear rolled down her cheek.", "Be careful not to tear the paper."]}]}
+"""
+
+
+def clean_input_word(input_text: str) -> str:
+    """
+    去除输入中的语境括号，得到纯单词，例如 "tear (crying)" -> "tear"
+    """
+    # 正则匹配中文括号 （） 或英文括号 () 及其内部内容，并去除
+    return re.sub(r'[\(\uff08].*?[\)\uff09]', '', input_text).strip()
+
+
+def failed_fields(card: dict) -> list:
+    """
+    返回生成失败 (内容为出错占位或缺失) 的文本字段
+    """
+    return [field for field in TEXT_FIELDS if ERROR_PLACEHOLDER in str(card.get(field, ERROR_PLACEHOLDER))]
+
+
+def missing_clips(card: dict, audio_paths) -> list:
+    """
+    返回文本有效但还没有音频的片段；文本生成失败的字段不合成音频 (避免朗读出错信息)
+    """
+    failed = set(failed_fields(card))
+    audio_paths = audio_paths or {}
+    return [key for key, source in CLIP_SOURCES.items() if source not in failed and not audio_paths.get(key)]
+
+
+def make_batch_sizer(api_config: dict = None) -> BatchSizer:
+    """
+    根据 api_config 中的批量配置创建自适应批大小控制器
+    """
+    api_config = api_config or {}
+    return BatchSizer(
+        max_batch_size=api_config.get("batch_size", 1),
+        context_window=api_config.get("context_window", 65536),
+        max_output_tokens=api_config.get("max_output_tokens", 8192),
+        prompt_tokens=estimate_tokens(CARD_BATCH_PROMPT),
+    )
+
+
+def generate_word_cards_batch(inputs: list, api_config: dict = None, cache=None, client: "OpenAI" = None,
+                              sizer: BatchSizer = None, fallback: bool = True) -> list:
+    """
+    在一次请求中为多个输入生成卡片，返回结果按原始输入 (含括号语境) 对应。
+    缺失或格式不合格的条目默认单独重新走 generate_word_card。
+    
+    Args:
+        inputs (list): 用户输入列表，例如 ["tear (crying)", "bank"]
+        api_config (dict, optional): API 配置字典
+        cache (CompletionCache, optional): LLM 补全缓存 (按单词粒度读写)
+        client (OpenAI, optional): 共享的客户端 (或返回客户端的无参函数)
+        sizer (BatchSizer, optional): 自适应批大小控制器，用于反馈本批结果
+        fallback (bool): 为 False 时不在本线程中逐个重新生成，缺失的条目对应位置为 None，
+            由调用方重新分发 (流水线中放回文本阶段，由空闲线程并行处理)
+        
+    Returns:
+        list: 与 inputs 一一对应的卡片字典；单个条目处理失败时对应位置为异常对象
+    """
+    api_config = api_config or {}
+    if client is None:
+        client = functools.partial(get_openai_client, api_config)
+    MODEL_NAME = api_config.get("model_name", "deepseek-v3-2-251201")
+
+    def single_cache_key(input_text):
+        # 与结构化 JSON 模式共用同一个缓存键，批量结果也能被单条请求复用
+        return cache.make_key(MODEL_NAME, CARD_JSON_PROMPT, f"Input: {input_text}", "json")
+
+    cards = {}
+
+    # 1. 先按单词查缓存，只把未命中的单词放进批量请求
+    pending = []
+    for input_text in inputs:
+        if cache is not None:
+            cached = cache_get(cache, single_cache_key(input_text))
+            card = parse_card_json(cached) if cached is not None else None
+            if card is not None:
+                cards[input_text] = {"word": clean_input_word(input_text), **card}
+                continue
+        if input_text not in pending:
+            pending.append(input_text)
+
+    # 2. 批量请求
+    if len(pending) > 1:
+        user_content = "Inputs: " + json.dumps(pending, ensure_ascii=False)
+        content = request_completion(client, MODEL_NAME, CARD_BATCH_PROMPT, user_content, json_mode=True,
+                                     limiter=get_rate_limiter("llm", api_config.get("rate_limit")))
+
+        try:
+            json.loads(content)
+            complete = True
+        except ValueError:
+            complete = False
+
+        # 输出被截断时也尽量保留已完整返回的条目
+        by_input = {}
+        with get_metrics().timer("prompt_seconds", step="parse"):
+            for obj in salvage_json_objects(content, "cards"):
+                key = obj.get("input")
+                if isinstance(key, str):
+                    by_input[key.strip()] = obj
+
+        matched = 0
+        for input_text in pending:
+            obj = by_input.get(input_text.strip())
+            card = validate_card_data(obj) if obj is not None else None
+            if card is None:
+                continue
+            matched += 1
+            cards[input_text] = {"word": clean_input_word(input_text), **card}
+            if cache is not None:
+                raw = {k: obj[k] for k in ("ipa", "definitions", "examples")}
+                cache_set(cache, single_cache_key(input_text), MODEL_NAME, json.dumps(raw, ensure_ascii=False))
+
+        if sizer is not None:
+            if complete and matched:
+                sizer.record_success(matched, content)
+            else:
+                sizer.record_failure(len(pending))
+
+        if matched < len(pending):
+            print(f"⚠️ 批量结果缺失 {len(pending) - matched}/{len(pending)} 条，改为逐个生成")
+
+    # 3. 缺失或不合格的条目单独重新生成 (fallback 为 False 时交给调用方)
+    results = []
+    for input_text in inputs:
+        if input_text not in cards:
+            if not fallback:
+                results.append(None)
+                continue
+            try:
+                cards[input_text] = generate_word_card(input_text, api_config=api_config, cache=cache, client=client)
+            except Exception as e:
+                results.append(e)
+                continue
+        results.append(cards[input_text])
+    return results
+
 
-def generate_word_card(input_text: str, api_config: dict = None) -> dict:
+def generate_word_card(input_text: str, api_config: dict = None, cache=None, client: "OpenAI" = None,
+                       fields=None, previous: dict = None) -> dict:
     """
     输入一个单词或词组（可能包含上下文括号），通过 API 调用生成音标、释义和例句。
+    某个字段调用失败时该字段为出错占位内容；释义失败时不再用占位内容去请求例句，例句同样记为失败。
     
     Args:
         input_text (str): 用户输入的单词，例如 "tear (crying)" 或 "bank"
         api_config (dict, optional): API 配置字典，包含 base_url, api_key, model_name
+        cache (CompletionCache, optional): LLM 补全缓存，命中时不再调用 API
+        client (OpenAI, optional): 共享的客户端 (或返回客户端的无参函数)，未传入时按 api_config 获取共享客户端
+        fields (iterable, optional): 只生成这些字段 (见 TEXT_FIELDS) 及依赖它们的字段，默认全部；用于字段级重试
+        previous (dict, optional): 之前生成的卡片，不需要重新生成的字段沿用其中的内容
         
     Returns:
         dict: 包含清洗后的单词、音标、释义列表字符串、例句列表字符串
@@ -24,33 +525,44 @@ def generate_word_card(input_text: str, api_config: dict = None) -> dict:
             "model_name": "deepseek-v3-2-251201"
         }
     
-    client = OpenAI(
-        base_url=api_config.get("base_url", "https://ark.cn-beijing.volces.com/api/v3"),
-        api_key=api_config.get("api_key", ""),
-    )
+    if client is None:
+        # 延迟创建：全部命中缓存时不需要加载 openai
+        client = functools.partial(get_openai_client, api_config)
     
     # 模型名称
     MODEL_NAME = api_config.get("model_name", "deepseek-v3-2-251201")
 
     # 2. 辅助函数：处理括号，获取纯单词
-    # 正则匹配中文括号 （） 或英文括号 () 及其内部内容，并去除
-    cleaned_word = re.sub(r'[\(\uff08].*?[\)\uff09]', '', input_text).strip()
+    cleaned_word = clean_input_word(input_text)
 
     # 3. 辅助函数：通用 API 调用
+    # 共享限流器 (未配置 rate_limit 时为 None)
+    limiter = get_rate_limiter("llm", api_config.get("rate_limit"))
+
     def get_completion(system_prompt, user_content):
-        try:
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content},
-                ],
-                temperature=0.1, # 降低随机性，保证输出格式稳定
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"API调用出错: {e}")
-            return "Error generating content"
+        return request_completion(client, MODEL_NAME, system_prompt, user_content, cache=cache, limiter=limiter)
+
+    # 4. 需要生成的字段 (连同依赖它们的字段)，其余字段沿用 previous
+    wanted = set(TEXT_FIELDS if fields is None else fields)
+    for field in list(wanted):
+        wanted.update(FIELD_DEPENDENTS[field])
+    previous = previous or {}
+
+    # ==========================================
+    # 结构化 JSON 模式 (可选)：一次请求拿到全部字段，校验失败才回退到三次调用
+    # ==========================================
+    if api_config.get("structured_output", False) and wanted == set(TEXT_FIELDS):
+        content = request_completion(
+            client, MODEL_NAME, CARD_JSON_PROMPT, f"Input: {input_text}", cache=cache,
+            json_mode=True, validate=lambda text: parse_card_json(text) is not None, limiter=limiter
+        )
+        with get_metrics().timer("prompt_seconds", step="parse"):
+            card = parse_card_json(content)
+        if card is not None:
+            get_metrics().incr("word_cards", mode="json")
+            return {"word": cleaned_word, **card}
+        get_metrics().incr("json_fallbacks")
+        print(f"⚠️ JSON 输出校验失败，回退到逐项生成: {input_text}")
 
     # ==========================================
     # 步骤 1: 获取音标 (IPA)
@@ -88,9 +600,10 @@ Output: /ˈpreznt/
     # 注意：Prompts 里的 {{INPUT}} 在这里通过 user message 传递，或者直接 f-string 替换
     # 这里我们选择将 system prompt 保持静态，用户输入作为 user message 传入，效果更佳
     
-    ipa_result = get_completion(ipa_prompt, f"Input: {input_text}")
-    # 有时候模型会重复 "Output: " 前缀，这里做一个简单的清洗
-    ipa_result = ipa_result.replace("Output:", "").strip()
+    # 音标不依赖释义：放到后台线程与步骤 2 同时请求，关键路径从 3 次往返缩短为 2 次
+    ipa_future = None
+    if "ipa" in wanted:
+        ipa_future = _get_prompt_executor().submit(get_completion, ipa_prompt, f"Input: {input_text}")
 
     # ==========================================
     # 步骤 2: 获取释义 (Definitions)
@@ -146,8 +659,11 @@ Output:
 1. A drop of clear salty liquid secreted by glands in your eyes.
 2. To pull or rip something apart or to pieces with force.
 """
-    definitions_result = get_completion(def_prompt, f"Input: {input_text}")
-    definitions_result = definitions_result.replace("Output:", "").strip()
+    if "definitions" in wanted:
+        definitions_result = get_completion(def_prompt, f"Input: {input_text}")
+        definitions_result = definitions_result.replace("Output:", "").strip()
+    else:
+        definitions_result = previous.get("definitions", ERROR_PLACEHOLDER)
 
     # ==========================================
     # 步骤 3: 获取例句 (Examples)
@@ -201,12 +717,27 @@ Output:
 **Current Input Definitions:**
 {definitions_result}"""
 
-    examples_result = get_completion(ex_prompt, step3_user_input)
-    examples_result = examples_result.replace("Output:", "").strip()
+    if "examples" not in wanted:
+        examples_result = previous.get("examples", ERROR_PLACEHOLDER)
+    elif ERROR_PLACEHOLDER in definitions_result:
+        # 释义失败：不把占位内容发给例句 prompt，例句随释义一起重试
+        examples_result = ERROR_PLACEHOLDER
+    else:
+        examples_result = get_completion(ex_prompt, step3_user_input)
+        examples_result = examples_result.replace("Output:", "").strip()
+
+    # 等待步骤 1 的音标结果
+    if ipa_future is not None:
+        ipa_result = ipa_future.result()
+        # 有时候模型会重复 "Output: " 前缀，这里做一个简单的清洗
+        ipa_result = ipa_result.replace("Output:", "").strip()
+    else:
+        ipa_result = previous.get("ipa", ERROR_PLACEHOLDER)
 
     # ==========================================
     # 构造返回值
     # ==========================================
+    get_metrics().incr("word_cards", mode="three_step")
     return {
         "word": cleaned_word,
         "ipa": ipa_result,
@@ -216,7 +747,27 @@ Output:
 
 
 
-def generate_audio_files(word_card: dict, output_dir="media", speed_config=None, azure_config=None) -> dict:
+# 单请求 (书签切分) 模式使用的输出格式
+BOOKMARK_OUTPUT_FORMAT = "Raw24Khz16BitMonoPcm"
+BOOKMARK_SAMPLE_RATE = 24000
+
+# 本地慢读模式：单词原速音频使用的输出格式 (本地拉伸需要 PCM)
+LOCAL_SLOW_OUTPUT_FORMAT = "Riff24Khz16BitMonoPcm"
+
+# 正在合成的片段 (按媒体文件路径)：多张卡片同时需要同一个片段时只请求一次
+_clip_flights = SingleFlight()
+
+
+def _write_media(file_path, data):
+    # 先写临时文件再原子替换，其他卡片共用同一个媒体文件时不会读到半个文件
+    tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+
+
+def generate_audio_files(word_card: dict, output_dir="media", speed_config=None, azure_config=None,
+                         audio_cache=None, keys=None) -> dict:
     """
     接收 generate_word_card 的返回结果，利用 Azure TTS 生成 4 个音频文件。
     
@@ -231,7 +782,13 @@ def generate_audio_files(word_card: dict, output_dir="media", speed_config=None,
                 "definitions": "0%",   # 释义 (原速)
                 "examples": "-5%"      # 例句 (稍慢)
             }
-        azure_config (dict, optional): Azure TTS 配置，包含 speech_key, region, voice_name
+        azure_config (dict, optional): Azure TTS 配置，包含 speech_key, region, voice_name，
+            可选 audio_format (输出格式，见 tts.AUDIO_FORMATS，默认 48kbps MP3)、
+            single_request (单请求 + 书签切分模式，输出 WAV)、
+            local_slow_word (单词只合成一次原速音频，慢速版本在本地拉伸得到，单词音频为 WAV) 与 rate_limit (限流与重试配置)
+        audio_cache (AudioCache, optional): 音频缓存，声音、语速和 SSML 都相同时直接复用
+        keys (iterable, optional): 只合成这些片段 (见 CLIP_SOURCES)，默认全部；
+            无论是否指定，文本为出错占位内容的释义/例句都不会合成
         
     Returns:
         dict: 在原字典基础上增加了 audio_files 字段，包含具体的文件路径
@@ -262,37 +819,229 @@ def generate_audio_files(word_card: dict, output_dir="media", speed_config=None,
     speech_key = azure_config.get("speech_key", "")
     service_region = azure_config.get("region", "eastus") 
 
-    if not speech_key or not service_region:
+    if azure_config.get("backend", "azure") == "azure" and (not speech_key or not service_region):
         raise ValueError("请设置环境变量 AZURE_SPEECH_KEY 和 AZURE_SPEECH_REGION")
 
     # 2. 确保输出目录存在
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
 
-    # 3. 初始化 Azure 合成器
-    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
+    # 3. 共享的 TTS 后端 (Azure 合成器池按声音复用并保持长连接；也可以是本地模拟合成器)
+    #    在确实需要合成时才获取，全部命中音频缓存时不会加载 Azure SDK
     voice_name = azure_config.get("voice_name", "en-GB-SoniaNeural")
-    speech_config.speech_synthesis_voice_name = voice_name
+    # 输出格式与对应的文件扩展名 (文件名与实际格式一致)
+    audio_format, audio_ext = resolve_audio_format(azure_config.get("audio_format"))
+    # 共享限流器 (未配置 rate_limit 时为 None)
+    tts_limiter = get_rate_limiter("tts", azure_config.get("rate_limit"))
+    metrics = get_metrics()
+
+    # 4. 定义辅助函数：同时合成多个片段，结果在内存中，由这里写入文件
+    def synthesize_clips(clips, output_format=audio_format, ext=audio_ext):
+        """
+        clips: [(key, ssml_text, stem, rate), ...]，返回 {key: file_path 或 None}
+        文件名带内容哈希：相同内容的片段共用一个文件，已存在时直接复用，其他卡片正在合成时等待它的结果
+        """
+        results = {}
+        pending = []
+        waiting = []
+        for key, ssml_text, stem, rate in clips:
+            content_key = AudioCache.make_key(voice_name, rate, ssml_text, output_format)
+            filename = media_filename(stem, content_key, ext)
+            file_path = os.path.join(output_dir, filename)
+
+            # 相同内容的片段已经生成过 (其他卡片或之前的运行)
+            if os.path.exists(file_path):
+                metrics.incr("media_reused")
+                results[key] = file_path
+                continue
 
-    # 4. 定义辅助函数：执行合成并保存文件
-    def synthesize_ssml_to_file(ssml_text, filename):
-        file_path = os.path.join(output_dir, filename)
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=file_path)
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-        
-        result = synthesizer.speak_ssml_async(ssml_text).get()
-        
-        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-            print(f"✅ 生成成功: {filename}")
-            return file_path
-        elif result.reason == speechsdk.ResultReason.Canceled:
-            cancellation_details = result.cancellation_details
-            print(f"❌ 生成取消: {filename}, 原因: {cancellation_details.reason}")
-            if cancellation_details.reason == speechsdk.CancellationReason.Error:
-                print(f"错误详情: {cancellation_details.error_details}")
+            owner, wait = _clip_flights.claim(file_path)
+            if not owner:
+                waiting.append((key, wait))
+                continue
+            if os.path.exists(file_path):
+                _clip_flights.finish(file_path, file_path)
+                metrics.incr("media_reused")
+                results[key] = file_path
+                continue
+
+            # 先查音频缓存
+            if audio_cache is not None:
+                if audio_cache.fetch(content_key, file_path):
+                    _clip_flights.finish(file_path, file_path)
+                    print(f"♻️ 命中音频缓存: {filename}")
+                    metrics.incr("audio_cache_hits")
+                    results[key] = file_path
+                    continue
+                metrics.incr("audio_cache_misses")
+            pending.append((key, ssml_text, filename, file_path, content_key))
+
+        try:
+            if pending:
+                # 未命中缓存的片段同时发起请求
+                ssml_list = [ssml_text for _, ssml_text, _, _, _ in pending]
+                metrics.incr("tts_characters", sum(len(ssml_text) for ssml_text in ssml_list))
+                with metrics.timer("tts_call_seconds", mode="clips"):
+                    synth_results = speak_many_limited(get_tts_backend(azure_config, output_format=output_format),
+                                                       ssml_list, tts_limiter)
+
+                for (key, _, filename, file_path, content_key), result in zip(pending, synth_results):
+                    if result.ok:
+                        with metrics.timer("disk_write_seconds", kind="audio"):
+                            _write_media(file_path, result.audio_data)
+                        metrics.incr("audio_bytes", len(result.audio_data))
+                        print(f"✅ 生成成功: {filename}")
+                        if audio_cache is not None:
+                            audio_cache.store(content_key, file_path)
+                        results[key] = file_path
+                    else:
+                        print(f"❌ 生成取消: {filename}, 原因: {result.error}")
+                        metrics.incr("tts_errors")
+                        results[key] = None
+        finally:
+            # 唤醒等待同一片段的其他卡片 (合成失败时它们得到 None)
+            for key, _, _, file_path, _ in pending:
+                _clip_flights.finish(file_path, results.get(key))
+
+        # 其他卡片正在合成的相同片段
+        for key, wait in waiting:
+            results[key] = wait()
+            if results[key] is not None:
+                metrics.incr("media_reused")
+        return results
+
+    # 5. 定义辅助函数：单请求模式，用 <bookmark> 标记各片段起点，按偏移量切分音频
+    def synthesize_with_bookmarks(sections):
+        """
+        sections: [(key, content, suffix, rate), ...]，返回 {key: file_path 或 None}；
+        书签缺失无法切分时返回 None
+        """
+        # 切分需要原始 PCM，因此该模式输出 WAV 文件
+        targets = []
+        for key, content, suffix, rate in sections:
+            # 与分别请求得到的音频不完全相同，内容哈希加上模式前缀加以区分
+            cache_key = AudioCache.make_key(voice_name, f"bookmark:{rate}", build_ssml(content))
+            filename = media_filename(f"{clean_word}{suffix}", cache_key, ".wav")
+            targets.append((key, filename, os.path.join(output_dir, filename), cache_key))
+
+        if all(os.path.exists(file_path) for _, _, file_path, _ in targets):
+            metrics.incr("media_reused", len(targets))
+            return {key: file_path for key, _, file_path, _ in targets}
+
+        if audio_cache is not None and all(audio_cache.fetch(cache_key, file_path)
+                                           for _, _, file_path, cache_key in targets):
+            for _, filename, _, _ in targets:
+                print(f"♻️ 命中音频缓存: {filename}")
+            metrics.incr("audio_cache_hits", len(targets))
+            return {key: file_path for key, _, file_path, _ in targets}
+
+        body = "".join(f"<bookmark mark='{key}'/>{content}<break time='500ms'/>"
+                       for key, content, _, _ in sections)
+        combined_ssml = build_ssml(body + "<bookmark mark='end'/>")
+        if audio_cache is not None:
+            metrics.incr("audio_cache_misses", len(targets))
+        metrics.incr("tts_characters", len(combined_ssml))
+        with metrics.timer("tts_call_seconds", mode="bookmarks"):
+            # 单请求模式需要原始 PCM 才能按书签切分
+            bookmark_pool = get_tts_backend(azure_config, output_format=BOOKMARK_OUTPUT_FORMAT)
+            result, bookmarks = speak_with_bookmarks_limited(bookmark_pool, combined_ssml, tts_limiter)
+
+        if not result.ok:
+            print(f"❌ 生成取消: {clean_word}, 原因: {result.error}")
+            metrics.incr("tts_errors")
+            return {key: None for key, _, _, _ in sections}
+
+        offsets = dict(bookmarks)
+        marks = [key for key, _, _, _ in sections] + ['end']
+        if any(mark not in offsets for mark in marks):
             return None
 
-    # 5. 定义辅助函数：构建 SSML 框架
+        segments = split_pcm_by_offsets(result.audio_data, [offsets[mark] for mark in marks],
+                                        sample_rate=BOOKMARK_SAMPLE_RATE)
+        paths = {}
+        for (key, filename, file_path, cache_key), pcm in zip(targets, segments):
+            with metrics.timer("disk_write_seconds", kind="audio"):
+                _write_media(file_path, pcm_to_wav_bytes(pcm, sample_rate=BOOKMARK_SAMPLE_RATE))
+            metrics.incr("audio_bytes", len(pcm))
+            print(f"✅ 生成成功: {filename}")
+            if audio_cache is not None:
+                audio_cache.store(cache_key, file_path)
+            paths[key] = file_path
+        return paths
+
+    # 6. 定义辅助函数：本地慢读模式，单词只合成一次原速音频 (WAV)，慢速版本在本地变速不变调得到
+    def synthesize_with_local_slow(sections):
+        """
+        sections: [(key, content, suffix, rate), ...]，返回 {key: file_path 或 None}
+        """
+        by_key = {key: (content, suffix, rate) for key, content, suffix, rate in sections}
+        fast_content, fast_suffix, fast_rate = by_key['word_fast']
+        slow_rate = by_key['word_slow'][2]
+        word_clip = [('word_fast', build_ssml(fast_content), f"{clean_word}{fast_suffix}", fast_rate)]
+        others = [(key, build_ssml(content), f"{clean_word}{suffix}", rate)
+                  for key, content, suffix, rate in sections if key not in ('word_slow', 'word_fast')]
+
+        # 单词 (WAV) 与释义、例句 (配置的格式) 同时请求
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            word_future = executor.submit(synthesize_clips, word_clip, LOCAL_SLOW_OUTPUT_FORMAT, ".wav")
+            paths = synthesize_clips(others)
+            paths.update(word_future.result())
+
+        paths['word_slow'] = None
+        fast_path = paths['word_fast']
+        if fast_path is None:
+            return paths
+
+        stretch_key = AudioCache.make_key(voice_name, f"stretch:{slow_rate}", os.path.basename(fast_path))
+        slow_path = os.path.join(output_dir, media_filename(f"{clean_word}_slow", stretch_key, ".wav"))
+
+        def stretch():
+            # 返回 (原速音频路径, 慢读音频路径)，原速音频取不回时慢读为 None
+            source = fast_path
+            try:
+                with open(source, 'rb') as f:
+                    pcm, sample_rate = wav_bytes_to_pcm(f.read())
+            except FileNotFoundError:
+                # 共用的原速音频已写入卡组包并被删除：重新取回 (通常命中音频缓存)
+                source = synthesize_clips(word_clip, LOCAL_SLOW_OUTPUT_FORMAT, ".wav")['word_fast']
+                if source is None:
+                    return None, None
+                with open(source, 'rb') as f:
+                    pcm, sample_rate = wav_bytes_to_pcm(f.read())
+            speed = rate_to_speed(slow_rate) / rate_to_speed(fast_rate)
+            with metrics.timer("stretch_seconds"):
+                stretched = time_stretch_pcm(pcm, speed, sample_rate=sample_rate)
+            with metrics.timer("disk_write_seconds", kind="audio"):
+                _write_media(slow_path, pcm_to_wav_bytes(stretched, sample_rate=sample_rate))
+            metrics.incr("audio_bytes", len(stretched))
+            print(f"✅ 本地生成慢读: {os.path.basename(slow_path)}")
+            return source, slow_path
+
+        # 与其他片段一样：同一个慢读文件只由一个线程生成，同时需要它的其他卡片 (例如同一单词的不同义项) 等待结果
+        if os.path.exists(slow_path):
+            metrics.incr("media_reused")
+        else:
+            owner, wait = _clip_flights.claim(slow_path)
+            if not owner:
+                slow_path = wait()
+                if slow_path is not None:
+                    metrics.incr("media_reused")
+            elif os.path.exists(slow_path):
+                _clip_flights.finish(slow_path, slow_path)
+                metrics.incr("media_reused")
+            else:
+                result = None
+                try:
+                    fast_path, result = stretch()
+                finally:
+                    _clip_flights.finish(slow_path, result)
+                slow_path = result
+        if slow_path is not None:
+            metrics.incr("tts_requests_saved")
+        paths['word_fast'] = fast_path
+        paths['word_slow'] = slow_path
+        return paths
+
+    # 7. 定义辅助函数：构建 SSML 框架
     def build_ssml(content):
         return f"""
         <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="en-GB">
@@ -304,29 +1053,31 @@ def generate_audio_files(word_card: dict, output_dir="media", speed_config=None,
 
     # --- 准备文件名 (去除特殊字符) ---
     clean_word = re.sub(r'[\\/*?:"<>|]', "", word_card['word']).replace(" ", "_")
-    paths = {}
+    # 每个片段: (字段名, SSML 正文, 文件名后缀, 语速)
+    sections = []
 
     print(f"正在为单词 '{word_card['word']}' 生成音频...")
+    ssml_started = time.perf_counter()
 
     # ==========================================
     # A. 单词慢速 (Word Slow)
     # ==========================================
-    ssml_slow = build_ssml(f"""
+    content_slow = f"""
         <prosody rate="{current_speeds['word_slow']}">
             {word_card['word']}
         </prosody>
-    """)
-    paths['word_slow'] = synthesize_ssml_to_file(ssml_slow, f"{clean_word}_slow.mp3")
+    """
+    sections.append(('word_slow', content_slow, "_slow", current_speeds['word_slow']))
 
     # ==========================================
     # B. 单词快速/正常 (Word Fast)
     # ==========================================
-    ssml_fast = build_ssml(f"""
+    content_fast = f"""
         <prosody rate="{current_speeds['word_fast']}">
             {word_card['word']}
         </prosody>
-    """)
-    paths['word_fast'] = synthesize_ssml_to_file(ssml_fast, f"{clean_word}_fast.mp3")
+    """
+    sections.append(('word_fast', content_fast, "_fast", current_speeds['word_fast']))
 
     # ==========================================
     # C. 释义朗读 (Definitions)
@@ -339,8 +1090,7 @@ def generate_audio_files(word_card: dict, output_dir="media", speed_config=None,
         # 这里给每一行都加上了语速控制
         def_content += f"<prosody rate='{current_speeds['definitions']}'>{line}</prosody> <break time='800ms'/> "
     
-    ssml_defs = build_ssml(def_content)
-    paths['definitions'] = synthesize_ssml_to_file(ssml_defs, f"{clean_word}_defs.mp3")
+    sections.append(('definitions', def_content, "_defs", current_speeds['definitions']))
 
     # ==========================================
     # D. 例句朗读 (Examples)
@@ -352,29 +1102,72 @@ def generate_audio_files(word_card: dict, output_dir="media", speed_config=None,
     for line in ex_lines:
         ex_content += f"<prosody rate='{current_speeds['examples']}'>{line}</prosody> <break time='1000ms'/> "
 
-    ssml_examples = build_ssml(ex_content)
-    paths['examples'] = synthesize_ssml_to_file(ssml_examples, f"{clean_word}_ex.mp3")
+    sections.append(('examples', ex_content, "_ex", current_speeds['examples']))
+    metrics.observe("ssml_build_seconds", time.perf_counter() - ssml_started)
+
+    # 只合成需要的片段；生成失败的文本不送去朗读
+    sections = [section for section in sections
+                if (keys is None or section[0] in keys) and ERROR_PLACEHOLDER not in section[1]]
+    if not sections:
+        return {}
+
+    # ==========================================
+    # E. 合成
+    # ==========================================
+    if azure_config.get("single_request", False):
+        # 单请求模式：一个带书签的 SSML，本地切分为四个文件
+        paths = synthesize_with_bookmarks(sections)
+        if paths is not None:
+            return paths
+        print(f"⚠️ 书签切分失败，改为分别请求: {word_card['word']}")
+
+    if azure_config.get("local_slow_word", False) and {'word_slow', 'word_fast'} <= {s[0] for s in sections}:
+        # 本地慢读模式：三次请求 + 本地拉伸
+        return synthesize_with_local_slow(sections)
+
+    # 默认模式：四个片段同时请求
+    clips = [(key, build_ssml(content), f"{clean_word}{suffix}", rate)
+             for key, content, suffix, rate in sections]
+    paths = synthesize_clips(clips)
 
     return paths
 
 
-def create_anki_package(word_list: list, package_name="My_Vocabulary_Deck.apkg", media_output_dir="media_temp", 
-                       api_config=None, azure_config=None, speed_config=None, deck_name="new words deck"):
+def sound_fields(audio_paths, writer):
     """
-    输入一个单词列表，自动完成：内容生成 -> 语音合成 -> 制卡 -> 打包 (.apkg)
-    
+    生成笔记的三个音频字段 (文件已写入卡组包时即使临时文件已删除也照常引用)
+
     Args:
-        word_list: 单词列表
-        package_name: 输出的 apkg 文件名
-        media_output_dir: 临时媒体文件目录
-        api_config: OpenAI API 配置
-        azure_config: Azure TTS 配置
-        speed_config: 语速配置
-        deck_name: Anki 卡组名称
+        audio_paths (dict): generate_audio_files 的返回结果 (字段名 -> 文件路径)
+        writer: StreamingPackageWriter 或 CardBundleWriter
+
+    Returns:
+        tuple: (WordAudio, MeaningAudio, ExampleAudio)
+    """
+    def get_sound_tag(key):
+        path = audio_paths.get(key)
+        if path and (os.path.exists(path) or writer.has_media(path)):
+            return f"[sound:{os.path.basename(path)}]"
+        return ""
+
+    # 拼接单词音频 (先慢后快)
+    word_audio = " ".join(tag for tag in (get_sound_tag('word_slow'), get_sound_tag('word_fast')) if tag)
+    return word_audio, get_sound_tag('definitions'), get_sound_tag('examples')
+
+
+@functools.lru_cache(maxsize=None)
+def build_anki_model():
+    """
+    构建卡片模板 (固定 Model ID，增量更新与分片合并都依赖它识别本工具生成的笔记)。
+    模板只构造一次，之后直接复用 (常驻服务模式下各任务共用)
+
+    Returns:
+        genanki.Model: 卡片模板
     """
+    import genanki
 
     # =========================================================
-    # 1. 定义 Anki 模板 (Modern Typography Style - 最终完美版)
+    # Anki 模板 (Modern Typography Style - 最终完美版)
     # =========================================================
     
     modern_css = """
@@ -438,7 +1231,7 @@ def create_anki_package(word_list: list, package_name="My_Vocabulary_Deck.apkg",
     """
 
     # 定义 Model (固定ID)
-    model_id = 1683920450
+    model_id = MODEL_ID
     
     my_model = genanki.Model(
         model_id,
@@ -462,82 +1255,480 @@ def create_anki_package(word_list: list, package_name="My_Vocabulary_Deck.apkg",
         css=modern_css
     )
 
+    return my_model
+
+def create_anki_package(word_list, package_name="My_Vocabulary_Deck.apkg", media_output_dir="media_temp", 
+                       api_config=None, azure_config=None, speed_config=None, deck_name="new words deck",
+                       concurrency_config=None, llm_cache=None, audio_cache=None, journal=None,
+                       update_from=None, delete_media=False, shard=None, text_only=False, retry_config=None):
+    """
+    输入一个单词列表，自动完成：内容生成 -> 语音合成 -> 制卡 -> 打包 (.apkg)
+    
+    Args:
+        word_list: 单词列表 (列表或任意可迭代对象，例如流式读取的 WordListReader)
+        package_name: 输出的 apkg 文件名
+        media_output_dir: 临时媒体文件目录
+        api_config: OpenAI API 配置
+        azure_config: Azure TTS 配置
+        speed_config: 语速配置
+        deck_name: Anki 卡组名称
+        concurrency_config (dict, optional): 流水线并发配置。
+            默认值如下 (各 1 个线程，等同于逐个处理)：
+            {
+                "llm_workers": 1,   # LLM 文本生成线程数
+                "tts_workers": 1,   # TTS 语音合成线程数
+                "queue_size": 8     # 阶段之间队列的最大长度
+            }
+        llm_cache (CompletionCache, optional): LLM 补全缓存
+        audio_cache (AudioCache, optional): TTS 音频缓存
+        journal (CardJournal, optional): 断点日志，每完成一张卡片追加一条记录；
+            以续跑方式打开时，日志中已完成的单词不再重新生成
+        update_from (str, optional): 已有的 apkg 路径 (增量更新)。已有且内容完整的笔记连同音频原样复用，
+            只为新增或需要重做的单词调用 API；不在本次列表中的旧笔记也会保留
+        delete_media (bool): 音频写入卡组包后立即删除临时文件 (卡组包按卡片流式写入，临时磁盘占用保持平稳)
+        shard (tuple, optional): (分片序号, 分片总数)。只处理去重后序号 % 总数 == 分片序号 的单词，
+            package_name 处写入中间卡片包 (.bundle)，之后用 bundle.merge_bundles 合并为一个 .apkg；不能与 update_from 同时使用
+        text_only (bool): 文本优先模式。只生成文本，不合成音频，快速写出只有文本的卡组；
+            音频之后用 backfill_audio 补齐 (增量更新时原卡组中已有的音频照常保留)
+        retry_config (dict, optional): 字段级重试配置。某个字段 (音标/释义/例句或某段音频) 失败时，
+            卡片进入后台重试队列，只重做失败的字段及依赖它的字段，全部有效或重试轮数用完后才写入。默认值：
+            {"enabled": True, "max_rounds": 3, "base_delay": 5, "max_delay": 60, "workers": 2}
+        
+    Returns:
+        str: 生成的 apkg (分片模式下为 .bundle) 文件路径，没有生成任何卡片时返回 None
+    """
+
+    import genanki
+
+    # =========================================================
+    # 1. 定义 Anki 模板 (见 build_anki_model)
+    # =========================================================
+    model_id = MODEL_ID
+    my_model = build_anki_model()
+
     # =========================================================
     # 2. 创建 Deck
     # =========================================================
-    deck_id = 2059400110
-    my_deck = genanki.Deck(deck_id, deck_name)
+    deck_id = DECK_ID
+
+    if shard is not None and update_from:
+        raise ValueError("分片构建不支持增量更新 (update_from)，请合并后再增量更新")
+
+    # 增量更新：读取已有的卡组包，复用其中已完成的笔记与音频
+    existing = None
+    if update_from and os.path.exists(update_from):
+        existing = ExistingPackage(update_from, model_id, error_marker=ERROR_PLACEHOLDER)
 
-    all_media_files = []
+    def reusable(word_input, full=True):
+        # full 为 False 时只要求文本完整 (缺少的音频再补合成)
+        if existing is None:
+            return None
+        note_data = existing.find(word_input, clean_input_word(word_input))
+        if note_data is None or not existing.has_valid_text(note_data):
+            return None
+        if full and existing.missing_audio(note_data):
+            return None
+        return note_data
 
     # =========================================================
-    # 3. 批量处理
+    # 3. 批量处理 (流水线：LLM 线程池 -> 有界队列 -> TTS 线程池)
     # =========================================================
-    print(f"🚀 开始制作卡组，共 {len(word_list)} 个单词...")
-    
-    for i, word_input in enumerate(word_list, 1):
-        print(f"\n[{i}/{len(word_list)}] 正在处理: {word_input}")
-        
+    concurrency = {
+        "llm_workers": 1,
+        "tts_workers": 1,
+        "queue_size": 8
+    }
+    if concurrency_config:
+        concurrency.update(concurrency_config)
+
+    # 去重计划：规范化后相同的输入只处理一次 (WordListReader 在读取时已经去重)
+    if not isinstance(word_list, DedupedWords):
+        plan = DedupedWords(word_list)
+        if hasattr(word_list, '__len__'):
+            word_list = list(plan)
+            if plan.duplicates:
+                print(f"🔁 跳过 {plan.duplicates} 个重复输入: {', '.join(plan.duplicate_examples)}")
+        else:
+            word_list = plan
+
+    # 分片构建：按去重后的输入序号轮流分配，只处理属于本分片的单词
+    if shard is not None:
+        selected = select_shard(word_list, shard)
+        word_list = list(selected) if hasattr(word_list, '__len__') else selected
+        print(f"🧩 分片 {shard[0] + 1}/{shard[1]}")
+
+    # 单词列表可以是流式读取的迭代器，此时总数未知
+    total = len(word_list) if hasattr(word_list, '__len__') else None
+    if total is not None:
+        print(f"🚀 开始制作卡组，共 {total} 个单词...")
+    else:
+        print("🚀 开始制作卡组 (流式读取单词列表)...")
+    print(f"⚙️ 并发配置: LLM {concurrency['llm_workers']} 线程, TTS {concurrency['tts_workers']} 线程")
+
+    # 所有线程共享同一个客户端 (同一个连接池)；第一次真正请求时才创建，全部命中缓存时不加载 openai
+    client = functools.partial(get_openai_client, api_config)
+
+    # 断点续跑：日志中已完成 (且内容有效) 的单词直接复用
+    def journaled(word_input):
+        entry = journal.get(word_input) if journal is not None else None
+        if entry is None or any(ERROR_PLACEHOLDER in str(v) for v in entry['card'].values()):
+            return None
+        return entry
+
+    if journal is not None and journal.entries:
+        print(f"♻️ 断点续跑: 日志中已有 {len(journal.entries)} 个单词")
+
+    metrics = get_metrics()
+
+    # Step A: LLM 生成
+    def text_stage(word_input):
+        entry = journaled(word_input)
+        if entry is not None:
+            return entry['card']
+        note_data = reusable(word_input, full=False)
+        if note_data is not None:
+            return existing.card_data(note_data)
+        with metrics.timer("stage_seconds", stage="text"):
+            return generate_word_card(word_input, api_config=api_config, cache=llm_cache, client=client)
+
+    # Step B: TTS 生成
+    def audio_stage(word_input, text_data):
+        entry = journaled(word_input)
+        if (entry is not None and (entry['media'] or text_only)
+                and all(p and os.path.exists(p) for p in entry['media'].values())):
+            return entry['media']
+        note_data = reusable(word_input)
+        if note_data is not None:
+            with metrics.timer("stage_seconds", stage="reuse_media"):
+                return existing.extract_media(note_data, media_output_dir)
+        # 只缺部分音频的旧笔记：旧包中已有的片段原样取出，只补合成缺少的片段
+        media = {}
+        keys = None
+        note_data = reusable(word_input, full=False)
+        if note_data is not None:
+            with metrics.timer("stage_seconds", stage="reuse_media"):
+                media = existing.extract_media(note_data, media_output_dir)
+            keys = existing.missing_audio(note_data)
+        if text_only:
+            return media
+        with metrics.timer("stage_seconds", stage="audio"):
+            generated = generate_audio_files(text_data, output_dir=media_output_dir,
+                                             speed_config=speed_config, azure_config=azure_config,
+                                             audio_cache=audio_cache, keys=keys)
+        return dict(media, **generated)
+
+    # Step A': 批量模式 (可选)，一次请求生成多个单词，批大小随上下文窗口自适应
+    text_batch_stage = None
+    sizer = None
+    if api_config and api_config.get("batch_size", 1) > 1:
+        sizer = make_batch_sizer(api_config)
+        print(f"📦 批量模式: 每批最多 {sizer.max_batch_size} 个单词")
+
+        def text_batch_stage(word_inputs):
+            # 批量结果中缺失的单词返回 None，由流水线放回文本阶段，交给空闲线程逐个生成
+            fresh = [w for w in word_inputs if journaled(w) is None and reusable(w, full=False) is None]
+            generated = {}
+            if fresh:
+                with metrics.timer("stage_seconds", stage="text_batch"):
+                    generated = dict(zip(fresh, generate_word_cards_batch(fresh, api_config=api_config, cache=llm_cache,
+                                                                          client=client, sizer=sizer, fallback=False)))
+            return [generated[w] if w in generated else text_stage(w) for w in word_inputs]
+
+    progress = ProgressMeter(total)
+    results = run_pipeline(
+        word_list, text_stage, audio_stage,
+        llm_workers=concurrency['llm_workers'],
+        tts_workers=concurrency['tts_workers'],
+        queue_size=concurrency['queue_size'],
+        text_batch_stage=text_batch_stage,
+        batch_size=sizer.size if sizer is not None else 1
+    )
+
+    # 字段级重试：有字段失败的卡片放入后台重试队列，只重做失败的字段及依赖它的字段
+    # (释义 -> 例句 -> 对应音频)，已成功的字段不再请求；全部有效或重试轮数用完后才写入卡组
+    retry = {"enabled": True, "max_rounds": 3, "base_delay": 5, "max_delay": 60, "workers": 2}
+    retry.update(retry_config or {})
+
+    def incomplete(text_data, audio_paths):
+        # 仍然失败的文本字段与缺少的音频片段
+        return failed_fields(text_data), ([] if text_only else missing_clips(text_data, audio_paths))
+
+    def retry_card(key, state):
+        _, word_input = key
+        text_data, audio_paths = state
+        fields, clips = incomplete(text_data, audio_paths)
+        if fields:
+            metrics.incr("field_retries", stage="text")
+            with metrics.timer("stage_seconds", stage="text_retry"):
+                text_data = generate_word_card(word_input, api_config=api_config, cache=llm_cache, client=client,
+                                               fields=fields, previous=text_data)
+            # 重新生成的字段 (含依赖字段) 的旧音频作废
+            redone = set(fields).union(*(FIELD_DEPENDENTS[field] for field in fields))
+            audio_paths = {k: v for k, v in (audio_paths or {}).items() if CLIP_SOURCES.get(k) not in redone}
+            clips = incomplete(text_data, audio_paths)[1]
+        if clips:
+            metrics.incr("field_retries", stage="audio")
+            with metrics.timer("stage_seconds", stage="audio_retry"):
+                audio_paths = dict(audio_paths or {}, **generate_audio_files(
+                    text_data, output_dir=media_output_dir, speed_config=speed_config,
+                    azure_config=azure_config, audio_cache=audio_cache, keys=clips))
+        fields, clips = incomplete(text_data, audio_paths)
+        return (text_data, audio_paths), not fields and not clips
+
+    retries = None
+    if retry["enabled"]:
+        retries = RetryQueue(retry_card, max_rounds=retry["max_rounds"], base_delay=retry["base_delay"],
+                             max_delay=retry["max_delay"], workers=retry["workers"])
+
+    # 重试中的卡片仍按输入顺序写入：排在它后面的卡片先暂存，等它完成后一起写入
+    ready = {}
+    next_index = 0
+
+    def collect_retries(wait=False):
+        if retries is None:
+            return
+        for (index, word_input), (text_data, audio_paths), ok in retries.drain(wait=wait):
+            if not ok:
+                fields, clips = incomplete(text_data, audio_paths)
+                metrics.incr("field_retry_exhausted")
+                print(f"⚠️ {word_input}: 重试 {retries.max_rounds} 轮后仍失败 ({', '.join(fields + clips)})，"
+                      f"按现有内容写入")
+            ready[index] = (word_input, text_data, audio_paths, None)
+
+    def flush():
+        nonlocal next_index
+        while next_index in ready:
+            finalize(next_index, *ready.pop(next_index))
+            next_index += 1
+
+    # 结果按输入顺序到达，保证卡组顺序与单词列表一致
+    # 卡组包按卡片流式写入：先写临时文件，完成后再替换，增量更新时旧包在写入完成前保持完整
+    tmp_package = package_name + ".tmp"
+    if shard is not None:
+        writer = CardBundleWriter(tmp_package, shard, deck_name, model_id, deck_id, delete_media=delete_media)
+    else:
+        writer = StreamingPackageWriter(tmp_package, my_model, deck_id, deck_name, delete_media=delete_media)
+
+    def finalize(index, word_input, text_data, audio_paths, error):
+        # 写入一张已完成的卡片 (按输入顺序调用)
+        progress.advance()
+        print(f"\n{progress.line()} {word_input}")
+
+        if error is not None:
+            metrics.incr("words_total", status="failed")
+            print(f"   ❌ 处理失败: {error}")
+            import traceback
+            traceback.print_exception(type(error), error, error.__traceback__)
+            return
+
         try:
-            # Step A: LLM 生成
-            text_data = generate_word_card(word_input, api_config=api_config)
-            
-            # Step B: TTS 生成
-            audio_paths = generate_audio_files(text_data, output_dir=media_output_dir, 
-                                             speed_config=speed_config, azure_config=azure_config)
-            
-            if not audio_paths:
+            if not audio_paths and not text_only:
+                metrics.incr("words_total", status="failed")
                 print("   ⚠️ 音频生成失败，跳过。")
-                continue
+                return
 
             # Step C: 准备数据
-            def get_sound_tag(key):
-                path = audio_paths.get(key)
-                if path and os.path.exists(path):
-                    all_media_files.append(path)
-                    return f"[sound:{os.path.basename(path)}]"
-                return ""
+            word_audio, meaning_audio, example_audio = sound_fields(audio_paths, writer)
 
-            # 拼接单词音频 (先慢后快)
-            combined_word_audio = get_sound_tag('word_slow') + " " + get_sound_tag('word_fast')
+            # 笔记 GUID：增量更新时沿用原笔记的 GUID，否则由输入生成稳定 GUID
+            guid = note_guid(word_input)
+            if existing is not None:
+                note_data = existing.find(word_input, clean_input_word(word_input))
+                if note_data is not None:
+                    guid = note_data['guid']
+                    existing.mark_used(note_data)
 
             # 填充字段 (使用 strip 去除数据本身的空格)
             note = genanki.Note(
                 model=my_model,
+                guid=guid,
                 fields=[
                     text_data['word'],
                     text_data['ipa'],
-                    combined_word_audio,
+                    word_audio,
                     text_data['definitions'].strip(),
                     text_data['examples'].strip(),
-                    get_sound_tag('definitions'),
-                    get_sound_tag('examples')
+                    meaning_audio,
+                    example_audio
                 ]
             )
-            
-            my_deck.add_note(note)
+
+            with metrics.timer("package_write_seconds"):
+                writer.add_note(note, audio_paths.values(), index=index)
             print(f"   ✅ 添加成功: {text_data['word']}")
+            metrics.incr("words_total", status="added")
+
+            # 写入断点日志 (续跑时复用的记录不重复写入)
+            if journal is not None:
+                entry = journaled(word_input)
+                if entry is None or entry['media'] != audio_paths:
+                    journal.append(index, word_input, text_data, audio_paths)
 
         except Exception as e:
+            metrics.incr("words_total", status="failed")
             print(f"   ❌ 处理失败: {e}")
             import traceback
             traceback.print_exc()
 
+    try:
+        for index, word_input, text_data, audio_paths, error in results:
+            fields, clips = incomplete(text_data, audio_paths) if error is None else ([], [])
+            if retries is not None and (fields or clips):
+                print(f"🔁 {word_input}: {', '.join(fields + clips)} 生成失败，稍后只重做这些字段")
+                metrics.incr("cards_retried")
+                retries.submit((index, word_input), (text_data, audio_paths))
+            else:
+                ready[index] = (word_input, text_data, audio_paths, error)
+            collect_retries()
+            flush()
+
+        # 等待重试队列中剩余的卡片
+        if retries is not None and retries.outstanding:
+            print(f"\n⏳ 等待 {retries.outstanding} 张卡片的字段重试完成...")
+        collect_retries(wait=True)
+        flush()
+        if retries is not None:
+            retries.close()
+
+        # 增量更新：本次输入中没有出现的旧笔记原样保留
+        if existing is not None:
+            leftovers = existing.unused_notes()
+            for note_data in leftovers:
+                media = existing.extract_media(note_data, media_output_dir)
+                with metrics.timer("package_write_seconds"):
+                    writer.add_note(genanki.Note(model=my_model, fields=note_data['fields'],
+                                                 guid=note_data['guid'], tags=note_data['tags']),
+                                    media.values())
+            print(f"\n📂 增量更新: 复用原卡组笔记, 另保留 {len(leftovers)} 张不在本次列表中的旧卡片")
+    except BaseException:
+        writer.abort()
+        if retries is not None:
+            retries.close()
+        if existing is not None:
+            existing.close()
+        raise
+
     # =========================================================
     # 4. 打包
     # =========================================================
-    if len(my_deck.notes) == 0:
+    if writer.note_count == 0:
         print("\n❌ 无卡片生成。")
-        return
+        writer.abort()
+        if existing is not None:
+            existing.close()
+        return None
 
-    print(f"\n📦 正在打包 {len(all_media_files)} 个媒体文件...")
+    print(f"\n📦 正在完成打包: {writer.note_count} 张卡片, {len(writer.media)} 个媒体文件...")
     
-    my_package = genanki.Package(my_deck)
-    my_package.media_files = all_media_files
-    
-    my_package.write_to_file(package_name)
+    with metrics.timer("package_write_seconds"):
+        writer.close()
+    metrics.incr("media_files", len(writer.media))
+    if existing is not None:
+        existing.close()
+    os.replace(tmp_package, package_name)
+    if llm_cache is not None:
+        stats = llm_cache.stats()
+        print(f"💾 LLM 缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, 共 {stats['entries']} 条")
+    if audio_cache is not None:
+        stats = audio_cache.stats()
+        print(f"💾 音频缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次")
+    for name, stats in limiter_summaries().items():
+        print(f"🚦 {name} 限流: 请求 {stats['requests']} 次, 限流 {stats['rate_limited']} 次, "
+              f"重试 {stats['retries']} 次, 失败 {stats['failures']} 次, 等待 {stats['wait_seconds']:.1f} 秒, "
+              f"最终并发上限 {stats['concurrency']}")
     print(f"🎉 生成完毕: {os.path.abspath(package_name)}")
-    print("👉 请双击该文件导入 Anki！")
+    if shard is None:
+        print("👉 请双击该文件导入 Anki！")
+    return package_name
+
+
+def backfill_audio(package_name, media_output_dir="media_temp", azure_config=None, speed_config=None,
+                   concurrency_config=None, audio_cache=None, delete_media=False, deck_name=None):
+    """
+    为已生成的卡组补齐音频：读取卡组包中的笔记，只为缺少音频的笔记合成缺少的片段，
+    填好 WordAudio / MeaningAudio / ExampleAudio 后重新打包 (笔记顺序、GUID 与标签不变)。
+    通常用于文本优先模式 (create_anki_package 的 text_only) 生成的卡组，也可以修补音频合成失败的卡片。
+    释义或例句文本出错的笔记照常补齐其余片段，只跳过出错的那一段 (不朗读出错占位内容)。
+
+    Args:
+        package_name: 卡组包路径 (原地更新)
+        media_output_dir: 临时媒体文件目录
+        azure_config / speed_config / audio_cache: 同 generate_audio_files
+        concurrency_config (dict, optional): 使用其中的 tts_workers 与 queue_size
+        delete_media (bool): 音频写入卡组包后立即删除临时文件
+        deck_name (str, optional): 卡组名称，默认沿用原卡组包中的名称
+
+    Returns:
+        dict: 笔记总数、补齐的笔记数与仍缺少音频的笔记数
+    """
+    import genanki
+
+    concurrency = {"tts_workers": 1, "queue_size": 8}
+    if concurrency_config:
+        concurrency.update(concurrency_config)
+
+    existing = ExistingPackage(package_name, MODEL_ID, error_marker=ERROR_PLACEHOLDER)
+    my_model = build_anki_model()
+    metrics = get_metrics()
+    missing = [note for note in existing.notes if existing.missing_audio(note)]
+    print(f"🔊 共 {len(existing.notes)} 张卡片，其中 {len(missing)} 张缺少音频")
+
+    def text_stage(note_data):
+        return existing.card_data(note_data)
+
+    def audio_stage(note_data, text_data):
+        # 已有的片段从原包取出；文本出错的段落由 generate_audio_files 跳过，其余片段照常补齐
+        with metrics.timer("stage_seconds", stage="reuse_media"):
+            media = existing.extract_media(note_data, media_output_dir)
+        if not existing.missing_audio(note_data):
+            return media
+        with metrics.timer("stage_seconds", stage="audio"):
+            generated = generate_audio_files(text_data, output_dir=media_output_dir, speed_config=speed_config,
+                                             azure_config=azure_config, audio_cache=audio_cache,
+                                             keys=existing.missing_audio(note_data))
+        # 只补合成缺少的片段，其余沿用原包中的音频
+        return {key: generated.get(key) or media.get(key) for key in AUDIO_KEYS}
+
+    progress = ProgressMeter(len(existing.notes))
+    results = run_pipeline(existing.notes, text_stage, audio_stage, llm_workers=1,
+                           tts_workers=concurrency['tts_workers'], queue_size=concurrency['queue_size'])
+
+    filled = 0
+    still_missing = 0
+    tmp_package = package_name + ".tmp"
+    deck_name = deck_name or existing.deck_names.get(DECK_ID, "new words deck")
+    writer = StreamingPackageWriter(tmp_package, my_model, DECK_ID, deck_name, delete_media=delete_media)
+    try:
+        for index, note_data, _, audio_paths, error in results:
+            progress.advance()
+            fields = list(note_data['fields'])
+            if error is not None:
+                print(f"   ❌ 补齐音频失败 ({fields[0]}): {error}")
+                audio_paths = existing.extract_media(note_data, media_output_dir)
+            if existing.missing_audio(note_data):
+                fields[2], fields[5], fields[6] = sound_fields(audio_paths, writer)
+                if all(audio_paths.get(key) for key in AUDIO_KEYS):
+                    filled += 1
+                    print(f"{progress.line()} ✅ 已补齐: {fields[0]}")
+                else:
+                    still_missing += 1
+                    print(f"{progress.line()} ⚠️ 仍缺少音频: {fields[0]}")
+            with metrics.timer("package_write_seconds"):
+                writer.add_note(genanki.Note(model=my_model, fields=fields, guid=note_data['guid'],
+                                             tags=note_data['tags']),
+                                audio_paths.values())
+        with metrics.timer("package_write_seconds"):
+            writer.close()
+    except BaseException:
+        writer.abort()
+        existing.close()
+        raise
+
+    existing.close()
+    os.replace(tmp_package, package_name)
+    metrics.incr("media_files", len(writer.media))
+    print(f"🎉 音频补齐完成: 补齐 {filled} 张, 仍缺少 {still_missing} 张 -> {os.path.abspath(package_name)}")
+    return {"notes": writer.note_count, "filled": filled, "missing": still_missing}
 
 # ==========================================
 # 调用示例
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+增量更新：读取已有的 .apkg 卡组包
+按输入键 (笔记 GUID) 与 Word 字段索引已有笔记，只为新增或需要重做的单词调用 LLM / TTS，
+其余笔记连同旧包里的音频文件原样复用。
+"""
+
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import zipfile
+
+# 笔记字段顺序 (与 create_anki_package 中的 Model 定义一致)
+FIELD_NAMES = ['Word', 'IPA', 'WordAudio', 'Definitions', 'Examples', 'MeaningAudio', 'ExampleAudio']
+
+# 每张卡片的四段音频 (与 generate_audio_files 的返回键一致)
+AUDIO_KEYS = ('word_slow', 'word_fast', 'definitions', 'examples')
+
+_SOUND_RE = re.compile(r'\[sound:([^\]]+)\]')
+
+# 单词音频的文件名：<单词>_slow_<内容哈希>.mp3，旧版本为 <单词>_slow.mp3
+_WORD_CLIP_RE = re.compile(r'_(slow|fast)(?:_[0-9a-f]+)?\.\w+$')
+
+
+def note_guid(input_text: str) -> str:
+    """
+    由原始输入 (含括号语境) 生成稳定的笔记 GUID，
+    同一个输入每次生成的笔记 GUID 相同，重新导入 Anki 时会更新原笔记而不是重复添加。
+    """
+    import genanki
+    return genanki.guid_for(input_text.strip())
+
+
+class ExistingPackage:
+    """
+    已有的 .apkg 卡组包 (只读)
+    """
+
+    def __init__(self, path, model_id, error_marker=None):
+        """
+        Args:
+            path: .apkg 文件路径
+            model_id: 本工具使用的 Model ID，只索引该模板下的笔记
+            error_marker: 出错占位内容，字段中包含该内容的笔记视为需要重做
+        """
+        self.path = path
+        self.error_marker = error_marker
+        self._zip = zipfile.ZipFile(path)
+        self._lock = threading.Lock()
+
+        # 媒体清单: 压缩包内编号 -> 原始文件名
+        media_map = json.loads(self._zip.read('media').decode('utf-8') or '{}')
+        self.media_members = {name: member for member, name in media_map.items()}
+
+        # 读取笔记 (collection 需要先解压到临时文件才能用 sqlite 打开)
+        fd, db_path = tempfile.mkstemp(suffix='.anki2')
+        os.close(fd)
+        try:
+            with self._zip.open('collection.anki2') as src, open(db_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            conn = sqlite3.connect(db_path)
+            rows = conn.execute(
+                'SELECT guid, flds, tags FROM notes WHERE mid = ? ORDER BY id', (model_id,)).fetchall()
+            decks = json.loads(conn.execute('SELECT decks FROM col').fetchone()[0] or '{}')
+            conn.close()
+        finally:
+            os.remove(db_path)
+
+        # 卡组 ID -> 卡组名称
+        self.deck_names = {int(deck_id): deck['name'] for deck_id, deck in decks.items()}
+
+        self.notes = []
+        self.by_guid = {}
+        self.by_word = {}
+        for guid, flds, tags in rows:
+            fields = flds.split('\x1f')
+            if len(fields) != len(FIELD_NAMES):
+                continue
+            note = {"guid": guid, "fields": fields, "tags": tags.split()}
+            self.notes.append(note)
+            self.by_guid[guid] = note
+            self.by_word.setdefault(fields[0].strip(), []).append(note)
+
+        self.used_guids = set()
+        print(f"📂 已读取原卡组: {path} ({len(self.notes)} 张卡片, {len(self.media_members)} 个媒体文件)")
+
+    def find(self, input_text, cleaned_word):
+        """
+        查找与输入对应的已有笔记：优先按输入键 (GUID) 匹配；
+        旧版本生成的笔记没有稳定 GUID，不带括号语境的输入再按 Word 字段匹配 (仅当唯一时)。
+
+        Returns:
+            dict: 笔记记录，未找到返回 None
+        """
+        note = self.by_guid.get(note_guid(input_text))
+        if note is None and cleaned_word == input_text.strip():
+            candidates = self.by_word.get(cleaned_word, [])
+            if len(candidates) == 1:
+                note = candidates[0]
+        return note
+
+    def is_reusable(self, note):
+        """
+        判断笔记能否原样复用：文本完整，且四段音频都在旧包里
+        """
+        return self.has_valid_text(note) and not self.missing_audio(note)
+
+    def has_valid_text(self, note):
+        """
+        文本字段中没有出错占位内容 (只缺音频的笔记可以复用文本，只补合成音频)
+        """
+        return not (self.error_marker and any(self.error_marker in field for field in note["fields"]))
+
+    def missing_audio(self, note):
+        """
+        Returns:
+            list: 缺少的音频字段名 (没有引用，或引用的文件不在旧包里)
+        """
+        names = self.sound_names(note)
+        return [key for key in AUDIO_KEYS if names.get(key) not in self.media_members]
+
+    @staticmethod
+    def sound_names(note):
+        """
+        Returns:
+            dict: 音频字段名 (word_slow / word_fast / definitions / examples) -> 媒体文件名
+        """
+        fields = note["fields"]
+        names = {}
+        # 单词音频按文件名中的 _slow / _fast 识别：某一段合成失败时 WordAudio 中只有另一段，不能按位置判断
+        word_sounds = _SOUND_RE.findall(fields[2])
+        unknown = []
+        for position, name in enumerate(word_sounds):
+            match = _WORD_CLIP_RE.search(name)
+            key = f"word_{match.group(1)}" if match else None
+            if key is not None and key not in names:
+                names[key] = name
+            elif key is None:
+                unknown.append((position, name))
+        # 文件名无法识别时 (例如手动改过的笔记) 才按位置：第一个为慢读，第二个为快读
+        for position, name in unknown:
+            key = ('word_slow', 'word_fast')[position] if position < 2 else None
+            if key is not None and key not in names:
+                names[key] = name
+        for key, field in (('definitions', fields[5]), ('examples', fields[6])):
+            found = _SOUND_RE.findall(field)
+            if found:
+                names[key] = found[0]
+        return names
+
+    @staticmethod
+    def card_data(note):
+        """
+        把笔记字段还原为 generate_word_card 的返回格式
+        """
+        fields = note["fields"]
+        return {"word": fields[0], "ipa": fields[1], "definitions": fields[3], "examples": fields[4]}
+
+    def extract_media(self, note, output_dir):
+        """
+        把笔记引用的音频从旧包解压到 output_dir
+
+        Returns:
+            dict: 音频字段名 -> 文件路径 (与 generate_audio_files 的返回格式一致)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {}
+        for key, name in self.sound_names(note).items():
+            if name not in self.media_members:
+                continue
+            file_path = os.path.join(output_dir, name)
+            with self._lock:
+                with self._zip.open(self.media_members[name]) as src, open(file_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            paths[key] = file_path
+        return paths
+
+    def mark_used(self, note):
+        self.used_guids.add(note["guid"])
+
+    def unused_notes(self):
+        """
+        Returns:
+            list: 本次输入中没有出现的旧笔记 (保持原顺序)
+        """
+        return [note for note in self.notes if note["guid"] not in self.used_guids]
+
+    def close(self):
+        self._zip.close()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+制卡断点日志 (追加写入的 JSON Lines)
+每完成一张卡片就追加一行：输入、文本内容与音频文件路径。
+程序中途失败后可以用 --resume 跳过已完成的单词，从日志与新结果一起打包。
+"""
+
+import json
+import os
+import threading
+
+
+class CardJournal:
+    """
+    追加写入的断点日志，可在多线程间共享。
+    """
+
+    def __init__(self, path, resume=False):
+        """
+        Args:
+            path: 日志文件路径
+            resume: 为 True 时读取已有记录并继续追加；为 False 时清空旧日志重新开始
+        """
+        self.path = path
+        self.entries = self.load(path) if resume else {}
+
+        journal_dir = os.path.dirname(path)
+        if journal_dir and not os.path.exists(journal_dir):
+            os.makedirs(journal_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        if resume:
+            self.truncate_torn_tail(path)
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    @staticmethod
+    def truncate_torn_tail(path):
+        """
+        截掉程序崩溃时写了一半的最后一行 (截断到最后一个换行符)，
+        否则续跑时追加的第一条记录会接在这半行后面，两条记录一起无法解析
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                newline = f.read(step).rfind(b"\n")
+                if newline >= 0:
+                    pos = pos - step + newline + 1
+                    break
+                pos -= step
+            if pos < end:
+                f.truncate(pos)
+
+    @staticmethod
+    def load(path):
+        """
+        读取日志，返回 {输入: 记录}。同一输入出现多次时以最后一次为准；
+        程序崩溃时写了一半的最后一行会被忽略。
+
+        Returns:
+            dict: 输入文本 -> {"index", "input", "card", "media"}
+        """
+        entries = {}
+        if not os.path.exists(path):
+            return entries
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and "input" in entry and "card" in entry:
+                    entries[entry["input"]] = entry
+        return entries
+
+    def get(self, input_text):
+        """
+        Returns:
+            dict: 该输入已完成的记录，没有则返回 None
+        """
+        return self.entries.get(input_text)
+
+    def append(self, index, input_text, card, media):
+        """
+        追加一条完成记录并立即写盘
+
+        Args:
+            index: 输入序号
+            input_text: 原始输入
+            card: generate_word_card 的返回结果
+            media: generate_audio_files 的返回结果 (字段名 -> 文件路径)
+        """
+        entry = {"index": index, "input": input_text, "card": card, "media": media}
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.entries[input_text] = entry
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 补全结果的持久化缓存 (SQLite)
+以 (模型名称, system prompt 哈希, 用户输入) 为键保存模型输出，
+重复制卡时直接命中缓存，避免重复付费调用。
+"""
+
+import contextlib
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# 缓存模式
+#   use     : 正常读写缓存
+#   bypass  : 完全绕过缓存 (不读也不写)
+#   refresh : 不读旧结果，但用新结果覆盖缓存
+CACHE_MODES = ("use", "bypass", "refresh")
+
+
+class CompletionCache:
+    """
+    基于 SQLite 的补全缓存，带 LRU 淘汰与命中统计，可在多线程间共享。
+    """
+
+    def __init__(self, path=".cache/llm_cache.sqlite3", max_entries=200000, mode="use"):
+        """
+        Args:
+            path: SQLite 数据库文件路径
+            max_entries: 最多保存的条目数，超出后按最近访问时间淘汰
+            mode: 缓存模式，取值见 CACHE_MODES
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"不支持的缓存模式: {mode}，可选值: {', '.join(CACHE_MODES)}")
+
+        self.path = path
+        self.max_entries = int(max_entries)
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_completions_last_access ON completions (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, system_prompt, user_content, *extra):
+        """
+        生成缓存键：模型名称 + system prompt 的哈希 + 用户输入 (+ 其它影响输出的参数)
+        """
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        raw = "\x1f".join([model, prompt_hash, user_content] + [str(x) for x in extra])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        读取缓存，未命中 (或处于 bypass/refresh 模式) 时返回 None
+        """
+        if self.mode != "use":
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock, self._rollback_on_error():
+            row = self._conn.execute(
+                "SELECT response FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key, model, response):
+        """
+        写入缓存 (bypass 模式下不写入)，并在超出容量时淘汰最久未访问的条目
+        """
+        if self.mode == "bypass":
+            return
+
+        now = time.time()
+        with self._lock, self._rollback_on_error():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now))
+            # 每写入一批再检查容量，避免每次写入都统计全表
+            self._writes += 1
+            if self._writes % 256 == 1:
+                self._evict()
+            self._conn.commit()
+
+    @contextlib.contextmanager
+    def _rollback_on_error(self):
+        # 数据库被其它进程锁住等错误时回滚未完成的事务，连接可以继续使用 (错误交给调用方处理)
+        try:
+            yield
+        except sqlite3.Error:
+            self._conn.rollback()
+            raise
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN "
+                "(SELECT key FROM completions ORDER BY last_access ASC LIMIT ?)",
+                (overflow,))
+
+    def stats(self):
+        """
+        Returns:
+            dict: 命中次数、未命中次数、当前条目数
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+            self._conn.close()
@@ -6,16 +6,32 @@ Anki 自动制卡主程序
 """
 
 import os
+import re
 import sys
+import argparse
+import subprocess
 import yaml
 import shutil
-import genanki
-import certifi
 
-# 修复 conda 环境的 SSL 证书路径问题
-os.environ['SSL_CERT_FILE'] = certifi.where()
+# 启动时只导入轻量模块；openai / Azure SDK / genanki 在第一次真正需要时才加载，
+# 配置检查 (check)、试运行 (--dry-run) 与全部命中缓存的运行都不会加载 Azure SDK
+from generate import create_anki_package, clean_input_word, ERROR_PLACEHOLDER, MODEL_ID
+from incremental import ExistingPackage
+from tts import resolve_audio_format
+from llm_cache import CompletionCache
+from audio_cache import AudioCache
+from journal import CardJournal
+from word_list import WordListReader
+from bundle import parse_shard, shard_path
+from metrics import get_metrics, MetricsServer
 
-from generate import create_anki_package
+
+def configure_ssl():
+    """
+    修复 conda 环境的 SSL 证书路径问题 (在发起网络请求之前调用)
+    """
+    import certifi
+    os.environ['SSL_CERT_FILE'] = certifi.where()
 
 
 def load_config(config_path="config.yaml"):
@@ -45,86 +61,685 @@ def load_config(config_path="config.yaml"):
 
 def load_word_list(txt_path):
     """
-    从 txt 文件读取单词列表
+    打开单词列表 (流式读取，边读边交给制卡流水线)
     
     Args:
-        txt_path: txt 文件路径，每行一个单词或词组
+        txt_path: txt 文件路径，每行一个单词或词组；"-" 表示标准输入，.gz 结尾按 gzip 读取
         
     Returns:
-        list: 单词列表
+        WordListReader: 可迭代的单词列表，读取时自动跳过空行与重复条目
     """
-    if not os.path.exists(txt_path):
+    if txt_path != "-" and not os.path.exists(txt_path):
         print(f"❌ 单词列表文件不存在: {txt_path}")
         sys.exit(1)
     
+    print(f"✅ 开始读取单词列表: {'标准输入' if txt_path == '-' else txt_path}")
+    return WordListReader(txt_path)
+
+
+def report_word_list(word_list):
+    """
+    输出单词列表的读取统计 (读取完成后调用)
+    
+    Args:
+        word_list: load_word_list 返回的 WordListReader
+    """
+    print(f"📝 共读取 {word_list.total} 个单词/词组，跳过重复 {word_list.duplicates} 个")
+    if word_list.duplicate_examples:
+        print(f"   重复示例: {', '.join(word_list.duplicate_examples)}")
+
+
+# 配置文件中未填写的占位内容都以此开头
+_PLACEHOLDER_PREFIX = "请在"
+
+
+def check_config(config, input_txt=None):
+    """
+    检查配置文件 (不导入任何 SDK，也不发起网络请求)
+    
+    Args:
+        config: 完整配置字典
+        input_txt: 单词列表路径，默认使用配置文件中的 input_txt
+        
+    Returns:
+        tuple: (错误列表, 警告列表)
+    """
+    errors = []
+    warnings = []
+    
+    def get(section, key):
+        value = (config.get(section) or {}).get(key)
+        if value is None or value == "":
+            errors.append(f"缺少配置项: {section}.{key}")
+        return value
+    
+    backends = config.get('backends') or {}
+    llm_backend = backends.get('llm', 'openai')
+    tts_backend = backends.get('tts', 'azure')
+    if llm_backend not in ('openai', 'stub'):
+        errors.append(f"backends.llm 只能是 openai 或 stub: {llm_backend}")
+    if tts_backend not in ('azure', 'fake'):
+        errors.append(f"backends.tts 只能是 azure 或 fake: {tts_backend}")
+    
+    for key in ('openai_api_key', 'openai_base_url', 'openai_model',
+                'azure_speech_key', 'azure_region', 'azure_voice_name'):
+        value = get('api_keys', key)
+        needed = (llm_backend == 'openai') if key.startswith('openai') else (tts_backend == 'azure')
+        if needed and isinstance(value, str) and value.startswith(_PLACEHOLDER_PREFIX):
+            errors.append(f"api_keys.{key} 尚未填写")
+    
+    for key, rate in (config.get('speed_config') or {}).items():
+        if not re.fullmatch(r'[+-]?\d+(\.\d+)?%', str(rate)):
+            errors.append(f"speed_config.{key} 格式错误 (应为 \"-30%\" 这样的百分比): {rate}")
+    
+    for key in ('llm_workers', 'tts_workers', 'queue_size'):
+        value = (config.get('concurrency') or {}).get(key, 1)
+        if not isinstance(value, int) or value < 1:
+            errors.append(f"concurrency.{key} 应为正整数: {value}")
+    
     try:
-        with open(txt_path, 'r', encoding='utf-8') as f:
-            # 读取所有行，去除空白行和首尾空格
-            words = [line.strip() for line in f.readlines() if line.strip()]
+        resolve_audio_format((config.get('tts') or {}).get('audio_format'))
+    except ValueError as e:
+        errors.append(f"tts.audio_format: {e}")
+    
+    if (config.get('tts') or {}).get('local_slow_word'):
+        import importlib.util
+        if importlib.util.find_spec('numpy') is None:
+            errors.append("tts.local_slow_word 需要安装 numpy (pip install numpy)")
+    
+    mode = (config.get('llm_cache') or {}).get('mode', 'use')
+    if mode not in ('use', 'bypass', 'refresh'):
+        errors.append(f"llm_cache.mode 只能是 use / bypass / refresh: {mode}")
+    
+    for key in ('output_package', 'temp_media_dir'):
+        get('paths', key)
+    get('anki', 'deck_name')
+    
+    input_txt = input_txt or (config.get('paths') or {}).get('input_txt')
+    if not input_txt:
+        errors.append("缺少配置项: paths.input_txt")
+    elif input_txt != "-" and not os.path.exists(input_txt):
+        errors.append(f"单词列表文件不存在: {input_txt}")
+    
+    output_dir = os.path.dirname(os.path.abspath((config.get('paths') or {}).get('output_package') or '.'))
+    if not os.access(output_dir, os.W_OK):
+        warnings.append(f"输出目录不可写: {output_dir}")
+    
+    return errors, warnings
+
+
+def report_check(errors, warnings):
+    """
+    输出配置检查结果
+    
+    Returns:
+        bool: 没有错误时返回 True
+    """
+    for message in warnings:
+        print(f"⚠️ {message}")
+    for message in errors:
+        print(f"❌ {message}")
+    if not errors:
+        print("✅ 配置检查通过")
+    return not errors
+
+
+def dry_run(config, input_txt, journal_path, resume=False, update=False):
+    """
+    试运行：读取单词列表，统计断点日志与原卡组能复用多少单词，不调用任何 API
+    
+    Args:
+        config: 完整配置字典
+        input_txt: 单词列表路径
+        journal_path: 断点日志路径
+        resume: 是否按 --resume 统计断点日志
+        update: 是否按 --update 统计原卡组
+    """
+    word_list = load_word_list(input_txt)
+    words = list(word_list)
+    report_word_list(word_list)
+    
+    done = set()
+    if resume:
+        entries = CardJournal.load(journal_path)
+        done = {w for w in words
+                if w in entries and not any(ERROR_PLACEHOLDER in str(v) for v in entries[w]['card'].values())}
+        print(f"♻️ 断点日志中已完成: {len(done)} 个")
+    
+    reused = set()
+    output_package = config['paths']['output_package']
+    if update and os.path.exists(output_package):
+        existing = ExistingPackage(output_package, MODEL_ID, error_marker=ERROR_PLACEHOLDER)
+        try:
+            for w in words:
+                note = existing.find(w, clean_input_word(w))
+                if w not in done and note is not None and existing.is_reusable(note):
+                    reused.add(w)
+        finally:
+            existing.close()
+        print(f"📂 可从原卡组复用: {len(reused)} 个")
+    
+    print(f"🧪 试运行: 共 {len(words)} 个单词，需要新生成 {len(words) - len(done) - len(reused)} 个 (未调用任何 API)")
+
+
+def build_llm_cache(config):
+    """
+    根据配置创建 LLM 补全缓存
+    
+    Args:
+        config: 完整配置字典
+        
+    Returns:
+        CompletionCache: 缓存对象，未启用时返回 None
+    """
+    cache_config = config.get('llm_cache') or {}
+    if not cache_config.get('enabled', False):
+        return None
+    
+    cache = CompletionCache(
+        path=cache_config.get('path', '.cache/llm_cache.sqlite3'),
+        max_entries=cache_config.get('max_entries', 200000),
+        mode=cache_config.get('mode', 'use')
+    )
+    print(f"💾 已启用 LLM 缓存: {cache.path} (模式: {cache.mode})")
+    return cache
+
+
+def build_audio_cache(config):
+    """
+    根据配置创建 TTS 音频缓存
+    
+    Args:
+        config: 完整配置字典
+        
+    Returns:
+        AudioCache: 缓存对象，未启用时返回 None
+    """
+    cache_config = config.get('audio_cache') or {}
+    if not cache_config.get('enabled', False):
+        return None
+    
+    cache = AudioCache(
+        path=cache_config.get('path', '.cache/audio'),
+        max_bytes=int(cache_config.get('max_size_mb', 2048) * 1024 * 1024)
+    )
+    print(f"💾 已启用音频缓存: {cache.path}")
+    return cache
+
+
+def setup_backends(config, api_config, azure_config):
+    """
+    根据 backends 配置切换到本地模拟后端 (会直接修改 api_config / azure_config)
+    
+    Args:
+        config: 完整配置字典
+        api_config: LLM 配置
+        azure_config: TTS 配置
         
-        print(f"✅ 成功加载单词列表: {txt_path}")
-        print(f"📝 共读取 {len(words)} 个单词/词组")
-        return words
+    Returns:
+        StubLLMServer: 已启动的模拟 LLM 服务，未使用时返回 None
+    """
+    backends = config.get('backends') or {}
+    stub_server = None
+    
+    if backends.get('llm', 'openai') == 'stub':
+        from fake_backends import StubLLMServer
+        stub_server = StubLLMServer(**(backends.get('stub_llm') or {}))
+        api_config['base_url'] = stub_server.start()
+        api_config['api_key'] = 'stub'
+        print(f"🧪 使用本地模拟 LLM 服务: {api_config['base_url']}")
+    
+    if backends.get('tts', 'azure') == 'fake':
+        azure_config['backend'] = 'fake'
+        for key, value in (backends.get('fake_tts') or {}).items():
+            azure_config[f'fake_{key}'] = value
+        print("🧪 使用本地模拟 TTS 合成器 (输出静音音频)")
+    
+    return stub_server
+
+
+def start_metrics_server(config):
+    """
+    根据配置启动 Prometheus 指标接口
+    
+    Returns:
+        MetricsServer: 已启动的服务，未配置端口时返回 None
+    """
+    port = (config.get('metrics') or {}).get('prometheus_port')
+    if not port:
+        return None
+    server = MetricsServer(int(port))
+    print(f"📈 指标接口: {server.start()}")
+    return server
+
+
+def write_metrics_report(config):
+    """
+    写入 JSON 指标报告
+    """
+    report_path = (config.get('metrics') or {}).get('report')
+    if not report_path:
+        return
+    try:
+        get_metrics().write_json(report_path)
+        print(f"📈 指标报告已写入: {report_path}")
     except Exception as e:
-        print(f"❌ 读取单词列表失败: {e}")
-        sys.exit(1)
+        print(f"⚠️ 写入指标报告失败: {e}")
+
+
+def _is_inside(path, directory):
+    path = os.path.abspath(path)
+    directory = os.path.abspath(directory)
+    return path == directory or path.startswith(directory + os.sep)
 
 
-def clean_temp_files(temp_dir):
+def clean_temp_files(temp_dir, keep=()):
     """
     删除临时音频文件目录
     
     Args:
         temp_dir: 临时目录路径
+        keep: 需要保留的路径 (例如位于临时目录内的缓存目录)
     """
-    if os.path.exists(temp_dir):
-        try:
-            shutil.rmtree(temp_dir)
-            print(f"🧹 已清理临时文件目录: {temp_dir}")
-        except Exception as e:
-            print(f"⚠️ 清理临时文件失败: {e}")
-    else:
+    if not os.path.exists(temp_dir):
         print(f"ℹ️ 临时目录不存在，无需清理: {temp_dir}")
+        return
+    
+    try:
+        keep = [p for p in keep if p and _is_inside(p, temp_dir)]
+        if not keep:
+            shutil.rmtree(temp_dir)
+        else:
+            # 临时目录内包含需要保留的缓存：只删除其余文件
+            for root, dirs, files in os.walk(temp_dir, topdown=False):
+                for name in files:
+                    file_path = os.path.join(root, name)
+                    if not any(_is_inside(file_path, k) for k in keep):
+                        os.remove(file_path)
+                for name in dirs:
+                    dir_path = os.path.join(root, name)
+                    if not any(_is_inside(k, dir_path) or _is_inside(dir_path, k) for k in keep):
+                        if not os.listdir(dir_path):
+                            os.rmdir(dir_path)
+        print(f"🧹 已清理临时文件目录: {temp_dir}")
+    except Exception as e:
+        print(f"⚠️ 清理临时文件失败: {e}")
 
 
-def main():
+def gc_audio_cache(config, max_size_mb=None):
     """
-    主函数
-    """
-    print("=" * 70)
-    print("🚀 Anki 自动制卡程序启动")
-    print("=" * 70)
-    print()
+    清理音频缓存：按最近使用时间淘汰，直到总大小不超过上限
     
-    # 1. 加载配置文件
-    config = load_config("config.yaml")
+    Args:
+        config: 完整配置字典
+        max_size_mb: 本次清理使用的大小上限 (MB)，默认使用配置文件中的 max_size_mb
+    """
+    cache_config = config.get('audio_cache') or {}
+    cache = AudioCache(
+        path=cache_config.get('path', '.cache/audio'),
+        max_bytes=int(cache_config.get('max_size_mb', 2048) * 1024 * 1024)
+    )
+    max_bytes = None if max_size_mb is None else int(max_size_mb * 1024 * 1024)
+    result = cache.gc(max_bytes)
+    print(f"🧹 音频缓存清理完成: 删除 {result['removed']} 个文件, 释放 {result['freed_bytes'] / 1024 / 1024:.1f} MB")
+    print(f"💾 剩余 {result['files']} 个文件, 共 {result['bytes'] / 1024 / 1024:.1f} MB")
+
+
+def build_service_configs(config):
+    """
+    从配置文件提取 LLM 与 TTS 的调用配置
     
-    # 2. 提取配置信息
+    Returns:
+        tuple: (api_config, azure_config)
+    """
     api_config = {
         "base_url": config['api_keys']['openai_base_url'],
         "api_key": config['api_keys']['openai_api_key'],
         "model_name": config['api_keys']['openai_model']
     }
+    # 连接池与超时配置 (可选)
+    api_config.update(config.get('llm_client') or {})
+    # 生成模式配置 (可选)
+    api_config.update(config.get('generation') or {})
     
     azure_config = {
         "speech_key": config['api_keys']['azure_speech_key'],
         "region": config['api_keys']['azure_region'],
-        "voice_name": config['api_keys']['azure_voice_name']
+        "voice_name": config['api_keys']['azure_voice_name'],
+        "pool_size": config['api_keys'].get('azure_pool_size', 16)
     }
+    # TTS 合成模式配置 (可选)
+    azure_config.update(config.get('tts') or {})
+    
+    # 限流与重试配置 (可选)
+    rate_limit_config = config.get('rate_limit') or {}
+    api_config['rate_limit'] = rate_limit_config.get('llm')
+    azure_config['rate_limit'] = rate_limit_config.get('tts')
+    return api_config, azure_config
+
+
+def run_backfill_audio(config, package_name=None):
+    """
+    为已生成的卡组补齐音频 (backfill-audio 命令)：只合成缺少的片段，重新打包
+    
+    Returns:
+        bool: 成功时返回 True
+    """
+    from generate import backfill_audio
+    
+    package_name = package_name or config['paths']['output_package']
+    if not os.path.exists(package_name):
+        print(f"❌ 卡组包不存在: {package_name}")
+        return False
+    
+    configure_ssl()
+    api_config, azure_config = build_service_configs(config)
+    # 只需要 TTS：LLM 配置为 stub 时也不必启动模拟服务
+    setup_backends(dict(config, backends=dict(config.get('backends') or {}, llm='openai')), api_config, azure_config)
+    audio_cache = build_audio_cache(config) if azure_config.get('backend') != 'fake' else None
+    temp_media_dir = config['paths']['temp_media_dir']
+    metrics_server = start_metrics_server(config)
+    
+    ok = False
+    try:
+        backfill_audio(
+            package_name,
+            media_output_dir=temp_media_dir,
+            azure_config=azure_config,
+            speed_config=config['speed_config'],
+            concurrency_config=config.get('concurrency') or {},
+            audio_cache=audio_cache,
+            delete_media=(config.get('packaging') or {}).get('delete_media_after_add', False),
+            deck_name=config['anki']['deck_name']
+        )
+        ok = True
+    except Exception as e:
+        print(f"❌ 补齐音频失败: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        if ok:
+            clean_temp_files(temp_media_dir, keep=[audio_cache.path if audio_cache else None])
+        write_metrics_report(config)
+        if metrics_server is not None:
+            metrics_server.stop()
+    return ok
+
+
+def apply_shard(config, shard):
+    """
+    分片模式下调整配置 (直接修改 config)：输出改为中间卡片包，临时目录、断点日志与指标报告各分片独立，
+    限流额度 (RPM / TPM) 按分片数平分，所有分片合计不超过配置的额度
+    
+    Args:
+        config: 完整配置字典
+        shard: (分片序号, 分片总数)
+    """
+    paths = config['paths']
+    paths['output_package'] = shard_path(paths['output_package'], shard, ".bundle")
+    paths['temp_media_dir'] = shard_path(paths['temp_media_dir'], shard)
+    paths['journal'] = shard_path(paths.get('journal', 'build_journal.jsonl'), shard)
+    
+    metrics_config = config.get('metrics') or {}
+    if metrics_config.get('report'):
+        metrics_config['report'] = shard_path(metrics_config['report'], shard)
+    
+    for limit in (config.get('rate_limit') or {}).values():
+        for key in ('requests_per_minute', 'tokens_per_minute'):
+            if limit and limit.get(key):
+                limit[key] = limit[key] / shard[1]
+
+
+def merge_shards(config, bundle_paths, output_package=None):
+    """
+    把各分片的中间卡片包合并为一个 .apkg (按输入顺序，重复的音频只保留一份)
+    
+    Returns:
+        bool: 合并成功时返回 True
+    """
+    from bundle import merge_bundles
+    
+    output_package = output_package or config['paths']['output_package']
+    print(f"🧩 正在合并 {len(bundle_paths)} 个分片...")
+    try:
+        result = merge_bundles(bundle_paths, output_package, deck_name=config['anki']['deck_name'])
+    except (OSError, KeyError, ValueError) as e:
+        print(f"❌ 合并失败: {e}")
+        return False
+    if result['missing_shards']:
+        print(f"⚠️ 缺少分片: {', '.join(str(i) for i in result['missing_shards'])}")
+    print(f"🎉 合并完成: {result['cards']} 张卡片, {result['media']} 个媒体文件 -> {os.path.abspath(output_package)}")
+    return True
+
+
+def run_local_shards(args, config, count):
+    """
+    在本机启动 count 个进程分别构建各分片，全部成功后合并为一个 .apkg
+    (每个进程的输出写入对应卡片包旁的 .log 文件)
+    """
+    if (args.input or config['paths']['input_txt']) == "-":
+        print("❌ 多进程构建不支持从标准输入读取单词列表")
+        sys.exit(1)
+    
+    command = [sys.executable, os.path.abspath(__file__), "--config", args.config]
+    if args.input:
+        command += ["--input", args.input]
+    if args.resume:
+        command.append("--resume")
+    if args.text_only:
+        command.append("--text-only")
+    
+    bundles = [shard_path(config['paths']['output_package'], (i, count), ".bundle") for i in range(count)]
+    processes = []
+    for i, bundle_path in enumerate(bundles):
+        log = open(bundle_path + ".log", "w", encoding="utf-8")
+        processes.append((subprocess.Popen(command + ["--shard", f"{i}/{count}"], stdout=log,
+                                           stderr=subprocess.STDOUT), log, bundle_path))
+    print(f"🧩 已启动 {count} 个分片进程，日志: {', '.join(b + '.log' for b in bundles)}")
+    
+    failed = []
+    for i, (process, log, bundle_path) in enumerate(processes):
+        process.wait()
+        log.close()
+        if process.returncode != 0:
+            failed.append(i)
+            print(f"❌ 分片 {i} 失败 (退出码 {process.returncode})，详见 {bundle_path}.log")
+        else:
+            print(f"✅ 分片 {i} 完成")
+    if failed or not merge_shards(config, bundles):
+        sys.exit(1)
+    
+    # 合并成功后删除中间卡片包、日志与各分片的断点日志 (失败时保留，以便 --resume 续跑)
+    journal_path = config['paths'].get('journal', 'build_journal.jsonl')
+    for i, bundle_path in enumerate(bundles):
+        for path in (bundle_path, bundle_path + ".log", shard_path(journal_path, (i, count))):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def run_service(config, host=None, port=None, unix_socket=None):
+    """
+    常驻服务模式 (serve 命令)：客户端、缓存与卡片模板只初始化一次，通过本地 HTTP / Unix socket 接收任务
+    """
+    from service import CardService
+    
+    configure_ssl()
+    service_config = config.get('service') or {}
+    api_config, azure_config = build_service_configs(config)
+    metrics_server = start_metrics_server(config)
+    stub_server = setup_backends(config, api_config, azure_config)
+    llm_cache = build_llm_cache(config) if stub_server is None else None
+    audio_cache = build_audio_cache(config) if azure_config.get('backend') != 'fake' else None
+    
+    service = CardService(
+        build_options={
+            "api_config": api_config,
+            "azure_config": azure_config,
+            "speed_config": config['speed_config'],
+            "concurrency_config": config.get('concurrency') or {},
+            "llm_cache": llm_cache,
+            "audio_cache": audio_cache,
+            "retry_config": config.get('field_retry'),
+        },
+        work_dir=service_config.get('work_dir', '.service_jobs'),
+        deck_name=config['anki']['deck_name'],
+        job_workers=service_config.get('job_workers', 2),
+        job_ttl=service_config.get('job_ttl', 3600),
+        max_words=service_config.get('max_words', 5000),
+    )
+    print(f"🔥 预热完成: {service.warm_up() * 1000:.0f} ms (SDK、客户端、合成器与卡片模板)")
+    try:
+        service.serve(host=host or service_config.get('host', '127.0.0.1'),
+                      port=int(port or service_config.get('port', 8710)),
+                      unix_socket=unix_socket or service_config.get('unix_socket'))
+    except KeyboardInterrupt:
+        print("\n👋 制卡服务已停止")
+    finally:
+        if llm_cache is not None:
+            llm_cache.close()
+        if stub_server is not None:
+            stub_server.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+
+def parse_args(argv=None):
+    """
+    解析命令行参数
+    """
+    parser = argparse.ArgumentParser(description="Anki 自动制卡程序")
+    parser.add_argument("--config", default="config.yaml", help="配置文件路径 (默认 config.yaml)")
+    parser.add_argument("--input", default=None,
+                        help="单词列表路径，覆盖配置文件中的 input_txt；\"-\" 表示从标准输入读取")
+    parser.add_argument("--resume", action="store_true",
+                        help="从断点日志续跑：跳过已完成的单词，与新结果一起打包")
+    parser.add_argument("--update", action="store_true",
+                        help="增量更新：复用已有输出包中的卡片与音频，只生成新增或需要重做的单词")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="试运行：检查配置并统计需要生成的单词数量，不调用任何 API")
+    parser.add_argument("--text-only", action="store_true",
+                        help="文本优先：只生成文本，快速写出没有音频的卡组，之后用 backfill-audio 补齐音频")
+    parser.add_argument("--shard", default=None, metavar="I/N",
+                        help="只构建第 I 个分片 (共 N 个，从 0 开始)，输出中间卡片包 (.bundle)，可在多台机器上分别运行后用 merge 合并")
+    parser.add_argument("--shards", type=int, default=None, metavar="N",
+                        help="在本机启动 N 个进程并行构建各分片，完成后自动合并为一个 .apkg")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    subparsers.add_parser("build", help="生成卡组 (默认)")
+    subparsers.add_parser("check", help="检查配置文件与单词列表路径 (不调用任何 API)")
+    
+    backfill_parser = subparsers.add_parser("backfill-audio", help="为已生成的卡组补齐缺少的音频并重新打包")
+    backfill_parser.add_argument("--package", default=None,
+                                 help="卡组包路径，默认使用配置文件中的 output_package")
+    
+    merge_parser = subparsers.add_parser("merge", help="把各分片的中间卡片包 (.bundle) 合并为一个 .apkg")
+    merge_parser.add_argument("bundles", nargs="+", help="分片卡片包路径")
+    merge_parser.add_argument("--output", default=None, help="输出的 .apkg 路径，默认使用配置文件中的 output_package")
+    
+    serve_parser = subparsers.add_parser("serve", help="常驻服务模式：通过本地 HTTP / Unix socket 接收制卡任务")
+    serve_parser.add_argument("--host", default=None, help="监听地址，默认使用配置文件中的 service.host")
+    serve_parser.add_argument("--port", type=int, default=None, help="监听端口，默认使用配置文件中的 service.port")
+    serve_parser.add_argument("--unix-socket", default=None, help="改为监听 Unix socket (路径)")
+    
+    gc_parser = subparsers.add_parser("gc-cache", help="清理音频缓存")
+    gc_parser.add_argument("--max-size-mb", type=float, default=None,
+                           help="清理后缓存的大小上限 (MB)，默认使用配置文件中的值；传 0 清空缓存")
+    
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    主函数
+    """
+    args = parse_args(argv)
+    
+    if args.command == "gc-cache":
+        config = load_config(args.config)
+        gc_audio_cache(config, args.max_size_mb)
+        return
+    
+    if args.command == "backfill-audio":
+        config = load_config(args.config)
+        if not run_backfill_audio(config, args.package):
+            sys.exit(1)
+        return
+    
+    if args.command == "serve":
+        config = load_config(args.config)
+        run_service(config, args.host, args.port, args.unix_socket)
+        return
+    
+    if args.command == "merge":
+        config = load_config(args.config)
+        if not merge_shards(config, args.bundles, args.output):
+            sys.exit(1)
+        return
+    
+    shard = None
+    if args.shard or args.shards:
+        if args.update:
+            print("❌ 分片构建不支持 --update，请合并后再增量更新")
+            sys.exit(1)
+        try:
+            shard = parse_shard(args.shard) if args.shard else None
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    
+    if args.shards and args.shards > 1 and shard is None and not args.dry_run and args.command != "check":
+        config = load_config(args.config)
+        run_local_shards(args, config, args.shards)
+        return
+    
+    if args.command == "check" or args.dry_run:
+        config = load_config(args.config)
+        if not report_check(*check_config(config, args.input)):
+            sys.exit(1)
+        if args.dry_run:
+            dry_run(config, args.input or config['paths']['input_txt'],
+                    config['paths'].get('journal', 'build_journal.jsonl'),
+                    resume=args.resume, update=args.update)
+        return
+    
+    print("=" * 70)
+    print("🚀 Anki 自动制卡程序启动")
+    print("=" * 70)
+    print()
+    
+    # 1. 加载配置文件
+    config = load_config(args.config)
+    configure_ssl()
+    if shard is not None:
+        apply_shard(config, shard)
+    
+    # 2. 提取配置信息
+    api_config, azure_config = build_service_configs(config)
     
     speed_config = config['speed_config']
     
-    input_txt = config['paths']['input_txt']
+    input_txt = args.input or config['paths']['input_txt']
     output_package = config['paths']['output_package']
     temp_media_dir = config['paths']['temp_media_dir']
+    journal_path = config['paths'].get('journal', 'build_journal.jsonl')
     deck_name = config['anki']['deck_name']
     
-    # 3. 加载单词列表
-    word_list = load_word_list(input_txt)
+    # 流水线并发配置 (可选，缺省时逐个处理)
+    concurrency_config = config.get('concurrency') or {}
     
-    if not word_list:
-        print("❌ 单词列表为空，程序退出")
-        sys.exit(1)
+    # 运行指标 (可选 Prometheus 接口)
+    metrics_server = start_metrics_server(config)
+    
+    # 后端选择 (可切换为本地模拟后端)
+    stub_server = setup_backends(config, api_config, azure_config)
+    
+    # LLM 补全缓存 (可选，模拟后端下不使用)
+    llm_cache = build_llm_cache(config) if stub_server is None else None
+    # TTS 音频缓存 (可选，模拟后端下不使用)
+    audio_cache = build_audio_cache(config) if azure_config.get('backend') != 'fake' else None
+    
+    # 3. 打开单词列表 (流式读取，去重后直接送入流水线)
+    word_list = load_word_list(input_txt)
     
     print()
     print("=" * 70)
@@ -132,24 +747,47 @@ def main():
     print("=" * 70)
     print()
     
-    # 4. 调用制卡函数
+    # 4. 打开断点日志 (--resume 时读取已完成的记录，否则重新开始)
+    journal = CardJournal(journal_path, resume=args.resume)
+    package_written = False
+    
+    # 5. 调用制卡函数
     try:
-        create_anki_package(
+        result = create_anki_package(
             word_list=word_list,
             package_name=output_package,
             media_output_dir=temp_media_dir,
             api_config=api_config,
             azure_config=azure_config,
             speed_config=speed_config,
-            deck_name=deck_name
+            deck_name=deck_name,
+            concurrency_config=concurrency_config,
+            llm_cache=llm_cache,
+            audio_cache=audio_cache,
+            journal=journal,
+            update_from=output_package if args.update else None,
+            delete_media=(config.get('packaging') or {}).get('delete_media_after_add', False),
+            shard=shard,
+            text_only=args.text_only,
+            retry_config=config.get('field_retry')
         )
+        package_written = result is not None
+        report_word_list(word_list)
+        if not package_written:
+            print("❌ 没有生成任何卡片")
+            sys.exit(1)
         
         print()
         print("=" * 70)
         print("🎉 制卡完成！")
         print("=" * 70)
         print(f"📦 输出文件: {os.path.abspath(output_package)}")
-        print("👉 请双击该文件导入到 Anki")
+        if shard is not None:
+            print("👉 所有分片完成后，用 python main.py merge <各分片的 .bundle> 合并为一个 .apkg")
+        else:
+            print("👉 请双击该文件导入到 Anki")
+        if args.text_only:
+            print("🔊 文本优先模式未生成音频，之后可用 python main.py backfill-audio 补齐")
         
     except Exception as e:
         print()
@@ -161,12 +799,25 @@ def main():
         sys.exit(1)
     
     finally:
-        # 5. 清理临时文件（无论成功失败都执行）
+        journal.close()
+        
+        # 6. 清理临时文件（只在打包成功后执行，失败时保留以便 --resume 续跑）
         print()
         print("=" * 70)
         print("🧹 清理临时文件")
         print("=" * 70)
-        clean_temp_files(temp_media_dir)
+        if package_written:
+            clean_temp_files(temp_media_dir, keep=[audio_cache.path if audio_cache else None])
+        else:
+            print(f"⚠️ 打包未完成，保留临时文件: {temp_media_dir}")
+            print(f"👉 可使用 python main.py --resume 从断点日志 {journal_path} 续跑")
+        if llm_cache is not None:
+            llm_cache.close()
+        if stub_server is not None:
+            stub_server.stop()
+        write_metrics_report(config)
+        if metrics_server is not None:
+            metrics_server.stop()
     
     print()
     print("=" * 70)
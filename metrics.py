@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标统计
+- MetricsRegistry: 线程安全的计数器与延迟直方图 (按名称 + 标签区分)
+- ProgressMeter: 根据已完成数量计算速度与预计剩余时间
+- MetricsServer: 可选的 Prometheus 文本格式 HTTP 接口，长时间运行时可随时抓取
+
+用法：
+    metrics = get_metrics()
+    with metrics.timer("llm_request_seconds", mode="json"):
+        ...
+    metrics.incr("llm_prompt_tokens", 120)
+    metrics.write_json("build_metrics.json")
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 直方图分桶上界 (秒)，覆盖本地缓存命中到慢速 API 请求
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+# 每个直方图最多保留的样本数 (蓄水池抽样，用于计算分位数)
+MAX_SAMPLES = 10000
+
+
+class Histogram:
+    """
+    延迟直方图：固定分桶计数 + 有限样本 (用于 p50 / p90 / p99)
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.samples = []
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+        else:
+            j = random.randrange(self.count)
+            if j < MAX_SAMPLES:
+                self.samples[j] = value
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        def rounded(value):
+            return None if value is None else round(value, 4)
+
+        return {
+            "count": self.count,
+            "sum": rounded(self.sum),
+            "mean": rounded(self.sum / self.count) if self.count else None,
+            "min": rounded(self.min),
+            "max": rounded(self.max),
+            "p50": rounded(self.percentile(0.5)),
+            "p90": rounded(self.percentile(0.9)),
+            "p99": rounded(self.percentile(0.99)),
+        }
+
+
+def _series_name(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """
+    指标注册表，可在多线程间共享
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._counters.clear()
+            self._histograms.clear()
+
+    def incr(self, name, value=1, **labels):
+        """
+        计数器累加
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        记录一次耗时 (秒)
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        统计代码块的耗时：with metrics.timer("tts_request_seconds"): ...
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {"elapsed_seconds", "counters": {...}, "histograms": {...}, "rates": {...}}
+        """
+        with self._lock:
+            elapsed = time.time() - self.started
+            counters = {_series_name(n, l): v for (n, l), v in sorted(self._counters.items())}
+            histograms = {_series_name(n, l): h.summary() for (n, l), h in sorted(self._histograms.items())}
+        words = sum(v for k, v in counters.items() if k.startswith("words_total"))
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "elapsed_seconds": round(elapsed, 3),
+            "rates": {"words_per_second": round(words / elapsed, 4) if elapsed > 0 else None},
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def write_json(self, path):
+        """
+        把当前指标写入 JSON 报告
+        """
+        report_dir = os.path.dirname(path)
+        if report_dir:
+            os.makedirs(report_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def prometheus_text(self):
+        """
+        Returns:
+            str: Prometheus 文本格式 (counter 与 histogram)
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, list(h.bucket_counts), h.buckets, h.count, h.sum)
+                          for key, h in sorted(self._histograms.items())]
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"anki_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{_series_name(metric, labels)} {value}")
+
+        for (name, labels), bucket_counts, buckets, count, total in histograms:
+            metric = f"anki_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, n in zip(buckets, bucket_counts):
+                cumulative += n
+                lines.append(f"{_series_name(metric + '_bucket', labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{_series_name(metric + '_bucket', labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{_series_name(metric + '_sum', labels)} {total}")
+            lines.append(f"{_series_name(metric + '_count', labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表 (整个进程共用)
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return _registry
+
+
+class ProgressMeter:
+    """
+    进度统计：已完成数量、速度 (个/秒) 与预计剩余时间
+    """
+
+    def __init__(self, total=None):
+        """
+        Args:
+            total: 总数，未知时 (流式读取) 为 None，此时不显示预计剩余时间
+        """
+        self.total = total
+        self.done = 0
+        self.started = time.monotonic()
+
+    def advance(self, count=1):
+        self.done += count
+
+    def line(self):
+        """
+        Returns:
+            str: 例如 "[12/300] 1.8 个/秒, 已用 00:07, 预计剩余 02:40"
+        """
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        text = f"[{self.done}/{self.total if self.total is not None else '?'}] {rate:.2f} 个/秒, 已用 {_format_duration(elapsed)}"
+        if self.total is not None and rate > 0:
+            text += f", 预计剩余 {_format_duration((self.total - self.done) / rate)}"
+        return text
+
+
+def _format_duration(seconds):
+    seconds = int(max(0, seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class MetricsServer:
+    """
+    Prometheus 文本格式接口：GET /metrics
+    """
+
+    def __init__(self, port, host="127.0.0.1", registry=None):
+        registry = registry or _registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
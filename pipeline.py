@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+分阶段并发流水线
+LLM 文本生成与 TTS 语音合成分别使用独立的线程池，阶段之间通过有界队列衔接，
+最终结果按输入顺序输出，保证生成的卡组顺序稳定。
+"""
+
+import queue
+import threading
+
+# 队列结束标记
+_STOP = object()
+
+
+def run_pipeline(items, text_stage, audio_stage, llm_workers=1, tts_workers=1, queue_size=16,
+                 text_batch_stage=None, batch_size=1):
+    """
+    以流水线方式处理输入条目，并按输入顺序逐个产出结果。
+
+    Args:
+        items: 输入条目的可迭代对象 (例如单词列表)
+        text_stage: 文本阶段函数 text_stage(item) -> text_data
+        audio_stage: 音频阶段函数 audio_stage(item, text_data) -> audio_paths
+        llm_workers: 文本阶段的并发线程数
+        tts_workers: 音频阶段的并发线程数
+        queue_size: 阶段之间队列的最大长度 (背压控制)
+        text_batch_stage: 批量文本阶段函数 (可选)
+            text_batch_stage([item, ...]) -> [text_data、Exception 或 None, ...]，与输入一一对应；
+            为 None 的条目作为单个条目重新放回文本阶段，由空闲的线程用 text_stage 处理
+        batch_size: 每批条目数，可以是整数或返回整数的函数 (用于自适应批大小)
+
+    Yields:
+        tuple: (index, item, text_data, audio_paths, error)，
+               error 为 None 表示成功，否则为该条目抛出的异常
+    """
+    llm_workers = max(1, int(llm_workers))
+    tts_workers = max(1, int(tts_workers))
+    queue_size = max(1, int(queue_size))
+
+    input_queue = queue.Queue(maxsize=queue_size)
+    audio_queue = queue.Queue(maxsize=queue_size)
+    done_queue = queue.Queue()
+
+    # 限制"已开始但尚未按序产出"的条目数量，避免乱序缓冲区无限增长
+    in_flight = threading.Semaphore(queue_size * 2 + llm_workers + tts_workers)
+    cancelled = threading.Event()
+    feeder_error = []
+
+    # 批量结果中缺失的条目重新放回文本阶段 (不限长度，优先于新的批次处理)
+    requeued = queue.Queue()
+
+    counter_lock = threading.Lock()
+    alive = {"llm": llm_workers, "tts": tts_workers}
+    # 已放入队列但尚未处理完的批次数 (含重新放回的条目)，降为 0 时文本线程才能退出
+    open_chunks = {"count": 0}
+
+    def current_batch_size():
+        if text_batch_stage is None:
+            return 1
+        size = batch_size() if callable(batch_size) else batch_size
+        return max(1, int(size))
+
+    def put_chunk(target, chunk):
+        with counter_lock:
+            open_chunks["count"] += 1
+        target.put(chunk)
+
+    def feeder():
+        chunk = []
+        try:
+            for index, item in enumerate(items):
+                while not in_flight.acquire(timeout=0.1):
+                    if cancelled.is_set():
+                        return
+                    # 等待期间先把已凑好的半批发出去，避免与下游互相等待
+                    if chunk:
+                        put_chunk(input_queue, chunk)
+                        chunk = []
+                if cancelled.is_set():
+                    return
+                chunk.append((index, item))
+                if len(chunk) >= current_batch_size():
+                    put_chunk(input_queue, chunk)
+                    chunk = []
+        except Exception as e:
+            feeder_error.append(e)
+        finally:
+            if chunk and not cancelled.is_set():
+                put_chunk(input_queue, chunk)
+            for _ in range(llm_workers):
+                input_queue.put(_STOP)
+
+    def run_text_stage(chunk):
+        # 返回与 chunk 一一对应的 (text_data, error)
+        if text_batch_stage is None or len(chunk) == 1:
+            index, item = chunk[0]
+            try:
+                return [(text_stage(item), None)]
+            except Exception as e:
+                return [(None, e)]
+        try:
+            outputs = text_batch_stage([item for _, item in chunk])
+        except Exception as e:
+            return [(None, e)] * len(chunk)
+        return [(None, out) if isinstance(out, Exception) else (out, None) for out in outputs]
+
+    def next_chunk(stopped):
+        # 优先处理重新放回的条目；输入已读完 (stopped) 后继续处理它们，直到所有批次都处理完
+        while True:
+            try:
+                return requeued.get_nowait()
+            except queue.Empty:
+                pass
+            if stopped:
+                with counter_lock:
+                    if open_chunks["count"] == 0:
+                        return None
+                try:
+                    return requeued.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+            # 带超时等待：乱序缓冲区满时输入会暂停，此时重新放回的条目必须仍能被取到
+            try:
+                return input_queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+
+    def llm_worker():
+        stopped = False
+        while True:
+            chunk = next_chunk(stopped)
+            if chunk is None:
+                break
+            if chunk is _STOP:
+                stopped = True
+                continue
+            try:
+                if cancelled.is_set():
+                    continue
+                for (index, item), (text_data, error) in zip(chunk, run_text_stage(chunk)):
+                    if error is not None:
+                        done_queue.put((index, item, None, None, error))
+                    elif text_data is None and len(chunk) > 1:
+                        put_chunk(requeued, [(index, item)])
+                    else:
+                        audio_queue.put((index, item, text_data))
+            finally:
+                with counter_lock:
+                    open_chunks["count"] -= 1
+
+        with counter_lock:
+            alive["llm"] -= 1
+            last = alive["llm"] == 0
+        if last:
+            for _ in range(tts_workers):
+                audio_queue.put(_STOP)
+
+    def tts_worker():
+        while True:
+            task = audio_queue.get()
+            if task is _STOP:
+                break
+            index, item, text_data = task
+            if cancelled.is_set():
+                continue
+            try:
+                audio_paths = audio_stage(item, text_data)
+            except Exception as e:
+                done_queue.put((index, item, text_data, None, e))
+                continue
+            done_queue.put((index, item, text_data, audio_paths, None))
+
+        with counter_lock:
+            alive["tts"] -= 1
+            last = alive["tts"] == 0
+        if last:
+            done_queue.put(_STOP)
+
+    threads = [threading.Thread(target=feeder, name="pipeline-feeder", daemon=True)]
+    threads += [threading.Thread(target=llm_worker, name=f"pipeline-llm-{i}", daemon=True)
+                for i in range(llm_workers)]
+    threads += [threading.Thread(target=tts_worker, name=f"pipeline-tts-{i}", daemon=True)
+                for i in range(tts_workers)]
+    for t in threads:
+        t.start()
+
+    # 乱序到达的结果先放入缓冲区，按 index 顺序依次产出
+    pending = {}
+    next_index = 0
+    try:
+        while True:
+            result = done_queue.get()
+            if result is _STOP:
+                # 理论上此时缓冲区已清空；若有缺号，剩余结果仍按顺序产出
+                for index in sorted(pending):
+                    yield pending.pop(index)
+                break
+            pending[result[0]] = result
+            while next_index in pending:
+                yield pending.pop(next_index)
+                in_flight.release()
+                next_index += 1
+    finally:
+        # 消费方提前退出时，通知各线程跳过剩余条目并尽快结束
+        cancelled.set()
+
+    if feeder_error:
+        raise feeder_error[0]
+
+
+class SingleFlight:
+    """
+    合并同时进行的相同任务：同一个键同一时间只执行一次，其他线程等待并共享它的结果。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def claim(self, key):
+        """
+        认领一个键
+
+        Returns:
+            tuple: (是否由当前线程执行, 等待函数)；执行者完成后必须调用 finish(key, value)，
+                   其他线程调用等待函数取得执行者的结果
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = [threading.Event(), None]
+                owner = True
+            else:
+                owner = False
+
+        def wait():
+            flight[0].wait()
+            return flight[1]
+
+        return owner, wait
+
+    def finish(self, key, value):
+        """
+        结束执行，唤醒所有等待的线程
+        """
+        with self._lock:
+            flight = self._flights.pop(key)
+        flight[1] = value
+        flight[0].set()
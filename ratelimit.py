@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+自适应限流 (LLM 与 TTS 共用)
+- TokenBucket: 令牌桶，分别限制每分钟请求数 (RPM) 与每分钟 token 数 (TPM)
+- AdaptiveLimiter: 令牌桶 + 并发上限 + 退避重试
+  * 遇到 429 时遵守 Retry-After，所有线程一起暂停，并把并发上限减半
+  * 其他可重试错误使用指数退避 + 随机抖动
+  * 请求持续成功时逐步提高并发上限；延迟明显变长时小幅降低 (AIMD)
+  目标是贴着服务商的限额运行，而不是撞上限额后大量失败。
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import get_metrics
+
+
+class TokenBucket:
+    """
+    令牌桶：容量为每分钟额度，按时间匀速补充。
+    允许余额暂时为负 (实际用量超过预估时记账)，之后的请求会相应多等一会儿。
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """
+        Returns:
+            float: 还需等待的秒数，0 表示现在就可以取走
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= amount
+
+
+class RetryableError(Exception):
+    """
+    重试次数用完后抛出，保留最后一次的错误
+    """
+
+    def __init__(self, message, last_error=None):
+        super().__init__(message)
+        self.last_error = last_error
+
+
+class AdaptiveLimiter:
+    """
+    自适应限流器，可在多线程间共享
+    """
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None,
+                 max_concurrency=16, min_concurrency=1, max_attempts=5,
+                 base_delay=1.0, max_delay=60.0, latency_factor=2.0):
+        """
+        Args:
+            name: 名称 (用于日志)
+            requests_per_minute: 每分钟请求数上限，None 表示不限
+            tokens_per_minute: 每分钟 token 数上限，None 表示不限
+            max_concurrency: 并发请求数上限 (初始值)
+            min_concurrency: 自动调整时并发请求数的下限
+            max_attempts: 单次调用的最大尝试次数 (含第一次)
+            base_delay: 指数退避的初始等待 (秒)
+            max_delay: 单次退避的最长等待 (秒)
+            latency_factor: 平均延迟超过历史最低水平的多少倍时降低并发
+        """
+        self.name = name
+        self.rpm = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tpm = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.latency_factor = float(latency_factor)
+
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency = None
+        self._baseline = None
+        self._cond = threading.Condition()
+
+        self.stats = {"requests": 0, "rate_limited": 0, "retries": 0, "failures": 0, "wait_seconds": 0.0}
+
+    # ------------------------------------------
+    # 获取与归还名额
+    # ------------------------------------------
+    def acquire(self, requests=1, tokens=0):
+        """
+        阻塞等待：暂停期结束、并发名额空闲、RPM / TPM 额度足够
+        """
+        started = time.monotonic()
+        self._wait_for_slot(requests, tokens, started)
+        get_metrics().observe("limiter_wait_seconds", time.monotonic() - started, stage=self.name)
+
+    def _wait_for_slot(self, requests, tokens, started):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0 and self.in_flight >= int(self.limit):
+                    wait = None  # 等待其他请求归还名额
+                elif wait <= 0:
+                    wait = max(self.rpm.wait_time(requests, now) if self.rpm else 0.0,
+                               self.tpm.wait_time(tokens, now) if self.tpm and tokens else 0.0)
+                    if wait <= 0:
+                        if self.rpm:
+                            self.rpm.take(requests)
+                        if self.tpm and tokens:
+                            self.tpm.take(tokens)
+                        self.in_flight += 1
+                        self.stats["requests"] += requests
+                        self.stats["wait_seconds"] += now - started
+                        return
+                self._cond.wait(wait)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, requests=1, tokens=0):
+        """
+        占用一个并发名额：with limiter.slot(tokens=...): 发起请求
+
+        Args:
+            requests: 本次占用的 RPM 令牌数 (实际发出的请求数)，并发名额始终只占一个；
+                例如 TTS 一个单词同时发起多个片段请求时，按请求数计 RPM，按单词计并发
+            tokens: 本次预估的 TPM token 数
+        """
+        self.acquire(requests, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def reconcile_tokens(self, estimated, actual):
+        """
+        用响应中的实际 token 用量修正预估值
+        """
+        if self.tpm and actual is not None:
+            with self._cond:
+                self.tpm.take(actual - estimated)
+
+    # ------------------------------------------
+    # 根据结果调整并发
+    # ------------------------------------------
+    def record_success(self, latency):
+        with self._cond:
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            if self._baseline is None or self._latency < self._baseline:
+                self._baseline = self._latency
+
+            now = time.monotonic()
+            if self._latency > self._baseline * self.latency_factor and now - self._last_decrease > self._latency:
+                # 延迟明显变长：服务端开始排队，小幅降低并发
+                self.limit = max(self.min_concurrency, self.limit * 0.9)
+                self._last_decrease = now
+            else:
+                # 加性增长：每完成约一轮并发请求，上限 +1
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / max(1.0, self.limit))
+            self._cond.notify_all()
+
+    def record_rate_limited(self, retry_after=None, attempt=0):
+        """
+        记录一次 429：所有线程暂停到 Retry-After (或退避时间) 之后，并发上限减半
+
+        Returns:
+            float: 本线程需要等待的秒数
+        """
+        delay = self.backoff_delay(attempt, retry_after)
+        get_metrics().incr("rate_limited_total", stage=self.name)
+        with self._cond:
+            self.stats["rate_limited"] += 1
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + delay)
+            # 同一波 429 只减半一次
+            if now - self._last_decrease > delay:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self._last_decrease = now
+                print(f"🐢 {self.name} 触发限流，暂停 {delay:.1f} 秒，并发上限降为 {int(self.limit)}")
+            self._cond.notify_all()
+        return delay
+
+    def record_retry(self, attempt, rate_limited=False, retry_after=None):
+        """
+        记录一次重试
+
+        Returns:
+            float: 重试前需要等待的秒数
+        """
+        if rate_limited:
+            delay = self.record_rate_limited(retry_after, attempt)
+        else:
+            delay = self.backoff_delay(attempt, retry_after)
+        get_metrics().incr("retries_total", stage=self.name)
+        with self._cond:
+            self.stats["retries"] += 1
+        return delay
+
+    def record_failure(self):
+        get_metrics().incr("retry_exhausted_total", stage=self.name)
+        with self._cond:
+            self.stats["failures"] += 1
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """
+        Returns:
+            float: 第 attempt 次重试前的等待秒数 (有 Retry-After 时以其为准，否则指数退避 + 随机抖动)
+        """
+        if retry_after is not None and retry_after >= 0:
+            return min(float(retry_after), self.max_delay) + random.uniform(0, self.base_delay)
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    # ------------------------------------------
+    # 带重试的调用
+    # ------------------------------------------
+    def call(self, fn, classify, tokens=0, requests=1):
+        """
+        在限流与重试保护下调用 fn()
+
+        Args:
+            fn: 实际发起请求的函数
+            classify: classify(exception) -> (是否可重试, 是否为限流, Retry-After 秒数或 None)
+            tokens: 预估的 token 用量 (用于 TPM)
+            requests: 本次调用包含的请求数 (用于 RPM)
+
+        Returns:
+            fn 的返回值；不可重试的错误直接抛出，重试次数用完抛出 RetryableError
+        """
+        last_error = None
+        for attempt in range(self.max_attempts):
+            with self.slot(requests, tokens):
+                started = time.monotonic()
+                try:
+                    result = fn()
+                except Exception as e:
+                    last_error = e
+                    retryable, rate_limited, retry_after = classify(e)
+                else:
+                    self.record_success(time.monotonic() - started)
+                    return result
+
+            if not retryable:
+                self.record_failure()
+                raise last_error
+            if attempt + 1 >= self.max_attempts:
+                break
+            time.sleep(self.record_retry(attempt, rate_limited, retry_after))
+
+        self.record_failure()
+        raise RetryableError(f"{self.name} 共尝试 {self.max_attempts} 次后仍然失败: {last_error}", last_error)
+
+    def summary(self):
+        with self._cond:
+            return dict(self.stats, concurrency=int(self.limit))
+
+
+# 全局限流器 (按名称与配置共享，同一阶段的所有线程共用一个)
+_limiter_lock = threading.Lock()
+_limiters = {}
+
+
+def get_rate_limiter(name, settings):
+    """
+    获取共享的限流器
+
+    Args:
+        name: 限流器名称，例如 "llm" / "tts"
+        settings (dict): AdaptiveLimiter 的参数；为空或 enabled 为 False 时返回 None
+
+    Returns:
+        AdaptiveLimiter: 共享的限流器，未启用时返回 None
+    """
+    if not settings or not settings.get("enabled", True):
+        return None
+    params = {k: v for k, v in settings.items() if k != "enabled"}
+    key = (name, tuple(sorted(params.items())))
+    with _limiter_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveLimiter(name, **params)
+            _limiters[key] = limiter
+        return limiter
+
+
+def limiter_summaries():
+    """
+    Returns:
+        dict: 限流器名称 -> 统计信息 (只包含实际发起过请求的限流器)
+    """
+    with _limiter_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.summary() for limiter in limiters if limiter.stats["requests"]}
+
+
+def parse_retry_after(value):
+    """
+    解析 Retry-After 响应头 (秒数或 HTTP 日期)
+
+    Returns:
+        float: 秒数，无法解析时返回 None
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+后台重试队列
+没有完全成功的任务 (例如某个字段生成失败的卡片) 放入队列，由后台线程按指数退避的延迟重新处理，
+每轮只重做仍未成功的部分，直到成功或用完重试轮数。主线程随时取出已完成的任务，不必等待整个队列。
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+
+class RetryQueue:
+    """
+    延迟重试队列
+
+    用法:
+        retries = RetryQueue(retry_fn, max_rounds=3)
+        retries.submit(key, state)
+        for key, state, ok in retries.drain():          # 取出已完成的任务 (不等待)
+            ...
+        for key, state, ok in retries.drain(wait=True): # 等待剩余任务全部完成
+            ...
+        retries.close()
+    """
+
+    def __init__(self, retry_fn, max_rounds=3, base_delay=5.0, max_delay=60.0, workers=2):
+        """
+        Args:
+            retry_fn: 重试函数 retry_fn(key, state) -> (new_state, done)，done 为 True 表示任务已全部成功；
+                      抛出异常时视为本轮失败，保留原来的 state
+            max_rounds: 每个任务最多重试几轮
+            base_delay: 第一轮重试前的等待 (秒)，之后每轮翻倍
+            max_delay: 单轮等待的上限 (秒)
+            workers: 后台重试线程数
+        """
+        self.retry_fn = retry_fn
+        self.max_rounds = max(1, int(max_rounds))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.workers = max(1, int(workers))
+
+        # 等待重试的任务: (到期时间, 序号, key, state, 轮次)
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._done = queue.Queue()
+        self._threads = []
+        self._closed = False
+        # 已提交但尚未取出的任务数 (只在主线程中读写)
+        self.outstanding = 0
+
+    def _schedule(self, key, state, round_no):
+        delay = min(self.max_delay, self.base_delay * 2 ** (round_no - 1))
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), key, state, round_no))
+            self._cond.notify()
+
+    def submit(self, key, state):
+        """
+        提交一个需要重试的任务 (第一次重试在 base_delay 秒后进行)
+        """
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"retry-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self.outstanding += 1
+        self._schedule(key, state, 1)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                if self._closed:
+                    return
+                _, _, key, state, round_no = heapq.heappop(self._heap)
+
+            try:
+                state, done = self.retry_fn(key, state)
+            except Exception as e:
+                print(f"⚠️ 第 {round_no} 轮重试出错: {e}")
+                done = False
+
+            if done or round_no >= self.max_rounds:
+                self._done.put((key, state, done))
+            else:
+                self._schedule(key, state, round_no + 1)
+
+    def drain(self, wait=False):
+        """
+        产出已完成的任务 (key, state, ok)，ok 为 False 表示重试轮数已用完
+
+        Args:
+            wait: 为 True 时一直等到所有已提交的任务完成
+        """
+        while self.outstanding:
+            try:
+                item = self._done.get(block=wait)
+            except queue.Empty:
+                return
+            self.outstanding -= 1
+            yield item
+
+    def close(self):
+        """
+        停止后台线程 (尚未完成的任务被丢弃)
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+常驻服务模式
+启动一次后保持 LLM / TTS 客户端、缓存与卡片模板常驻，通过本地 HTTP (或 Unix socket) 接收单词列表任务；
+所有任务共用同一组限流器与连接池，完成后把 .apkg 流式返回。
+省去每次运行都要付出的解释器启动、SDK 导入、配置解析、客户端创建与模板构造开销，几个单词的小任务几秒内即可返回。
+
+接口:
+    POST /jobs                 提交任务。请求体为单词列表 (每行一个)，
+                               或 JSON {"words": [...], "deck_name": "...", "text_only": false}；
+                               也可以用查询参数 deck_name / text_only。带 wait=1 时等待完成并直接返回 .apkg
+    GET  /jobs/<id>            任务状态 (JSON)
+    GET  /jobs/<id>/package    下载完成的 .apkg
+    GET  /health               服务状态
+    GET  /metrics              Prometheus 格式的运行指标
+"""
+
+import json
+import os
+import queue
+import shutil
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from metrics import get_metrics
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """
+    一个制卡任务
+    """
+
+    def __init__(self, words, deck_name, text_only=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.words = words
+        self.deck_name = deck_name
+        self.text_only = text_only
+        self.status = QUEUED
+        self.error = None
+        self.package = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "words": len(self.words),
+            "deck_name": self.deck_name,
+            "text_only": self.text_only,
+            "error": self.error,
+            "queued_seconds": round((self.started or time.time()) - self.created, 3),
+            "run_seconds": round((self.finished or time.time()) - self.started, 3) if self.started else None,
+        }
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class CardService:
+    """
+    常驻制卡服务：任务队列 + 固定数量的任务线程，每个任务调用一次 create_anki_package。
+    客户端、限流器、合成器池与缓存都是进程内共享的，任务之间自然复用。
+
+    用法:
+        service = CardService(build_options, work_dir=".service_jobs")
+        service.warm_up()
+        service.serve(port=8710)     # 阻塞，Ctrl+C 退出
+    """
+
+    def __init__(self, build_options, work_dir=".service_jobs", deck_name="new words deck",
+                 job_workers=2, job_ttl=3600, max_words=5000):
+        """
+        Args:
+            build_options (dict): 传给 create_anki_package 的公共参数
+                (api_config, azure_config, speed_config, concurrency_config, llm_cache, audio_cache, retry_config 等)
+            work_dir: 任务的工作目录 (每个任务一个子目录，存放临时音频与生成的卡组包)
+            deck_name: 任务未指定卡组名称时使用的名称
+            job_workers: 同时运行的任务数 (所有任务共用同一组限流器)
+            job_ttl: 完成的任务保留多久 (秒)，之后删除其卡组包
+            max_words: 单个任务最多的单词数
+        """
+        self.build_options = dict(build_options)
+        self.work_dir = work_dir
+        self.deck_name = deck_name
+        self.job_workers = max(1, int(job_workers))
+        self.job_ttl = job_ttl
+        self.max_words = max_words
+
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._threads = []
+        self._server = None
+        self.started = time.time()
+
+    def warm_up(self):
+        """
+        预先加载 SDK、创建客户端与合成器、构造卡片模板，第一个任务不再承担这些开销
+
+        Returns:
+            float: 预热耗时 (秒)
+        """
+        from generate import build_anki_model, get_openai_client
+        from tts import get_tts_backend, resolve_audio_format
+
+        started = time.perf_counter()
+        build_anki_model()
+        get_openai_client(self.build_options.get("api_config"))
+        azure_config = self.build_options.get("azure_config") or {}
+        backend = get_tts_backend(azure_config, resolve_audio_format(azure_config.get("audio_format"))[0])
+        # Azure 合成器池：先建立一个连接放回池中
+        if hasattr(backend, "acquire"):
+            backend.release(backend.acquire())
+        return time.perf_counter() - started
+
+    def submit(self, words, deck_name=None, text_only=False):
+        """
+        提交一个任务
+
+        Returns:
+            Job: 已进入队列的任务
+
+        Raises:
+            ValueError: 单词列表为空或超过 max_words
+        """
+        words = [w.strip() for w in words if isinstance(w, str) and w.strip()]
+        if not words:
+            raise ValueError("单词列表为空")
+        if self.max_words and len(words) > self.max_words:
+            raise ValueError(f"单个任务最多 {self.max_words} 个单词，本次 {len(words)} 个")
+
+        self._expire_jobs()
+        job = Job(words, deck_name or self.deck_name, text_only=text_only)
+        with self._lock:
+            self.jobs[job.id] = job
+        if not self._threads:
+            self.start_workers()
+        self._queue.put(job)
+        get_metrics().incr("service_jobs", status="submitted")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def start_workers(self):
+        for i in range(self.job_workers):
+            thread = threading.Thread(target=self._worker, name=f"job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        from generate import create_anki_package
+
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job_dir = os.path.join(self.work_dir, job.id)
+            job.status = RUNNING
+            job.started = time.time()
+            try:
+                os.makedirs(job_dir, exist_ok=True)
+                package = create_anki_package(
+                    job.words,
+                    package_name=os.path.join(job_dir, "deck.apkg"),
+                    media_output_dir=os.path.join(job_dir, "media"),
+                    deck_name=job.deck_name,
+                    delete_media=True,
+                    text_only=job.text_only,
+                    **self.build_options
+                )
+                if package is None:
+                    raise RuntimeError("没有生成任何卡片")
+                job.package = package
+                job.status = DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+                print(f"❌ 任务 {job.id} 失败: {e}")
+            finally:
+                shutil.rmtree(os.path.join(job_dir, "media"), ignore_errors=True)
+                job.finished = time.time()
+                get_metrics().incr("service_jobs", status=job.status)
+                get_metrics().observe("service_job_seconds", job.finished - job.created)
+                job.done.set()
+
+    def _expire_jobs(self):
+        # 删除超过保留时间的已完成任务及其卡组包
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self.jobs.values()
+                       if job.finished is not None and now - job.finished > self.job_ttl]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            shutil.rmtree(os.path.join(self.work_dir, job.id), ignore_errors=True)
+
+    def summary(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"status": "ok", "uptime_seconds": round(time.time() - self.started, 1),
+                "job_workers": self.job_workers, "jobs": counts}
+
+    def _make_handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_package(self, job):
+                # 卡组包按块流式写出，不整个读入内存
+                size = os.path.getsize(job.package)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Disposition", f'attachment; filename="{job.id}.apkg"')
+                self.send_header("Content-Length", str(size))
+                self.send_header("X-Job-Id", job.id)
+                self.end_headers()
+                with open(job.package, "rb") as f:
+                    shutil.copyfileobj(f, self.wfile)
+
+            def _read_job_request(self, params):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                options = {"deck_name": params.get("deck_name", [None])[0],
+                           "text_only": params.get("text_only", ["0"])[0] in ("1", "true")}
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    request = json.loads(body or b"{}")
+                    words = request.get("words")
+                    if not isinstance(words, list):
+                        raise ValueError('JSON 请求体需要包含 "words" 列表')
+                    options["deck_name"] = request.get("deck_name", options["deck_name"])
+                    options["text_only"] = bool(request.get("text_only", options["text_only"]))
+                else:
+                    words = body.decode("utf-8").splitlines()
+                return words, options
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path.rstrip("/") != "/jobs":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                params = parse_qs(url.query)
+                try:
+                    words, options = self._read_job_request(params)
+                    job = service.submit(words, **options)
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                    return
+
+                if params.get("wait", ["0"])[0] not in ("1", "true"):
+                    self._send_json(202, job.to_dict())
+                    return
+                job.done.wait()
+                if job.status == DONE:
+                    self._send_package(job)
+                else:
+                    self._send_json(500, job.to_dict())
+
+            def do_GET(self):
+                parts = [part for part in urlparse(self.path).path.split("/") if part]
+                if parts == ["health"]:
+                    self._send_json(200, service.summary())
+                    return
+                if parts == ["metrics"]:
+                    body = get_metrics().prometheus_text().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                job = service.get(parts[1]) if len(parts) in (2, 3) and parts[0] == "jobs" else None
+                if job is None or (len(parts) == 3 and parts[2] != "package"):
+                    self._send_json(404, {"error": "not found"})
+                    return
+                if len(parts) == 2:
+                    self._send_json(200, job.to_dict())
+                elif job.status != DONE:
+                    self._send_json(409, job.to_dict())
+                else:
+                    self._send_package(job)
+
+        return Handler
+
+    def serve(self, host="127.0.0.1", port=8710, unix_socket=None):
+        """
+        启动服务并阻塞，直到 shutdown() 被调用 (或 Ctrl+C)
+
+        Args:
+            host / port: HTTP 监听地址 (只建议监听本机)
+            unix_socket: Unix socket 路径，指定后改为监听该 socket
+        """
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            self._server = _UnixHTTPServer(unix_socket, self._make_handler())
+            address = f"unix:{unix_socket}"
+        else:
+            self._server = ThreadingHTTPServer((host, port), self._make_handler())
+            self._server.daemon_threads = True
+            address = "http://{}:{}".format(*self._server.server_address[:2])
+        if not self._threads:
+            self.start_workers()
+        print(f"🛰️ 制卡服务已启动: {address} (任务线程 {self.job_workers} 个)")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if unix_socket and os.path.exists(unix_socket):
+                os.remove(unix_socket)
+
+    def shutdown(self):
+        """
+        停止接收请求与任务线程 (正在运行的任务会被放弃)
+        """
+        if self._server is not None:
+            self._server.shutdown()
+        for _ in self._threads:
+            self._queue.put(None)
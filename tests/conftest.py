@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import zipfile
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块 (与 benchmarks 中的脚本相同)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_backends import StubLLMServer  # noqa: E402
+
+# 本地模拟合成器 (无延迟)
+FAKE_AZURE_CONFIG = {"backend": "fake", "speech_key": "fake", "region": "local",
+                     "voice_name": "en-GB-SoniaNeural", "fake_latency_ms": 0, "fake_jitter_ms": 0}
+
+
+@pytest.fixture
+def api_config():
+    """
+    指向本地模拟 LLM 服务的 api_config
+    """
+    stub = StubLLMServer(latency_ms=0, jitter_ms=0)
+    base_url = stub.start()
+    yield {"base_url": base_url, "api_key": "stub", "model_name": "stub"}
+    stub.stop()
+
+
+@pytest.fixture
+def azure_config():
+    return dict(FAKE_AZURE_CONFIG)
+
+
+def _read_package(path):
+    """
+    Returns:
+        tuple: (按写入顺序排列的笔记字段列表, 卡组包中的媒体文件名集合)
+    """
+    with zipfile.ZipFile(path) as z:
+        media = set(json.loads(z.read("media")).values())
+        fd, db_path = tempfile.mkstemp(suffix=".anki2")
+        with os.fdopen(fd, "wb") as f:
+            f.write(z.read("collection.anki2"))
+    try:
+        conn = sqlite3.connect(db_path)
+        notes = [row[0].split("\x1f") for row in conn.execute("SELECT flds FROM notes ORDER BY id")]
+        conn.close()
+    finally:
+        os.remove(db_path)
+    return notes, media
+
+
+@pytest.fixture
+def read_package():
+    return _read_package
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+静音音频生成的测试 (模拟合成器输出的 Opus 容器必须是有效文件)
+"""
+
+import struct
+
+from audio_utils import _OGG_CRC_TABLE, silent_ogg_opus_bytes, silent_webm_opus_bytes
+
+
+def ogg_crc(page):
+    # 校验和字段置 0 后计算
+    crc = 0
+    for byte in page:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+def parse_ogg_pages(data):
+    pages = []
+    pos = 0
+    while pos < len(data):
+        assert data[pos:pos + 4] == b"OggS"
+        _, flags, granule, serial, sequence, crc = struct.unpack("<BBqIII", data[pos + 4:pos + 26])
+        segments = data[pos + 26]
+        lacing = data[pos + 27:pos + 27 + segments]
+        end = pos + 27 + segments + sum(lacing)
+        page = data[pos:end]
+        assert ogg_crc(page[:22] + bytes(4) + page[26:]) == crc
+        pages.append((flags, granule, page[27 + segments:]))
+        pos = end
+    return pages
+
+
+def test_ogg_opus_is_a_complete_stream():
+    pages = parse_ogg_pages(silent_ogg_opus_bytes(2.5, bitrate_kbps=24))
+    assert pages[0][0] == 0x02 and pages[0][2].startswith(b"OpusHead")
+    assert pages[1][2].startswith(b"OpusTags")
+    assert pages[-1][0] == 0x04
+    # granule position 按 48kHz 计：2.5 秒 = 125 个 20 毫秒的包
+    assert pages[-1][1] == 125 * 960
+
+
+def test_opus_size_follows_bitrate():
+    small = len(silent_ogg_opus_bytes(10, bitrate_kbps=24))
+    large = len(silent_ogg_opus_bytes(10, bitrate_kbps=96))
+    assert 28_000 < small < 34_000
+    assert 118_000 < large < 124_000
+
+
+def test_webm_opus_header():
+    data = silent_webm_opus_bytes(1.0)
+    assert data.startswith(b"\x1a\x45\xdf\xa3")
+    assert b"webm" in data[:100] and b"A_OPUS" in data and b"OpusHead" in data
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+backfill_audio 的测试：补齐后检查 WordAudio / MeaningAudio / ExampleAudio 的实际内容
+(本地模拟后端，不需要网络)
+"""
+
+import generate
+from generate import ERROR_PLACEHOLDER, backfill_audio, create_anki_package
+from tts import SynthesisResult
+
+WORDS = ["kangaroo", "give up"]
+
+
+def build(tmp_path, api_config, azure_config, **kwargs):
+    package = str(tmp_path / "deck.apkg")
+    create_anki_package(WORDS, package_name=package, media_output_dir=str(tmp_path / "media"),
+                        api_config=api_config, azure_config=azure_config, retry_config={"enabled": False},
+                        **kwargs)
+    return package
+
+
+def backfill(tmp_path, package, azure_config):
+    return backfill_audio(package, media_output_dir=str(tmp_path / "backfill_media"), azure_config=azure_config)
+
+
+def sounds(field):
+    return [tag[7:-1] for tag in field.split()]
+
+
+def assert_full_audio(fields, media):
+    slow, fast = sounds(fields[2])
+    assert "_slow_" in slow and "_fast_" in fast
+    assert len(sounds(fields[5])) == 1 and len(sounds(fields[6])) == 1
+    assert set(sounds(fields[2]) + sounds(fields[5]) + sounds(fields[6])) <= media
+
+
+def test_backfill_text_only_deck(tmp_path, api_config, azure_config, read_package):
+    package = build(tmp_path, api_config, azure_config, text_only=True)
+    notes, _ = read_package(package)
+    assert all(fields[2] == fields[5] == fields[6] == "" for fields in notes)
+
+    assert backfill(tmp_path, package, azure_config) == {"notes": 2, "filled": 2, "missing": 0}
+    notes, media = read_package(package)
+    assert [fields[0] for fields in notes] == WORDS
+    for fields in notes:
+        assert_full_audio(fields, media)
+
+
+def test_backfill_restores_a_missing_slow_clip(tmp_path, api_config, azure_config, read_package, monkeypatch):
+    real_speak = generate.speak_many_limited
+
+    def fail_slow(backend, ssml_list, limiter=None):
+        results = real_speak(backend, ssml_list, limiter)
+        return [SynthesisResult(error="Error: injected failure") if 'rate="-30%"' in ssml else result
+                for ssml, result in zip(ssml_list, results)]
+
+    with monkeypatch.context() as m:
+        m.setattr(generate, "speak_many_limited", fail_slow)
+        package = build(tmp_path, api_config, azure_config)
+    notes, _ = read_package(package)
+    assert all(len(sounds(fields[2])) == 1 for fields in notes)
+
+    assert backfill(tmp_path, package, azure_config) == {"notes": 2, "filled": 2, "missing": 0}
+    notes, media = read_package(package)
+    for fields in notes:
+        assert_full_audio(fields, media)
+
+
+def test_backfill_skips_only_the_failed_text(tmp_path, api_config, azure_config, read_package, monkeypatch):
+    real_request = generate.request_completion
+
+    def fail_prompts(client, model_name, system_prompt, user_content, **kwargs):
+        # kangaroo 的音标失败；give up 的例句失败
+        if "kangaroo" in user_content and "International Phonetic Alphabet" in system_prompt:
+            return ERROR_PLACEHOLDER
+        if "give up" in user_content and "example sentences" in system_prompt:
+            return ERROR_PLACEHOLDER
+        return real_request(client, model_name, system_prompt, user_content, **kwargs)
+
+    with monkeypatch.context() as m:
+        m.setattr(generate, "request_completion", fail_prompts)
+        package = build(tmp_path, api_config, azure_config, text_only=True)
+
+    assert backfill(tmp_path, package, azure_config) == {"notes": 2, "filled": 1, "missing": 1}
+    notes, media = read_package(package)
+    kangaroo, give_up = notes
+    # 音标出错不影响朗读：四段音频全部补齐
+    assert ERROR_PLACEHOLDER in kangaroo[1]
+    assert_full_audio(kangaroo, media)
+    # 例句出错：只有例句音频不合成
+    assert len(sounds(give_up[2])) == 2 and len(sounds(give_up[5])) == 1
+    assert give_up[6] == ""
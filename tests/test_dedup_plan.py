@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""
+create_anki_package 的去重计划测试 (本地模拟后端，不需要网络)
+"""
+
+from generate import create_anki_package
+
+
+def test_list_input_keeps_case_variants_as_separate_cards(tmp_path, api_config, azure_config, read_package):
+    package = tmp_path / "deck.apkg"
+    create_anki_package(["Polish", "polish", "polish ", "May", "may"], package_name=str(package),
+                        media_output_dir=str(tmp_path / "media"), api_config=api_config,
+                        azure_config=azure_config)
+
+    notes, media = read_package(package)
+    assert [fields[0] for fields in notes] == ["Polish", "polish", "May", "may"]
+    # 每张卡片各自的单词音频，不会因为只差大小写而共用或覆盖
+    assert len([name for name in media if name.lower().startswith("polish_slow")]) == 2
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+字段级重试的测试：注入单个字段或单段音频的失败，只重做失败的部分并写入笔记
+(本地模拟后端，不需要网络)
+"""
+
+import collections
+import threading
+
+import generate
+from generate import ERROR_PLACEHOLDER, create_anki_package
+from retry_queue import RetryQueue
+from tts import SynthesisResult
+
+RETRY_CONFIG = {"enabled": True, "max_rounds": 3, "base_delay": 0.01, "max_delay": 0.01, "workers": 1}
+
+
+def prompt_kind(system_prompt):
+    if "International Phonetic Alphabet" in system_prompt:
+        return "ipa"
+    if "numbered English definitions" in system_prompt:
+        return "definitions"
+    if "example sentences" in system_prompt:
+        return "examples"
+    return "other"
+
+
+def test_retry_queue_retries_until_done():
+    attempts = collections.Counter()
+
+    def retry_fn(key, state):
+        attempts[key] += 1
+        return state + 1, attempts[key] >= 2
+
+    retries = RetryQueue(retry_fn, max_rounds=3, base_delay=0.01, max_delay=0.01)
+    retries.submit("a", 0)
+    assert list(retries.drain(wait=True)) == [("a", 2, True)]
+    retries.close()
+
+
+def test_retry_queue_gives_up_after_max_rounds():
+    retries = RetryQueue(lambda key, state: (state, False), max_rounds=2, base_delay=0.01, max_delay=0.01)
+    retries.submit("a", "s")
+    assert list(retries.drain(wait=True)) == [("a", "s", False)]
+    retries.close()
+
+
+def test_failed_text_field_is_the_only_one_regenerated(tmp_path, api_config, azure_config, read_package,
+                                                        monkeypatch):
+    calls = collections.Counter()
+    lock = threading.Lock()
+    real_request = generate.request_completion
+
+    def flaky_request(client, model_name, system_prompt, user_content, **kwargs):
+        kind = prompt_kind(system_prompt)
+        word = "bank" if "bank" in user_content else "apple"
+        with lock:
+            calls[word, kind] += 1
+            first = calls[word, kind] == 1
+        if word == "bank" and kind == "examples" and first:
+            return ERROR_PLACEHOLDER
+        return real_request(client, model_name, system_prompt, user_content, **kwargs)
+
+    synthesized = []
+    real_speak = generate.speak_many_limited
+
+    def recording_speak(backend, ssml_list, limiter=None):
+        with lock:
+            synthesized.extend(ssml_list)
+        return real_speak(backend, ssml_list, limiter)
+
+    monkeypatch.setattr(generate, "request_completion", flaky_request)
+    monkeypatch.setattr(generate, "speak_many_limited", recording_speak)
+
+    package = tmp_path / "deck.apkg"
+    create_anki_package(["apple", "bank"], package_name=str(package), media_output_dir=str(tmp_path / "media"),
+                        api_config=api_config, azure_config=azure_config, retry_config=RETRY_CONFIG)
+
+    # 只有 bank 的例句被重新请求，音标与释义沿用第一次的结果
+    assert calls["bank", "ipa"] == 1
+    assert calls["bank", "definitions"] == 1
+    assert calls["bank", "examples"] == 2
+    assert calls["apple", "examples"] == 1
+
+    # 出错占位内容从未被朗读，每段音频只合成一次
+    assert not any(ERROR_PLACEHOLDER in ssml for ssml in synthesized)
+    bank_examples = [ssml for ssml in synthesized if "sentence" in ssml and "bank" in ssml]
+    assert len(bank_examples) == 1
+
+    notes, media = read_package(package)
+    bank = {fields[0]: fields for fields in notes}["bank"]
+    assert ERROR_PLACEHOLDER not in "".join(bank)
+    assert "example sentence 1" in bank[4]
+    assert bank[6].startswith("[sound:") and bank[6][7:-1] in media
+
+
+def test_failed_clip_is_the_only_one_resynthesized(tmp_path, api_config, azure_config, read_package, monkeypatch):
+    requested = collections.Counter()
+    lock = threading.Lock()
+    real_speak = generate.speak_many_limited
+
+    def clip_name(ssml):
+        for name in ("meaning", "sentence"):
+            if name in ssml:
+                return name
+        return "word"
+
+    def flaky_speak(backend, ssml_list, limiter=None):
+        results = real_speak(backend, ssml_list, limiter)
+        for i, ssml in enumerate(ssml_list):
+            with lock:
+                requested[clip_name(ssml)] += 1
+                first = requested[clip_name(ssml)] == 1
+            if clip_name(ssml) == "meaning" and first:
+                results[i] = SynthesisResult(error="Error: injected failure")
+        return results
+
+    monkeypatch.setattr(generate, "speak_many_limited", flaky_speak)
+
+    package = tmp_path / "deck.apkg"
+    create_anki_package(["kangaroo"], package_name=str(package), media_output_dir=str(tmp_path / "media"),
+                        api_config=api_config, azure_config=azure_config, retry_config=RETRY_CONFIG)
+
+    # 释义音频失败一次后单独重新合成，单词与例句音频不再请求
+    assert requested == {"word": 2, "meaning": 2, "sentence": 1}
+
+    notes, media = read_package(package)
+    kangaroo = notes[0]
+    assert kangaroo[5].startswith("[sound:") and kangaroo[5][7:-1] in media
+    assert all(name in media for name in (s[7:-1] for s in kangaroo[2].split()))
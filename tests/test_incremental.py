@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+增量更新的测试：读取缺少部分音频的卡组包，只补合成缺少的片段
+(本地模拟后端，不需要网络)
+"""
+
+import generate
+from generate import MODEL_ID, create_anki_package
+from incremental import ExistingPackage
+from tts import SynthesisResult
+
+SLOW_RATE = 'rate="-30%"'
+
+
+def fail_slow_word_clip(monkeypatch):
+    """
+    让单词慢读片段合成失败
+    """
+    real_speak = generate.speak_many_limited
+
+    def flaky_speak(backend, ssml_list, limiter=None):
+        results = real_speak(backend, ssml_list, limiter)
+        return [SynthesisResult(error="Error: injected failure") if SLOW_RATE in ssml else result
+                for ssml, result in zip(ssml_list, results)]
+
+    monkeypatch.setattr(generate, "speak_many_limited", flaky_speak)
+
+
+def test_deck_missing_the_slow_clip_reloads_and_updates(tmp_path, api_config, azure_config, read_package,
+                                                        monkeypatch):
+    package = str(tmp_path / "deck.apkg")
+    options = dict(package_name=package, media_output_dir=str(tmp_path / "media"), api_config=api_config,
+                   azure_config=azure_config, retry_config={"enabled": False})
+
+    with monkeypatch.context() as m:
+        fail_slow_word_clip(m)
+        create_anki_package(["kangaroo"], **options)
+
+    notes, _ = read_package(package)
+    word_audio = notes[0][2]
+    assert "_fast_" in word_audio and "_slow_" not in word_audio
+
+    # 只剩快读音频时，它仍被识别为快读，缺少的是慢读
+    existing = ExistingPackage(package, MODEL_ID)
+    note = existing.notes[0]
+    assert existing.missing_audio(note) == ["word_slow"]
+    assert "_fast_" in existing.sound_names(note)["word_fast"]
+    existing.close()
+
+    requested = []
+    real_speak = generate.speak_many_limited
+
+    def recording_speak(backend, ssml_list, limiter=None):
+        # 单线程 (默认并发 1)，不需要加锁
+        requested.extend(ssml_list)
+        return real_speak(backend, ssml_list, limiter)
+
+    monkeypatch.setattr(generate, "speak_many_limited", recording_speak)
+    create_anki_package(["kangaroo"], update_from=package, **options)
+
+    # 只补合成慢读，WordAudio 先慢后快，两个文件都在卡组包里
+    assert len(requested) == 1 and SLOW_RATE in requested[0]
+    notes, media = read_package(package)
+    slow, fast = [tag[7:-1] for tag in notes[0][2].split()]
+    assert "_slow_" in slow and "_fast_" in fast
+    assert {slow, fast} <= media
+
+
+def test_baseline_names_fall_back_to_position():
+    note = {"fields": ["tear", "", "[sound:tear_slow.mp3] [sound:tear_fast.mp3]", "", "", "", ""]}
+    assert ExistingPackage.sound_names(note) == {"word_slow": "tear_slow.mp3", "word_fast": "tear_fast.mp3"}
+    note["fields"][2] = "[sound:custom-1.mp3] [sound:custom-2.mp3]"
+    assert ExistingPackage.sound_names(note) == {"word_slow": "custom-1.mp3", "word_fast": "custom-2.mp3"}
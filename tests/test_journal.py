@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+断点日志的测试
+"""
+
+from journal import CardJournal
+
+CARD = {"word": "a", "ipa": "/a/", "definitions": "1. d", "examples": "1. e"}
+
+
+def test_resume_after_torn_tail_keeps_new_records(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = CardJournal(path)
+    journal.append(0, "a", CARD, {})
+    journal.append(1, "torn", CARD, {})
+    journal.close()
+
+    # 模拟写最后一条记录时崩溃：文件停在半行处，没有换行符
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-20])
+
+    journal = CardJournal(path, resume=True)
+    assert set(journal.entries) == {"a"}
+    journal.append(2, "b", CARD, {})
+    journal.close()
+
+    assert set(CardJournal.load(path)) == {"a", "b"}
+
+
+def test_resume_with_only_a_torn_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"index": 0, "inp', encoding="utf-8")
+
+    journal = CardJournal(str(path), resume=True)
+    journal.append(0, "a", CARD, {})
+    journal.close()
+
+    assert set(CardJournal.load(str(path))) == {"a"}
+
+
+def test_resume_keeps_a_complete_journal(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = CardJournal(path)
+    journal.append(0, "a", CARD, {})
+    journal.close()
+
+    journal = CardJournal(path, resume=True)
+    journal.append(1, "b", CARD, {})
+    journal.close()
+
+    assert set(CardJournal.load(path)) == {"a", "b"}
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 缓存出错时的处理：数据库被锁住等 SQLite 错误按未命中处理，不影响制卡结果
+"""
+
+import sqlite3
+from types import SimpleNamespace
+
+from generate import request_completion
+from llm_cache import CompletionCache
+
+
+class LockedCache(CompletionCache):
+    def get(self, key):
+        raise sqlite3.OperationalError("database is locked")
+
+    def set(self, key, model, response):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def fake_client(content):
+    response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+    calls = []
+
+    def create(**request):
+        calls.append(request)
+        return response
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))), calls
+
+
+def test_locked_cache_is_treated_as_a_miss(tmp_path):
+    cache = LockedCache(str(tmp_path / "cache.sqlite3"))
+    client, calls = fake_client("/ˈkæt/")
+    assert request_completion(client, "stub", "system", "Input Word:** cat", cache=cache) == "/ˈkæt/"
+    assert len(calls) == 1
+    cache.close()
+
+
+def test_cache_stays_usable_after_a_failed_write(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = CompletionCache(path)
+    other = sqlite3.connect(path, timeout=0)
+    cache._conn.execute("PRAGMA busy_timeout = 0")
+    other.execute("BEGIN EXCLUSIVE")
+
+    client, calls = fake_client("/dɒɡ/")
+    assert request_completion(client, "stub", "system", "Input Word:** dog", cache=cache) == "/dɒɡ/"
+    other.rollback()
+    other.close()
+
+    # 锁释放后缓存照常读写
+    assert request_completion(client, "stub", "system", "Input Word:** dog", cache=cache) == "/dɒɡ/"
+    assert request_completion(client, "stub", "system", "Input Word:** dog", cache=cache) == "/dɒɡ/"
+    assert len(calls) == 2
+    cache.close()
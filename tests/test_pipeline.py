@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+流水线与批量请求的测试：批量结果缺失或被截断时，缺失的条目放回文本阶段逐个生成，输出顺序不变
+(本地模拟 LLM 服务，不需要网络)
+"""
+
+import collections
+import json
+import re
+import threading
+
+import pytest
+
+import fake_backends
+from batching import BatchSizer, salvage_json_objects
+from generate import ERROR_PLACEHOLDER, create_anki_package
+from pipeline import run_pipeline
+
+WORDS = [f"word{i}" for i in range(12)]
+
+
+def test_salvage_keeps_complete_objects_before_truncation():
+    text = '{"cards": [{"input": "a", "ipa": "/a/"}, {"input": "b", "ipa": "/b/"}, {"input": "c", "ip'
+    assert [obj["input"] for obj in salvage_json_objects(text, "cards")] == ["a", "b"]
+    assert salvage_json_objects('{"cards": [', "cards") == []
+
+
+def test_batch_sizer_halves_after_failure():
+    sizer = BatchSizer(max_batch_size=8)
+    sizer.record_failure(8)
+    assert sizer.size() == 4
+    sizer.record_success(4, "x" * 400)
+    assert sizer.size() == 5
+
+
+def test_requeued_batch_misses_keep_input_order():
+    single_threads = set()
+
+    def text_stage(item):
+        single_threads.add(threading.current_thread().name)
+        return f"single {item}"
+
+    def text_batch_stage(items):
+        # 每批只有偶数条目成功，其余返回 None (放回文本阶段)
+        return [f"batch {item}" if item % 2 == 0 else None for item in items]
+
+    results = list(run_pipeline(range(40), text_stage, lambda item, text: text, llm_workers=4, tts_workers=2,
+                                queue_size=4, text_batch_stage=text_batch_stage, batch_size=8))
+
+    assert [index for index, *_ in results] == list(range(40))
+    assert all(error is None for *_, error in results)
+    assert [text for _, _, text, _, _ in results] == [
+        f"batch {i}" if i % 2 == 0 else f"single {i}" for i in range(40)]
+    assert len(single_threads) > 1
+
+
+@pytest.fixture
+def batch_responses(monkeypatch):
+    """
+    改写模拟 LLM 的批量响应：mangle(cards) -> (响应文本, 响应中完整有效的输入)；
+    记录批量结果中有效的输入，以及每个输入单独请求的次数
+    """
+    salvaged = set()
+    singles = collections.Counter()
+    lock = threading.Lock()
+    real_completion = fake_backends.canned_completion
+    state = {"mangle": None}
+
+    def completion(system_prompt, user_content, json_mode=False):
+        content = real_completion(system_prompt, user_content, json_mode)
+        if "JSON array of inputs" in system_prompt:
+            content, valid = state["mangle"](json.loads(content)["cards"])
+            with lock:
+                salvaged.update(valid)
+            return content
+        word = re.search(r"Input(?: Word:\*\*|:)\s*(word\d+)\b", user_content).group(1)
+        with lock:
+            singles[word] += 1
+        return content
+
+    monkeypatch.setattr(fake_backends, "canned_completion", completion)
+    return state, salvaged, singles
+
+
+def build(tmp_path, api_config, azure_config):
+    package = tmp_path / "deck.apkg"
+    api_config = dict(api_config, batch_size=4)
+    create_anki_package(WORDS, package_name=str(package), media_output_dir=str(tmp_path / "media"),
+                        api_config=api_config, azure_config=azure_config,
+                        concurrency_config={"llm_workers": 3, "tts_workers": 2},
+                        retry_config={"enabled": False})
+    return package
+
+
+def assert_regenerated_individually(notes, salvaged, singles):
+    # 输出顺序与输入一致，内容完整
+    assert [fields[0] for fields in notes] == WORDS
+    assert not any(ERROR_PLACEHOLDER in "".join(fields) for fields in notes)
+    assert all(fields[1] and fields[3] and fields[4] for fields in notes)
+    # 批量结果中有效的条目直接使用，其余条目各自单独生成一次 (音标、释义、例句三次请求)
+    assert salvaged
+    assert set(singles) == set(WORDS) - salvaged
+    assert set(singles.values()) == {3}
+
+
+def test_batch_entries_missing_or_lacking_keys_are_regenerated(tmp_path, api_config, azure_config,
+                                                              read_package, batch_responses):
+    state, salvaged, singles = batch_responses
+
+    def mangle(cards):
+        # 丢掉第二个条目，第三个条目缺少 examples
+        cards = [card for i, card in enumerate(cards) if i != 1]
+        if len(cards) > 1:
+            del cards[1]["examples"]
+        return json.dumps({"cards": cards}), [cards[0]["input"]] + [c["input"] for c in cards[2:]]
+
+    state["mangle"] = mangle
+    notes, _ = read_package(build(tmp_path, api_config, azure_config))
+    assert_regenerated_individually(notes, salvaged, singles)
+
+
+def test_truncated_batch_array_is_salvaged(tmp_path, api_config, azure_config, read_package, batch_responses):
+    state, salvaged, singles = batch_responses
+
+    def mangle(cards):
+        # 输出在最后一个条目中途被截断
+        text = json.dumps({"cards": cards})
+        return text[:text.rindex('{"input"') + 20], [card["input"] for card in cards[:-1]]
+
+    state["mangle"] = mangle
+    notes, _ = read_package(build(tmp_path, api_config, azure_config))
+    assert_regenerated_individually(notes, salvaged, singles)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+单词列表去重的测试
+"""
+
+import gzip
+
+from word_list import DedupedWords, WordListReader, normalize_input_key
+
+
+def test_width_and_spacing_variants_share_a_key():
+    assert normalize_input_key("tear（crying）") == normalize_input_key("tear (crying)")
+    assert normalize_input_key("tear  ( crying )") == normalize_input_key("tear (crying)")
+
+
+def test_case_only_variants_are_different_words():
+    assert normalize_input_key("Polish") != normalize_input_key("polish")
+    assert list(DedupedWords(["Polish", "polish", "May", "may", "polish"])) == ["Polish", "polish", "May", "may"]
+
+
+def test_reader_keeps_case_variants(tmp_path):
+    path = tmp_path / "words.txt.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write("Polish\npolish\n\ntear (crying)\ntear（crying）\n")
+
+    reader = WordListReader(str(path))
+    assert list(reader) == ["Polish", "polish", "tear (crying)"]
+    assert reader.duplicates == 1
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+本地变速不变调 (WSOLA，基于 NumPy)
+单词慢读与快读是同一段文本，只合成一次原速音频，慢速版本在本地拉伸得到，省去每个单词四次 TTS 请求中的一次。
+NumPy 只在真正拉伸时才导入 (tts.local_slow_word 为 false 时不需要安装)。
+"""
+
+import re
+
+
+def rate_to_speed(rate) -> float:
+    """
+    把 Azure prosody rate 转换为语速倍数，例如 "-30%" -> 0.7, "+20%" -> 1.2, "0%" -> 1.0
+
+    Raises:
+        ValueError: 不是百分比格式
+    """
+    match = re.fullmatch(r'\s*([+-]?\d+(?:\.\d+)?)%\s*', str(rate))
+    if not match:
+        raise ValueError(f"语速应为百分比格式 (例如 -30%): {rate}")
+    speed = 1 + float(match.group(1)) / 100
+    if speed <= 0:
+        raise ValueError(f"语速必须大于 -100%: {rate}")
+    return speed
+
+
+def time_stretch_pcm(pcm: bytes, speed: float, sample_rate=24000, frame_ms=30, tolerance_ms=10) -> bytes:
+    """
+    WSOLA (波形相似重叠相加) 变速不变调
+
+    每个输出帧从输入的名义位置附近 ±tolerance_ms 内选取与上一帧自然延续最相似的片段，
+    加汉宁窗后按 50% 重叠相加，音高不变、时长变为原来的 1/speed。
+    每一帧的位置取决于上一帧，帧之间是一个 Python 循环 (一个单词约几十帧)；
+    帧内所有候选片段的相似度用一次矩阵乘法算出 (sliding_window_view)，不再逐个候选循环。
+
+    Args:
+        pcm: 16 位小端单声道 PCM
+        speed: 语速倍数 (< 1 变慢，> 1 变快)
+        sample_rate: 采样率
+        frame_ms: 分析帧长 (毫秒)，语音一般取 20~40
+        tolerance_ms: 相似片段的搜索范围 (毫秒)
+
+    Returns:
+        bytes: 拉伸后的 16 位 PCM
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    x = np.frombuffer(pcm, dtype='<i2').astype(np.float64)
+    if speed == 1 or len(x) == 0:
+        return pcm
+
+    frame = max(4, int(sample_rate * frame_ms / 1000) // 2 * 2)
+    hop_out = frame // 2
+    hop_in = hop_out * speed
+    tol = max(1, int(sample_rate * tolerance_ms / 1000))
+
+    out_len = int(len(x) / speed)
+    frames = out_len // hop_out + 2
+
+    # 两端补零，保证搜索范围与延续片段都不越界
+    padded = np.concatenate([np.zeros(tol), x, np.zeros(frame + hop_out + 2 * tol + int(hop_in) + 1)])
+    candidates = sliding_window_view(padded, frame)
+    window = np.hanning(frame)
+
+    out = np.zeros(frames * hop_out + frame)
+    norm = np.zeros_like(out)
+    prev = tol
+    for k in range(frames):
+        nominal = tol + int(round(k * hop_in))
+        if k == 0:
+            pos = nominal
+        else:
+            # 上一帧的自然延续作为模板，在名义位置附近找最相似的片段
+            template = padded[prev + hop_out:prev + hop_out + frame]
+            lo = nominal - tol
+            hi = min(nominal + tol, len(candidates) - 1)
+            pos = lo + int(np.argmax(candidates[lo:hi + 1] @ template))
+        start = k * hop_out
+        out[start:start + frame] += padded[pos:pos + frame] * window
+        norm[start:start + frame] += window
+        prev = pos
+
+    out = out[:out_len] / np.maximum(norm[:out_len], 1e-3)
+    return np.clip(np.round(out), -32768, 32767).astype('<i2').tobytes()
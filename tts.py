@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+TTS 后端
+- SynthesisResult: 与具体后端无关的合成结果
+- AUDIO_FORMATS / resolve_audio_format: 可配置的音频输出格式 (MP3 / Opus / WAV) 与对应的文件扩展名
+- get_synthesizer_pool: 共享的 Azure TTS 合成器池 (azure_tts.SynthesizerPool)，首次调用时才导入 Azure SDK
+- get_tts_backend: 根据配置选择 Azure 或本地模拟合成器 (fake_backends.FakeSynthesizer)
+- speak_many_limited / speak_with_bookmarks_limited: 在共享限流器的保护下合成，只重试可重试的失败片段
+
+所有后端都提供相同的接口: voice_name, speak_many(ssml_list), speak_with_bookmarks(ssml_text)
+"""
+
+import threading
+import time
+
+
+class SynthesisResult:
+    """
+    合成结果：成功时 audio_data 为音频内容，失败时 error 为错误描述；
+    retryable 表示失败可以重试 (限流、连接断开、服务端错误等)，rate_limited 表示被限流
+    """
+
+    def __init__(self, audio_data=None, error=None, retryable=False, rate_limited=False):
+        self.audio_data = audio_data
+        self.error = error
+        self.retryable = retryable
+        self.rate_limited = rate_limited
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+# 音频输出格式: 配置名称 -> (Azure SpeechSynthesisOutputFormat 枚举名称, 文件扩展名)
+# MP3 兼容性最好 (Anki 桌面版、AnkiDroid、AnkiMobile 都能播放)；WAV 未压缩，体积约为 48kbps MP3 的 8 倍
+AUDIO_FORMATS = {
+    "mp3-16k-32kbps": ("Audio16Khz32KBitRateMonoMp3", ".mp3"),
+    "mp3-24k-48kbps": ("Audio24Khz48KBitRateMonoMp3", ".mp3"),
+    "mp3-24k-96kbps": ("Audio24Khz96KBitRateMonoMp3", ".mp3"),
+    "mp3-48k-96kbps": ("Audio48Khz96KBitRateMonoMp3", ".mp3"),
+    "opus-24k-ogg": ("Ogg24Khz16BitMonoOpus", ".ogg"),
+    "opus-24k-24kbps-webm": ("Webm24Khz16Bit24KbpsMonoOpus", ".webm"),
+    "wav-16k": ("Riff16Khz16BitMonoPcm", ".wav"),
+    "wav-24k": ("Riff24Khz16BitMonoPcm", ".wav"),
+}
+DEFAULT_AUDIO_FORMAT = "mp3-24k-48kbps"
+
+# 直接填写 Azure 枚举名称时，按名称前缀推断扩展名 (Raw 格式没有文件头，不能单独播放，不支持)
+_FORMAT_EXTENSIONS = (("Audio", ".mp3"), ("Ogg", ".ogg"), ("Webm", ".webm"), ("Riff", ".wav"))
+
+
+def resolve_audio_format(name=None):
+    """
+    解析音频输出格式
+
+    Args:
+        name: AUDIO_FORMATS 中的名称，或 Azure SpeechSynthesisOutputFormat 枚举名称 (例如 Audio24Khz96KBitRateMonoMp3)；
+              为空时使用 DEFAULT_AUDIO_FORMAT
+
+    Returns:
+        tuple: (Azure 枚举名称, 文件扩展名)
+    """
+    name = name or DEFAULT_AUDIO_FORMAT
+    if name in AUDIO_FORMATS:
+        return AUDIO_FORMATS[name]
+    for prefix, ext in _FORMAT_EXTENSIONS:
+        if name.startswith(prefix) and (prefix != "Audio" or name.endswith("Mp3")):
+            return name, ext
+    raise ValueError(f"不支持的音频格式: {name} (可选: {', '.join(AUDIO_FORMATS)}，或 Azure 的 MP3 / Ogg / Webm / Riff 格式名称)")
+
+
+# 全局合成器池 (按配置复用，线程安全)
+_pool_lock = threading.Lock()
+_pools = {}
+
+
+def get_synthesizer_pool(azure_config: dict, output_format=None):
+    """
+    获取与 azure_config 对应的共享合成器池
+
+    Args:
+        azure_config (dict): Azure TTS 配置，包含 speech_key, region, voice_name，
+            可选 pool_size (最多保留的空闲合成器数量，默认 16)
+        output_format: SpeechSynthesisOutputFormat 枚举名称，为 None 时使用 SDK 默认格式
+
+    Returns:
+        SynthesizerPool: 共享的合成器池
+    """
+    key = (
+        azure_config.get("speech_key", ""),
+        azure_config.get("region", "eastus"),
+        azure_config.get("voice_name", "en-GB-SoniaNeural"),
+        azure_config.get("pool_size", 16),
+        output_format,
+    )
+    with _pool_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # Azure SDK 只在第一次真正需要合成时才加载
+            from azure_tts import SynthesizerPool
+            pool = SynthesizerPool(*key)
+            _pools[key] = pool
+        return pool
+
+
+def get_tts_backend(azure_config: dict, output_format=None):
+    """
+    根据配置获取 TTS 后端
+
+    Args:
+        azure_config (dict): TTS 配置，backend 为 "azure" (默认) 或 "fake" (本地模拟合成器)；
+            fake 模式下可选 fake_latency_ms, fake_jitter_ms, fake_error_rate
+        output_format: SpeechSynthesisOutputFormat 枚举名称，为 None 时使用默认格式
+
+    Returns:
+        SynthesizerPool 或 FakeSynthesizer
+    """
+    if azure_config.get("backend", "azure") == "fake":
+        from fake_backends import get_fake_synthesizer
+        return get_fake_synthesizer(azure_config, output_format)
+    return get_synthesizer_pool(azure_config, output_format)
+
+
+def speak_many_limited(backend, ssml_list, limiter=None):
+    """
+    在限流器保护下同时合成多个片段：每轮只重新请求可重试的失败片段，
+    被限流时所有线程一起暂停并降低并发，其他错误按指数退避重试。
+
+    Args:
+        backend: TTS 后端 (get_tts_backend 的返回值)
+        ssml_list: SSML 文本列表
+        limiter (AdaptiveLimiter, optional): 共享限流器，为 None 时直接合成
+
+    Returns:
+        list: 与 ssml_list 一一对应的 SynthesisResult
+    """
+    if limiter is None:
+        return backend.speak_many(ssml_list)
+    return _speak_with_retry(backend.speak_many, ssml_list, limiter)
+
+
+def _speak_with_retry(speak, ssml_list, limiter):
+    # speak(ssml_list) -> [SynthesisResult, ...]
+    # RPM 按实际发出的片段请求数计 (Azure 按请求计额度)；并发名额按单词计，一个单词的片段同时在途，
+    # 因此 rate_limit.tts.max_concurrency 是同时合成的单词数，而不是同时在途的请求数
+    results = [None] * len(ssml_list)
+    pending = list(range(len(ssml_list)))
+    for attempt in range(limiter.max_attempts):
+        with limiter.slot(requests=len(pending)):
+            started = time.monotonic()
+            batch = speak([ssml_list[i] for i in pending])
+
+        retry = []
+        for i, result in zip(pending, batch):
+            results[i] = result
+            if not result.ok and result.retryable:
+                retry.append(i)
+        if len(retry) < len(pending):
+            limiter.record_success(time.monotonic() - started)
+        if not retry:
+            break
+        if attempt + 1 >= limiter.max_attempts:
+            limiter.record_failure()
+            break
+
+        rate_limited = any(results[i].rate_limited for i in retry)
+        time.sleep(limiter.record_retry(attempt, rate_limited))
+        pending = retry
+    return results
+
+
+def speak_with_bookmarks_limited(backend, ssml_text, limiter=None):
+    """
+    在限流器保护下合成带书签的 SSML (重试规则同 speak_many_limited)
+
+    Returns:
+        tuple: (SynthesisResult, [(书签名称, 偏移量 tick), ...])
+    """
+    if limiter is None:
+        return backend.speak_with_bookmarks(ssml_text)
+
+    bookmarks = []
+
+    def speak(ssml_list):
+        result, bookmarks[:] = backend.speak_with_bookmarks(ssml_list[0])
+        return [result]
+
+    return _speak_with_retry(speak, [ssml_text], limiter)[0], bookmarks
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+单词列表的流式读取
+边读边产出单词，制卡流水线无需等待整个文件读完即可开始；
+支持标准输入 ("-") 与 .gz 压缩文件，并在调用 API 之前去除重复条目
+(直接传入列表时也经过同样的去重计划)。
+"""
+
+import gzip
+import re
+import sys
+import unicodedata
+
+
+def normalize_input_key(text: str) -> str:
+    """
+    生成用于去重的规范化键：
+    全角字符转半角 (例如中文括号)，合并多余空白，统一括号前后的空格。
+    例如 "tear（crying）"、"tear (crying)"、"tear  ( crying )" 得到相同的键。
+    大小写保留：只差大小写的输入可能是不同的单词 (例如 "Polish" 与 "polish"、"May" 与 "may")，不视为重复。
+    """
+    key = unicodedata.normalize("NFKC", text)
+    key = re.sub(r'\s*\(\s*', ' (', key)
+    key = re.sub(r'\s*\)', ')', key)
+    key = re.sub(r'\s+', ' ', key)
+    return key.strip()
+
+
+class DedupedWords:
+    """
+    去重计划：按规范化键对输入分组，每组只保留第一次出现的条目，保证重复的输入只发起一次请求。
+    可迭代 (惰性去重，适合流式输入)；迭代结束后可通过 total / duplicates 查看统计。
+    """
+
+    def __init__(self, words=()):
+        """
+        Args:
+            words: 单词或词组的可迭代对象 (空白条目会被跳过)
+        """
+        self.words = words
+        self.total = 0
+        self.duplicates = 0
+        self.duplicate_examples = []
+
+    def _lines(self):
+        return iter(self.words)
+
+    def __iter__(self):
+        seen = set()
+        for line in self._lines():
+            word = line.strip()
+            if not word:
+                continue
+            key = normalize_input_key(word)
+            if key in seen:
+                self.duplicates += 1
+                if len(self.duplicate_examples) < 5:
+                    self.duplicate_examples.append(word)
+                continue
+            seen.add(key)
+            self.total += 1
+            yield word
+
+
+class WordListReader(DedupedWords):
+    """
+    可迭代的单词列表：逐行读取，跳过空行，去除完全相同与规范化后相同的重复条目。
+    迭代结束后可通过 total / duplicates 查看统计。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: 单词列表路径，每行一个单词或词组；"-" 表示从标准输入读取，.gz 结尾按 gzip 解压读取
+        """
+        super().__init__()
+        self.path = path
+
+    def _open(self):
+        if self.path == "-":
+            return sys.stdin
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, 'rt', encoding='utf-8')
+        return open(self.path, 'r', encoding='utf-8')
+
+    def _lines(self):
+        f = self._open()
+        try:
+            yield from f
+        finally:
+            if f is not sys.stdin:
+                f.close()